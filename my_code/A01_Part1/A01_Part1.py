@@ -6,14 +6,42 @@
 # This program retrieves the unique start and stop station names from the CSV files in the input folder and writes them
 # along with their respective counts to a tab-separated output file.
 #
+# The CSV files can also be compressed (e.g. '2019_05_01.csv.gz'), in which case they are decompressed while they are
+# read (see my_compression).
+#
 # The program provides three functions:
 #
 #   process_line(line):
 #       Parses a line of the CSV file and returns a tuple of start and stop station names.
 #
-#   parse_in(input_folder):
+#   process_table(table, starts, stops):
+#       Adds the start and stop station counts of a cached CSV file to the running counts.
+#
+#   process_file(file_name, starts, stops, cache_folder):
+#       Adds the start and stop station counts of a CSV file to the running counts.
+#
+#   process_file_numpy(file_name, starts, stops, cache_folder):
+#       Does the same as process_file, counting the stations of the file in bulk with NumPy.
+#
+#   process_file_mmap(file_name, starts, stops, cache_folder):
+#       Does the same as process_file, scanning only the station names of the file from a memory map.
+#
+#   parse_in(input_folder, cache_folder):
 #       Gets the unique start and stop station names from the CSV files in the input folder.
 #
+#   parse_in_numpy(input_folder, cache_folder):
+#       Does the same as parse_in, counting the stations of each file in bulk with NumPy.
+#
+#   parse_in_mmap(input_folder):
+#       Does the same as parse_in, scanning only the station names of each file from a memory map.
+#
+#   parse_in_incremental(input_folder, partials_folder, cache_folder, engine):
+#       Does the same as parse_in, only counting the stations of the files that are new or have changed since the
+#       last run, and reusing the counts kept from the others.
+#
+#   parse_in_splits(input_folder, split_size, num_workers):
+#       Does the same as parse_in, counting the stations of chunks of the files concurrently in a pool of processes.
+#
 #   parse_out(output_file, starts, stops, names):
 #       Writes list of stations and their respective counts to file.
 #
@@ -21,7 +49,22 @@
 
 
 import os
-from collections import defaultdict
+import sys
+import multiprocessing
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_dataset_cache
+import my_partials
+import my_input_splits
+import my_mmap_scanner
+import my_compression
+import my_buffered_writer
+
+try:
+    import numpy as np  # Only needed by the 'numpy' engine
+except ImportError:
+    np = None
 
 
 # ------------------------------------------
@@ -59,16 +102,138 @@ def process_line(line):
     return res
 
 
+# ------------------------------------------
+# FUNCTION process_table
+# ------------------------------------------
+def process_table(table, starts, stops):
+    """
+    Add the start and stop station counts of a cached CSV file to the running counts.
+
+    Args:
+        table (dict): The columns of a CSV file, as returned by my_dataset_cache.load_table.
+        starts (defaultdict): The count of each unique start station name so far.
+        stops (defaultdict): The count of each unique stop station name so far.
+    """
+    names = table['dictionaries']['start_station_name']  # Shared by start and stop station names
+    for code, count in Counter(table['columns']['start_station_name']).items():
+        starts[names[code]] += count
+    for code, count in Counter(table['columns']['stop_station_name']).items():
+        stops[names[code]] += count
+
+
+# ------------------------------------------
+# FUNCTION process_file
+# ------------------------------------------
+def process_file(file_name, starts, stops, cache_folder=None):
+    """
+    Add the start and stop station counts of a CSV file to the running counts.
+
+    Args:
+        file_name (str): The path to the CSV file.
+        starts (defaultdict): The count of each unique start station name so far.
+        stops (defaultdict): The count of each unique stop station name so far.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache).
+            If None, the CSV file is parsed directly.
+    """
+    if cache_folder is not None:
+        process_table(my_dataset_cache.load_table(file_name, cache_folder), starts, stops)
+    else:
+        with my_compression.open_file(file_name, 'r') as file:
+            for line in file:
+                trip = process_line(line)
+                start_name = trip['start_station_name']
+                stop_name = trip['stop_station_name']
+                starts[start_name] += 1
+                stops[stop_name] += 1
+
+
+# ------------------------------------------
+# FUNCTION process_file_numpy
+# ------------------------------------------
+def process_file_numpy(file_name, starts, stops, cache_folder=None):
+    """
+    Does the same as process_file, but instead of processing the file line by line, it loads its start and stop
+    station names in bulk, dictionary-encodes them and counts the codes with np.bincount.
+
+    Args:
+        file_name (str): The path to the CSV file.
+        starts (defaultdict): The count of each unique start station name so far.
+        stops (defaultdict): The count of each unique stop station name so far.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache),
+            whose station names are already dictionary-encoded. If None, the CSV file is parsed and encoded with
+            np.unique, which holds the whole file in memory and is slower than process_file, so the 'numpy' engine
+            only pays off with the cache.
+    """
+    if np is None:
+        raise ImportError("The 'numpy' engine requires NumPy to be installed")
+
+    if cache_folder is not None:
+        table = my_dataset_cache.load_table(file_name, cache_folder)
+        names = table['dictionaries']['start_station_name']  # Shared by start and stop station names
+        start_codes = np.frombuffer(table['columns']['start_station_name'], dtype=np.intc)
+        stop_codes = np.frombuffer(table['columns']['stop_station_name'], dtype=np.intc)
+    else:
+        with my_compression.open_file(file_name, 'r') as file:
+            fields = [line.strip().split(",") for line in file]
+        start_names = np.array([row[4] for row in fields], dtype=str)
+        stop_names = np.array([row[8] for row in fields], dtype=str)
+        names, codes = np.unique(np.concatenate([start_names, stop_names]), return_inverse=True)
+        names = names.tolist()
+        start_codes = codes[:len(start_names)]
+        stop_codes = codes[len(start_names):]
+
+    start_counts = np.bincount(start_codes, minlength=len(names)).tolist()
+    stop_counts = np.bincount(stop_codes, minlength=len(names)).tolist()
+    for name, start_count, stop_count in zip(names, start_counts, stop_counts):
+        if start_count > 0:
+            starts[name] += start_count
+        if stop_count > 0:
+            stops[name] += stop_count
+
+
+# ------------------------------------------
+# FUNCTION process_file_mmap
+# ------------------------------------------
+def process_file_mmap(file_name, starts, stops, cache_folder=None):
+    """
+    Does the same as process_file, but scans only the bytes of the start and stop station names of each line from a
+    memory map of the file (see my_mmap_scanner), rather than decoding and splitting whole lines. The names are
+    counted as bytes, so each distinct name is only decoded once. As every line is scanned, with no needle to search
+    for first, it is slower than process_file.
+
+    Args:
+        file_name (str): The path to the CSV file.
+        starts (defaultdict): The count of each unique start station name so far.
+        stops (defaultdict): The count of each unique stop station name so far.
+        cache_folder (str): Not used, as the CSV file is always scanned.
+    """
+    if my_compression.is_compressed(file_name):  # Compressed files cannot be memory-mapped, so we parse them instead
+        process_file(file_name, starts, stops)
+        return
+
+    file_starts = Counter()
+    file_stops = Counter()
+    for (start_name, stop_name), count in Counter(my_mmap_scanner.scan_fields(file_name, (4, 8))).items():
+        file_starts[start_name] += count
+        file_stops[stop_name] += count
+    for name, count in file_starts.items():
+        starts[name.decode('utf-8')] += count
+    for name, count in file_stops.items():
+        stops[name.decode('utf-8')] += count
+
+
 # ------------------------------------------
 # FUNCTION parse_in
 # ------------------------------------------
-def parse_in(input_folder):
+def parse_in(input_folder, cache_folder=None):
     """
     Returns unique start and stop station names from the CSV files in the input folder, along with the count of each
     occurrence.
 
     Args:
         input_folder (str): The path to the input folder containing the CSV files.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache).
+            If None, the CSV files are parsed directly.
 
     Returns:
         tuple: A tuple of three items. The first item is a sorted list of unique station names, including all stations
@@ -81,13 +246,185 @@ def parse_in(input_folder):
     with os.scandir(input_folder) as filenames:  # os.scandir() is a generator => better performance than os.listdir()
         for filename in filenames:
             if filename.is_file():
-                with open(filename, 'r') as file:
-                    for line in file:
-                        trip = process_line(line)
-                        start_name = trip['start_station_name']
-                        stop_name = trip['stop_station_name']
-                        starts[start_name] += 1
-                        stops[stop_name] += 1
+                process_file(filename.path, starts, stops, cache_folder)
+    all_names = sorted(set(starts.keys()) | set(stops.keys()))
+
+    return starts, stops, all_names
+
+
+# ------------------------------------------
+# FUNCTION parse_in_numpy
+# ------------------------------------------
+def parse_in_numpy(input_folder, cache_folder=None):
+    """
+    Does the same as parse_in, but counts the stations of each file with process_file_numpy.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache),
+            whose station names are already dictionary-encoded. If None, the CSV files are parsed and encoded with
+            np.unique.
+
+    Returns:
+        tuple: The same as parse_in.
+    """
+    if np is None:
+        raise ImportError("The 'numpy' engine requires NumPy to be installed")
+
+    starts = defaultdict(int)
+    stops = defaultdict(int)
+
+    with os.scandir(input_folder) as filenames:
+        for filename in filenames:
+            if filename.is_file():
+                process_file_numpy(filename.path, starts, stops, cache_folder)
+    all_names = sorted(set(starts.keys()) | set(stops.keys()))
+
+    return starts, stops, all_names
+
+
+# ------------------------------------------
+# FUNCTION parse_in_mmap
+# ------------------------------------------
+def parse_in_mmap(input_folder):
+    """
+    Does the same as parse_in, but counts the stations of each file with process_file_mmap.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+
+    Returns:
+        tuple: The same as parse_in.
+    """
+    starts = defaultdict(int)
+    stops = defaultdict(int)
+
+    with os.scandir(input_folder) as filenames:
+        for filename in filenames:
+            if filename.is_file():
+                process_file_mmap(filename.path, starts, stops)
+    all_names = sorted(set(starts.keys()) | set(stops.keys()))
+
+    return starts, stops, all_names
+
+
+# ------------------------------------------
+# FUNCTION parse_in_incremental
+# ------------------------------------------
+def parse_in_incremental(input_folder, partials_folder, cache_folder=None, engine="python"):
+    """
+    Does the same as parse_in, but keeps the station counts of each file in the partials folder (see my_partials), so
+    that only the files that are new or have changed since the last run are counted, and their counts are merged with
+    the ones kept from the others.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+        partials_folder (str): The path to the folder with the station counts of each CSV file.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache).
+            If None, the CSV files are parsed directly.
+        engine (str): How the stations of a new or changed file are counted, either "python", "numpy" or "mmap".
+
+    Returns:
+        tuple: The same as parse_in.
+    """
+    process = { "numpy": process_file_numpy, "mmap": process_file_mmap }.get(engine, process_file)
+
+    def count_file(file_name):
+        file_starts = defaultdict(int)
+        file_stops = defaultdict(int)
+        process(file_name, file_starts, file_stops, cache_folder)
+        return {'starts': file_starts, 'stops': file_stops}
+
+    # The key of the job changes with the code counting the stations and with the engine, so that the counts kept by
+    # other code are not reused
+    source_files = [ os.path.abspath(__file__) ]
+    if engine == "mmap":
+        source_files.append(my_mmap_scanner.__file__)
+    if cache_folder is not None:
+        source_files.append(my_dataset_cache.__file__)
+    job_key = my_partials.get_job_key(source_files, [ "station_counts", engine, cache_folder is not None ])
+
+    starts = defaultdict(int)
+    stops = defaultdict(int)
+
+    with os.scandir(input_folder) as filenames:
+        for filename in filenames:
+            if filename.is_file():
+                partial = my_partials.get_partial(filename.path, partials_folder,
+                                                  lambda: count_file(filename.path), job_key)[0]
+                for name, count in partial['starts'].items():
+                    starts[name] += count
+                for name, count in partial['stops'].items():
+                    stops[name] += count
+    all_names = sorted(set(starts.keys()) | set(stops.keys()))
+
+    return starts, stops, all_names
+
+
+# ------------------------------------------
+# FUNCTION process_split
+# ------------------------------------------
+def process_split(split):
+    """
+    Count the start and stop stations of a split of a CSV file (see my_input_splits).
+
+    Args:
+        split (tuple): The path to the CSV file, and the start and end byte offsets of the split.
+
+    Returns:
+        tuple: The count of each start station name and the count of each stop station name in the split.
+    """
+    file_name, start, end = split
+    starts = defaultdict(int)
+    stops = defaultdict(int)
+    for line in my_input_splits.read_lines(file_name, start, end):
+        trip = process_line(line)
+        starts[trip['start_station_name']] += 1
+        stops[trip['stop_station_name']] += 1
+    return dict(starts), dict(stops)
+
+
+# ------------------------------------------
+# FUNCTION parse_in_splits
+# ------------------------------------------
+def parse_in_splits(input_folder, split_size, num_workers=None):
+    """
+    Does the same as parse_in, but splits each CSV file into byte ranges aligned to line breaks (see my_input_splits),
+    so that even the chunks of a single huge file are counted concurrently in a pool of processes. The counts of the
+    chunks are then added up.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+        split_size (int): The number of bytes of each chunk.
+        num_workers (int): The number of processes counting chunks concurrently. If None, one per core.
+
+    Returns:
+        tuple: The same as parse_in.
+    """
+    splits = []
+    with os.scandir(input_folder) as filenames:
+        for filename in filenames:
+            if filename.is_file():
+                splits.extend((filename.path, start, end)
+                              for start, end in my_input_splits.get_splits(filename.path, split_size))
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    starts = defaultdict(int)
+    stops = defaultdict(int)
+
+    if num_workers > 1 and len(splits) > 1:
+        with multiprocessing.Pool(min(num_workers, len(splits))) as pool:
+            counts = list(pool.imap_unordered(process_split, splits))
+    else:
+        counts = map(process_split, splits)
+
+    for split_starts, split_stops in counts:
+        for name, count in split_starts.items():
+            starts[name] += count
+        for name, count in split_stops.items():
+            stops[name] += count
     all_names = sorted(set(starts.keys()) | set(stops.keys()))
 
     return starts, stops, all_names
@@ -110,7 +447,7 @@ def parse_out(output_file, starts, stops, names):
         count (int): Count file write iterations
     """
     count = 0
-    with open(output_file, 'w') as file:
+    with my_buffered_writer.open_file(output_file) as file:
         for name in names:
             start_count = starts.get(name, 0)
             stop_count = stops.get(name, 0)
@@ -122,8 +459,18 @@ def parse_out(output_file, starts, stops, names):
 # ------------------------------------------
 # FUNCTION my_main
 # ------------------------------------------
-def my_main(input_folder, output_file):
-    starts, stops, names = parse_in(input_folder)
+def my_main(input_folder, output_file, cache_folder=None, engine="python", partials_folder=None, split_size=None,
+            num_workers=None):
+    if partials_folder is not None:
+        starts, stops, names = parse_in_incremental(input_folder, partials_folder, cache_folder, engine)
+    elif split_size is not None:
+        starts, stops, names = parse_in_splits(input_folder, split_size, num_workers)
+    elif engine == "numpy":
+        starts, stops, names = parse_in_numpy(input_folder, cache_folder)
+    elif engine == "mmap":
+        starts, stops, names = parse_in_mmap(input_folder)
+    else:
+        starts, stops, names = parse_in(input_folder, cache_folder)
     count = parse_out(output_file, starts, stops, names)
     
     if count == 1:
@@ -144,5 +491,10 @@ def my_main(input_folder, output_file):
 if __name__ == '__main__':
     input_folder = "../../my_dataset/"
     output_file = "../../my_results/Student_Solutions/A01_Part1/result.txt"
+    cache_folder = None  # e.g. "../../my_dataset_cache/" => read the columnar cache of the files (built on first use)
+    engine = "python"  # Or "numpy" to count the dictionary-encoded names of cache_folder in bulk ("mmap" is slower)
+    partials_folder = None  # e.g. "../../my_dataset_partials/A01_Part1/" => only count the new or changed files again
+    split_size = None  # e.g. 64 * 1024 * 1024 => count 64 MB chunks of the files concurrently (if partials_folder is None)
+    num_workers = None  # Number of processes counting chunks concurrently (None => one per core)
 
-    my_main(input_folder, output_file)
+    my_main(input_folder, output_file, cache_folder, engine, partials_folder, split_size, num_workers)
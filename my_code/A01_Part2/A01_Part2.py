@@ -3,8 +3,17 @@
 # ------------------------------------------
 import os
 import csv
+import sys
+import time
+import argparse
 from collections import defaultdict
-from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_dataset_cache
+import my_bike_index
+import my_timestamp
+import my_compression
+import my_buffered_writer
 
 
 # ------------------------------------------
@@ -19,13 +28,14 @@ def process_line(line):
 
     Returns:
         dict: A dictionary with the following keys: 'start_time', 'stop_time', 'start_station_id',
-            'start_station_name', 'stop_station_id', 'stop_station_name', 'bike_id'.
+            'start_station_name', 'stop_station_id', 'stop_station_name', 'bike_id'. The times are in seconds since
+            the epoch (see my_timestamp).
     """
     res = {}
     fields = line.strip().split(",")
     if len(fields) == 16:
-        res["start_time"] = datetime.strptime(fields[0], "%Y/%m/%d %H:%M:%S")
-        res["stop_time"] = datetime.strptime(fields[1], "%Y/%m/%d %H:%M:%S")
+        res["start_time"] = my_timestamp.parse_timestamp(fields[0])
+        res["stop_time"] = my_timestamp.parse_timestamp(fields[1])
         res["start_station_id"] = int(fields[3])
         res["start_station_name"] = fields[4]
         res["stop_station_id"] = int(fields[7])
@@ -34,16 +44,92 @@ def process_line(line):
     return res
 
 
+# ------------------------------------------
+# FUNCTION get_bike_id
+# ------------------------------------------
+def get_bike_id(line):
+    """
+    Return the bike ID of a line of the CSV file, without parsing any of its other fields. As the bike ID is the 12th
+    of the 16 fields, it is split off the end of the line.
+
+    Args:
+        line (str): The unprocessed line of text in the CSV file.
+
+    Returns:
+        int: The bike ID, or None if the line does not have 16 fields.
+    """
+    if line.count(",") != 15:
+        return None
+    return int(line.rsplit(",", 5)[1])
+
+
+# ------------------------------------------
+# FUNCTION process_line_of_bikes
+# ------------------------------------------
+def process_line_of_bikes(line, bike_ids=None):
+    """
+    Parse a line of the CSV file as process_line does, but only if its trip is of one of the bikes we are interested
+    in, which is checked first. The other fields of the lines of other bikes are never parsed.
+
+    Lines with quoted fields are first read with csv.reader and joined back, as parse_in used to do with every line.
+
+    Args:
+        line (str): The unprocessed line of text in the CSV file.
+        bike_ids (set): The IDs of the bikes that we are interested in. If None, all bikes.
+
+    Returns:
+        dict: The trip, as returned by process_line, or an empty dictionary if the line does not have 16 fields or its
+            trip is of another bike.
+    """
+    if '"' in line:
+        line = ",".join(next(csv.reader([line]), []))
+    if bike_ids is not None and get_bike_id(line) not in bike_ids:
+        return {}
+    return process_line(line)
+
+
+# ------------------------------------------
+# FUNCTION process_table_row
+# ------------------------------------------
+def process_table_row(table, index):
+    """
+    Return a dictionary with relevant information about a trip of a cached CSV file, as process_line does.
+
+    Args:
+        table (dict): The columns of a CSV file, as returned by my_dataset_cache.load_table.
+        index (int): The row of the trip.
+
+    Returns:
+        dict: A dictionary with the same keys as the one returned by process_line.
+    """
+    columns = table["columns"]
+    names = table["dictionaries"]["start_station_name"]  # Shared by start and stop station names
+    res = {}
+    res["start_time"] = columns["start_time"][index]
+    res["stop_time"] = columns["stop_time"][index]
+    res["start_station_id"] = columns["start_station_id"][index]
+    res["start_station_name"] = names[columns["start_station_name"][index]]
+    res["stop_station_id"] = columns["stop_station_id"][index]
+    res["stop_station_name"] = names[columns["stop_station_name"][index]]
+    res["bike_id"] = columns["bike_id"][index]
+    return res
+
+
 # ------------------------------------------
 # FUNCTION parse_in
 # ------------------------------------------
-def parse_in(input_folder, BIKE_ID):
+def parse_in(input_folder, BIKE_ID, cache_folder=None, index_folder=None):
     """
     Parses the input CSV files in the given directory and returns a list of relevant trips along with the stations they start and stop at.
 
     Args:
         input_folder (str): The path to the directory containing input CSV files.
         BIKE_ID (int): The ID of the bike that we are interested in.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache).
+            If None, the CSV files are parsed directly.
+        index_folder (str): The path to the folder with the per-bike index of the CSV files (see my_bike_index). If
+            given, only the lines of the trips of the bike are read, and cache_folder is not used. Compressed CSV
+            files (see my_compression) are not indexed, so they are read through cache_folder (if any) instead.
 
     Returns:
         tuple: A tuple containing two elements:
@@ -52,15 +138,29 @@ def parse_in(input_folder, BIKE_ID):
     """
     trips = []
     stations = defaultdict(str)
+    bike_ids = {BIKE_ID}
 
     with os.scandir(input_folder) as filenames:
         for filename in filenames:
-            if filename.is_file():
-                with open(filename, "r") as file:
-                    reader = csv.reader(file)
-                    for row in reader:
-                        trip = process_line(",".join(row))
-                        if trip["bike_id"] == BIKE_ID:
+            if filename.is_file() and index_folder is not None and not my_compression.is_compressed(filename.name):
+                for line in my_bike_index.read_lines(filename.path, index_folder, BIKE_ID):
+                    trip = process_line(line)
+                    trips.append(trip)
+                    stations[trip["start_station_id"]] = trip["start_station_name"]
+                    stations[trip["stop_station_id"]] = trip["stop_station_name"]
+            elif filename.is_file() and cache_folder is not None:
+                table = my_dataset_cache.load_table(filename.path, cache_folder)
+                table_bike_ids = table["columns"]["bike_id"]
+                for index in [index for index, bike_id in enumerate(table_bike_ids) if bike_id == BIKE_ID]:
+                    trip = process_table_row(table, index)
+                    trips.append(trip)
+                    stations[trip["start_station_id"]] = trip["start_station_name"]
+                    stations[trip["stop_station_id"]] = trip["stop_station_name"]
+            elif filename.is_file():
+                with my_compression.open_file(filename.path, "r") as file:
+                    for line in file:
+                        trip = process_line_of_bikes(line, bike_ids)
+                        if trip:
                             trips.append(trip)
                             stations[trip["start_station_id"]] = trip["start_station_name"]
                             stations[trip["stop_station_id"]] = trip["stop_station_name"]
@@ -88,22 +188,224 @@ def parse_out(output_file, trips, stations):
         next_trip = trips[i+1]
 
         if current_trip["stop_station_id"] != next_trip["start_station_id"]:
-            start_time = current_trip["stop_time"].strftime("%Y/%m/%d %H:%M:%S")
+            start_time = my_timestamp.format_timestamp(current_trip["stop_time"])
             start_station = stations[current_trip["stop_station_id"]]
-            end_time = next_trip["start_time"].strftime("%Y/%m/%d %H:%M:%S")
+            end_time = my_timestamp.format_timestamp(next_trip["start_time"])
             end_station = stations[next_trip["start_station_id"]]
 
-            output = f"By_Truck\t({start_time}, {start_station}, {end_time}, {end_station})\n"
+            output = format_truck_move(start_time, start_station, end_time, end_station)
             output_file.write(output)
             count += 1
     return count
 
 
+# ------------------------------------------
+# FUNCTION format_truck_move
+# ------------------------------------------
+def format_truck_move(start_time, start_station, end_time, end_station):
+    """
+    Format a truck move as a line of the output file.
+
+    Args:
+        start_time (str): The time the bike was left at the start station.
+        start_station (str): The name of the station the truck picked the bike up from.
+        end_time (str): The time the bike was next taken from the end station.
+        end_station (str): The name of the station the truck dropped the bike off at.
+
+    Returns:
+        str: The line of the output file, including the line break.
+    """
+    return f"By_Truck\t({start_time}, {start_station}, {end_time}, {end_station})\n"
+
+
+# ------------------------------------------
+# FUNCTION read_folder_lines
+# ------------------------------------------
+def read_folder_lines(input_folder):
+    """
+    Lazily yield the lines of the CSV files in the input folder, one file after another in name (i.e. date) order.
+    Compressed CSV files (see my_compression) are decompressed while they are read.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+
+    Yields:
+        str: Each line of each CSV file.
+    """
+    for filename in sorted(os.listdir(input_folder)):
+        if os.path.isfile(os.path.join(input_folder, filename)) and filename != ".DS_Store":
+            with my_compression.open_file(os.path.join(input_folder, filename), "r") as file:
+                yield from file
+
+
+# ------------------------------------------
+# FUNCTION follow_file
+# ------------------------------------------
+def follow_file(file_name, poll_interval=1.0):
+    """
+    Yield the lines of a file and then keep waiting for new lines appended to it, like 'tail -f'. A line is only
+    yielded once it is complete, so a trip that is still being written is never parsed.
+
+    Args:
+        file_name (str): The path to the file to follow.
+        poll_interval (float): The seconds to wait before checking again for new lines at the end of the file.
+
+    Yields:
+        str: Each complete line of the file.
+    """
+    with open(file_name, "r") as file:
+        pending = ""
+        while True:
+            line = file.readline()
+            if line == "":
+                time.sleep(poll_interval)
+                continue
+            pending += line
+            if pending.endswith("\n"):
+                yield pending
+                pending = ""
+
+
+# ------------------------------------------
+# FUNCTION stream_trips
+# ------------------------------------------
+def stream_trips(lines, BIKE_ID):
+    """
+    Lazily parse the trips of a bike out of a (possibly unbounded) stream of lines. Lines not having 16 fields, such
+    as headers, are skipped.
+
+    Args:
+        lines (iterable): The lines of the CSV files, e.g. an open file, sys.stdin or follow_file(...).
+        BIKE_ID (int): The ID of the bike that we are interested in.
+
+    Yields:
+        dict: The trips of the bike, as returned by process_line.
+    """
+    return stream_trips_of_bikes(lines, {BIKE_ID})
+
+
+# ------------------------------------------
+# FUNCTION stream_trips_of_bikes
+# ------------------------------------------
+def stream_trips_of_bikes(lines, bike_ids=None):
+    """
+    Lazily parse the trips of several bikes out of a (possibly unbounded) stream of lines, in a single pass. Lines not
+    having 16 fields, such as headers, are skipped.
+
+    Args:
+        lines (iterable): The lines of the CSV files, e.g. an open file, sys.stdin or follow_file(...).
+        bike_ids (set): The IDs of the bikes that we are interested in. If None, all bikes.
+
+    Yields:
+        dict: The trips of the bikes, as returned by process_line.
+    """
+    for line in lines:
+        trip = process_line_of_bikes(line, bike_ids)
+        if trip:
+            yield trip
+
+
+# ------------------------------------------
+# FUNCTION read_cached_trips_of_bikes
+# ------------------------------------------
+def read_cached_trips_of_bikes(input_folder, cache_folder, bike_ids=None):
+    """
+    Lazily read the trips of several bikes from the columnar cache of the CSV files in the input folder, one file
+    after another in name (i.e. date) order.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+        cache_folder (str): The path to the folder with the columnar cache of the CSV files (see my_dataset_cache).
+        bike_ids (set): The IDs of the bikes that we are interested in. If None, all bikes.
+
+    Yields:
+        dict: The trips of the bikes, as returned by process_table_row.
+    """
+    for filename in sorted(os.listdir(input_folder)):
+        if os.path.isfile(os.path.join(input_folder, filename)) and filename != ".DS_Store":
+            table = my_dataset_cache.load_table(os.path.join(input_folder, filename), cache_folder)
+            for index, bike_id in enumerate(table["columns"]["bike_id"]):
+                if bike_ids is None or bike_id in bike_ids:
+                    yield process_table_row(table, index)
+
+
+# ------------------------------------------
+# FUNCTION read_indexed_lines_of_bikes
+# ------------------------------------------
+def read_indexed_lines_of_bikes(input_folder, index_folder, bike_ids):
+    """
+    Lazily read the lines of the trips of several bikes from the CSV files in the input folder, one file after another
+    in name (i.e. date) order, seeking straight to them through the per-bike index (see my_bike_index). Compressed
+    CSV files (see my_compression) are not indexed, so their lines are read and checked one by one instead.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+        index_folder (str): The path to the folder with the per-bike index of the CSV files.
+        bike_ids (set): The IDs of the bikes that we are interested in.
+
+    Yields:
+        str: The lines of the trips of the bikes.
+    """
+    for filename in sorted(os.listdir(input_folder)):
+        if os.path.isfile(os.path.join(input_folder, filename)) and my_compression.is_compressed(filename):
+            with my_compression.open_file(os.path.join(input_folder, filename), "r") as file:
+                yield from (line for line in file if get_bike_id(line) in bike_ids)
+        elif os.path.isfile(os.path.join(input_folder, filename)) and filename != ".DS_Store":
+            yield from my_bike_index.read_lines(os.path.join(input_folder, filename), index_folder, bike_ids)
+
+
+# ------------------------------------------
+# FUNCTION stream_truck_moves
+# ------------------------------------------
+def stream_truck_moves(trips):
+    """
+    Lazily find the truck moves of a bike out of a stream of its trips. Only the previous trip is kept in memory, and
+    each move is yielded as soon as the trip after it arrives.
+
+    Unlike parse_out, the station names are those of the two trips involved, rather than the last name seen for each
+    station ID over the whole input.
+
+    Args:
+        trips (iterable): The trips of the bike in chronological order, e.g. stream_trips(...).
+
+    Yields:
+        str: Each truck move, formatted as a line of the output file.
+    """
+    for bike_id, output in stream_truck_moves_of_bikes(trips):
+        yield output
+
+
+# ------------------------------------------
+# FUNCTION stream_truck_moves_of_bikes
+# ------------------------------------------
+def stream_truck_moves_of_bikes(trips):
+    """
+    Lazily find the truck moves of several bikes out of a stream of their trips, in a single pass. Only the previous
+    trip of each bike is kept in memory, keyed by bike ID, and each move is yielded as soon as the trip after it
+    arrives.
+
+    Args:
+        trips (iterable): The trips of the bikes in chronological order, e.g. stream_trips_of_bikes(...).
+
+    Yields:
+        tuple: The bike ID and the truck move, formatted as a line of the output file.
+    """
+    previous_trips = {}
+    for trip in trips:
+        previous_trip = previous_trips.get(trip["bike_id"])
+        if previous_trip is not None and previous_trip["stop_station_id"] != trip["start_station_id"]:
+            yield trip["bike_id"], format_truck_move(my_timestamp.format_timestamp(previous_trip["stop_time"]),
+                                                     previous_trip["stop_station_name"],
+                                                     my_timestamp.format_timestamp(trip["start_time"]),
+                                                     trip["start_station_name"])
+        previous_trips[trip["bike_id"]] = trip
+
+
 # ------------------------------------------
 # FUNCTION my_main
 # ------------------------------------------
-def my_main(input_folder, output_file, BIKE_ID):
-    trips, stations = parse_in(input_folder, BIKE_ID)
+def my_main(input_folder, output_file, BIKE_ID, cache_folder=None, index_folder=None):
+    trips, stations = parse_in(input_folder, BIKE_ID, cache_folder, index_folder)
     count = parse_out(output_file, trips, stations)
 
     if count == 1:
@@ -114,6 +416,52 @@ def my_main(input_folder, output_file, BIKE_ID):
         print(f"'{count}' entries written to '{output_file.name}'")
 
 
+# ------------------------------------------
+# FUNCTION my_main_streaming
+# ------------------------------------------
+def my_main_streaming(lines, output_file, BIKE_ID):
+    """
+    Write the truck moves of a bike to the output file as soon as they are found in a (possibly unbounded) stream of
+    lines. The output file is flushed after each move, and the final count is reported on stderr so it does not mix
+    with the moves when writing to stdout.
+    """
+    count = 0
+    for output in stream_truck_moves(stream_trips(lines, BIKE_ID)):
+        output_file.write(output)
+        output_file.flush()
+        count += 1
+
+    print(f"'{count}' entries written to '{output_file.name}'", file=sys.stderr)
+
+
+# ------------------------------------------
+# FUNCTION my_main_bikes
+# ------------------------------------------
+def my_main_bikes(trips, output_folder, bike_ids=None):
+    """
+    Write the truck moves of several bikes, found in a single pass over their trips, to one file per bike named
+    '<bike_id>.txt' in the output folder.
+
+    Args:
+        trips (iterable): The trips of the bikes in chronological order, e.g. stream_trips_of_bikes(...).
+        output_folder (str): The path to the folder to write the files to.
+        bike_ids (set): The IDs of the bikes that we are interested in, which get a file even if they have no truck
+            moves. If None, only the bikes found in the trips get a file.
+    """
+    moves = defaultdict(list)
+    for bike_id, output in stream_truck_moves_of_bikes(trips):
+        moves[bike_id].append(output)
+
+    os.makedirs(output_folder, exist_ok=True)
+    bikes = sorted(set(moves.keys()) | set(bike_ids or ()))
+    count = 0
+    for bike_id in bikes:
+        with my_buffered_writer.open_file(os.path.join(output_folder, f"{bike_id}.txt")) as f:
+            count += my_buffered_writer.write_lines(f, moves[bike_id])
+
+    print(f"'{count}' entries written to '{len(bikes)}' files in '{output_folder}'")
+
+
 # ---------------------------------------------------------------
 #           PYTHON EXECUTION
 # This is the main entry point to the execution of our program.
@@ -125,5 +473,50 @@ if __name__ == '__main__':
     input_folder = "../../my_dataset/"
     output_file = "../../my_results/Student_Solutions/A01_Part2/result.txt"
     BIKE_ID = 35143
-    with open(output_file, 'w') as f:
-        my_main(input_folder, f, BIKE_ID)
+    cache_folder = None  # e.g. "../../my_dataset_cache/" => read the columnar cache of the files (built on first use)
+    index_folder = None  # e.g. "../../my_dataset_index/" => seek to the trips of the bike (indexed on first use)
+    output_folder = "../../my_results/Student_Solutions/A01_Part2/bikes/"  # Used with --bike-ids/--all-bikes
+
+    # If the program is called from console, we can stream the input instead
+    parser = argparse.ArgumentParser(description="Find the moves by truck of a bike.")
+    parser.add_argument("--bike-id", type=int, default=BIKE_ID, help="the ID of the bike (default: %(default)s)")
+    parser.add_argument("--bike-ids", type=int, nargs="+", metavar="BIKE_ID",
+                        help="find the truck moves of several bikes in a single pass, writing one file per bike to "
+                             "--output-folder")
+    parser.add_argument("--all-bikes", action="store_true", help="the same as --bike-ids, for all bikes")
+    parser.add_argument("--output-folder", default=output_folder, help="(default: %(default)s)")
+    parser.add_argument("--stream", metavar="INPUT",
+                        help="stream INPUT (a CSV file, a folder of CSV files or - for stdin) and write each truck "
+                             "move to stdout as soon as it is found")
+    parser.add_argument("--follow", action="store_true",
+                        help="with --stream FILE, keep waiting for new trips appended to FILE, like 'tail -f'")
+    args = parser.parse_args()
+
+    if args.bike_ids is not None or args.all_bikes:
+        bike_ids = None if args.all_bikes else set(args.bike_ids)
+        if args.stream is None and bike_ids is not None and index_folder is not None:
+            my_main_bikes(stream_trips_of_bikes(read_indexed_lines_of_bikes(input_folder, index_folder, bike_ids), bike_ids),
+                          args.output_folder, bike_ids)
+        elif args.stream is None:
+            my_main_bikes(read_cached_trips_of_bikes(input_folder, cache_folder, bike_ids) if cache_folder is not None
+                          else stream_trips_of_bikes(read_folder_lines(input_folder), bike_ids),
+                          args.output_folder, bike_ids)
+        elif args.stream == "-":
+            my_main_bikes(stream_trips_of_bikes(sys.stdin, bike_ids), args.output_folder, bike_ids)
+        elif os.path.isdir(args.stream):
+            my_main_bikes(stream_trips_of_bikes(read_folder_lines(args.stream), bike_ids), args.output_folder, bike_ids)
+        else:
+            with open(args.stream, "r") as f:
+                my_main_bikes(stream_trips_of_bikes(f, bike_ids), args.output_folder, bike_ids)
+    elif args.stream is None:
+        with my_buffered_writer.open_file(output_file) as f:
+            my_main(input_folder, f, args.bike_id, cache_folder, index_folder)
+    elif args.stream == "-":
+        my_main_streaming(sys.stdin, sys.stdout, args.bike_id)
+    elif os.path.isdir(args.stream):
+        my_main_streaming(read_folder_lines(args.stream), sys.stdout, args.bike_id)
+    elif args.follow:
+        my_main_streaming(follow_file(args.stream), sys.stdout, args.bike_id)
+    else:
+        with open(args.stream, "r") as f:
+            my_main_streaming(f, sys.stdout, args.bike_id)
@@ -21,8 +21,19 @@
 # ------------------------------------------
 # IMPORTS
 # ------------------------------------------
+import os
 import sys
-from collections import defaultdict
+import json
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_task_log
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+# The columns my_map_fields needs (start and stop station names), for my_mmap_scanner.scan_fields
+SCANNED_COLUMNS = (4, 8)
 
 # ------------------------------------------
 # FUNCTION process_line
@@ -64,16 +75,127 @@ def my_map(my_input_stream, my_output_stream, my_mapper_input_parameters):
         (start_station, start_count), (stop_station, stop_count) = process_line(line)
         results[start_station] = (results[start_station][0] + start_count, results[start_station][1])
         results[stop_station] = (results[stop_station][0], results[stop_station][1] + stop_count)
-        
+
+    write_results(results, my_output_stream)
+
+
+# ------------------------------------------
+# FUNCTION my_map_table
+# ------------------------------------------
+def my_map_table(my_table, my_output_stream, my_mapper_input_parameters):
+    """
+    Does the same as my_map, but reads the columns of a cached CSV file (see my_dataset_cache.load_table) instead of
+    parsing its lines.
+
+    Args:
+        my_table: A dictionary with the columns of the CSV file, as returned by my_dataset_cache.load_table.
+        my_output_stream: A TextIO object representing the output stream.
+        my_mapper_input_parameters: The same as for my_map.
+
+    Returns:
+        None.
+    """
+    names = my_table["dictionaries"]["start_station_name"]  # Shared by start and stop station names
+    results = defaultdict(lambda: (0, 0))
+    for code, start_count in Counter(my_table["columns"]["start_station_name"]).items():
+        results[names[code]] = (results[names[code]][0] + start_count, results[names[code]][1])
+    for code, stop_count in Counter(my_table["columns"]["stop_station_name"]).items():
+        results[names[code]] = (results[names[code]][0], results[names[code]][1] + stop_count)
+
+    write_results(results, my_output_stream)
+
+
+# ------------------------------------------
+# FUNCTION get_scan_needle
+# ------------------------------------------
+def get_scan_needle(my_mapper_input_parameters):
+    """
+    Returns the bytes that all the lines my_map_fields needs contain, for my_mmap_scanner.scan_fields.
+
+    Args:
+        my_mapper_input_parameters: The same as for my_map.
+
+    Returns:
+        None, as all the lines are needed.
+    """
+    return None
+
+
+# ------------------------------------------
+# FUNCTION my_map_fields
+# ------------------------------------------
+def my_map_fields(my_fields, my_output_stream, my_mapper_input_parameters):
+    """
+    Does the same as my_map, but reads the bytes of the start and stop station names of each line, as scanned by
+    my_mmap_scanner.scan_fields(..., SCANNED_COLUMNS), instead of parsing the lines. The names are counted as bytes,
+    so each distinct name is only decoded once.
+
+    Args:
+        my_fields: An iterable of (start station name, stop station name) bytes tuples.
+        my_output_stream: A TextIO object representing the output stream.
+        my_mapper_input_parameters: The same as for my_map.
+
+    Returns:
+        None.
+    """
+    starts = Counter()
+    stops = Counter()
+    for (start_station, stop_station), count in Counter(my_fields).items():
+        starts[start_station] += count
+        stops[stop_station] += count
+
+    results = defaultdict(lambda: (0, 0))
+    for station, start_count in starts.items():
+        results[station.decode("utf-8")] = (start_count, 0)
+    for station, stop_count in stops.items():
+        station = station.decode("utf-8")
+        results[station] = (results[station][0], stop_count)
+
+    write_results(results, my_output_stream)
+
+
+# ------------------------------------------
+# FUNCTION write_pair
+# ------------------------------------------
+def write_pair(my_output_stream, station, counts):
+    """
+    Writes the start and stop counts of a station to an output stream, either as a binary record if the stream takes
+    them (see my_records.RecordWriter) or as a line with the format 'station_name\t(start_count, stop_count)'.
+
+    Args:
+        my_output_stream: A TextIO object (or a my_records.RecordWriter) representing the output stream.
+        station: The station name.
+        counts: A tuple of its start and stop counts.
+
+    Returns:
+        None.
+    """
+    if hasattr(my_output_stream, "write_record"):
+        my_output_stream.write_record(station, counts)
+    else:
+        my_output_stream.write(f"{station}\t({counts[0]}, {counts[1]})\n")
+
+
+# ------------------------------------------
+# FUNCTION write_results
+# ------------------------------------------
+def write_results(results, my_output_stream):
+    """
+    Writes the start and stop counts of each station to an output stream, sorted by station name.
+
+    Args:
+        results: A dictionary mapping each station name to a tuple of its start and stop counts.
+        my_output_stream: A TextIO object representing the output stream.
+
+    Returns:
+        None.
+    """
     count = 0
     for station, (start_count, stop_count) in sorted(results.items()):
-        my_output_stream.write(f"{station}\t({start_count}, {stop_count})\n")
+        write_pair(my_output_stream, station, (start_count, stop_count))
         count += 1
         
-    if count == 1:
-        print(f"'{count}' entry written to '{my_output_stream.name}'")
-    else:
-        print(f"'{count}' entries written to '{my_output_stream.name}'")
+    my_task_log.log_entries(my_output_stream, count)
 
 
 # ---------------------------------------------------------------
@@ -84,13 +206,17 @@ def my_map(my_input_stream, my_output_stream, my_mapper_input_parameters):
 # its execution.
 # ---------------------------------------------------------------
 if __name__ == '__main__':
-    my_input_stream = sys.stdin
-    my_output_stream = sys.stdout
+    my_input_stream, my_output_stream = my_task_log.open_data_streams()
     my_mapper_input_parameters = [(1, 0), (0, 1)]
-    
-    # 2. We call to my_map
+
+    # 1.1. If the program is called with its input parameters (e.g. by the streaming mode of my_meta-algorithm.py or
+    # by Hadoop Streaming), we take them from the terminal, as JSON
+    if (len(sys.argv) > 1):
+        my_mapper_input_parameters = json.loads(sys.argv[1])
+
+    # 2. We call to my_map. What it logs goes to stderr (see my_task_log), as stdout is the data stream
     my_map(my_input_stream,
            my_output_stream,
            my_mapper_input_parameters
     )
-
+    my_output_stream.flush()
@@ -21,16 +21,268 @@
 # IMPORTS
 # ------------------------------------------
 import os
+import io
+import sys
+import time
+import zlib
+import base64
+import bisect
+import collections
 import shutil
 import codecs
+import heapq
+import inspect
+import json
+import itertools
+import threading
+import subprocess
+import multiprocessing
+import multiprocessing.pool
 import my_mapper
 import my_reducer
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_dataset_cache
+import my_bike_index
+import my_partials
+import my_input_splits
+import my_mmap_scanner
+import my_records
+import my_compression
+import my_metrics
+import my_task_log
+import my_buffered_writer
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+# The number of bytes buffered in the pipes between the streaming mode and its my_mapper.py and my_reducer.py processes
+STREAMING_BUFFER_SIZE = 1 << 16
+
+
+# ------------------------------------------
+# FUNCTION run_combiner
+# ------------------------------------------
+def run_combiner(my_map_stream, my_output_stream, my_combiner, my_combiner_input_parameters):
+    # 1. We sort the mapper output, so that the combiner gets the pairs of each key together (as a reducer would)
+    content = my_map_stream.getvalue().splitlines(True)
+    content.sort(key=lambda line: line.replace('\n', '').split('\t'))
+
+    # 2. We combine it into a buffer with the same name as the output file
+    my_combined_stream = io.StringIO()
+    my_combined_stream.name = my_output_stream.name
+    my_combiner(io.StringIO("".join(content)), my_combined_stream, my_combiner_input_parameters)
+
+    # 3. We write the combined output
+    my_output_stream.write(my_combined_stream.getvalue())
+
+    # 4. We return the number of bytes the combiner saved
+    return len(my_map_stream.getvalue().encode('utf-8')) - len(my_combined_stream.getvalue().encode('utf-8'))
+
+
+# ------------------------------------------
+# FUNCTION run_combiner_records
+# ------------------------------------------
+def run_combiner_records(my_map_data, my_output_stream, my_combiner, my_combiner_input_parameters):
+    # 1. We sort the mapper records, so that the combiner gets the pairs of each key together (as a reducer would)
+    records = sorted(my_records.decode_records(my_map_data))
+
+    # 2. We combine them straight into the output file
+    my_combiner(my_records.RecordReader(records, my_output_stream.name), my_output_stream, my_combiner_input_parameters)
+
+    # 3. We return the number of bytes the combiner saved
+    return len(my_map_data) - my_output_stream.size
+
+
+# ------------------------------------------
+# FUNCTION run_mapper
+# ------------------------------------------
+def run_mapper(input_file,
+               output_file,
+               my_mapper_input_parameters,
+               my_combiner,
+               my_combiner_input_parameters,
+               cache_directory,
+               bike_index_directory,
+               bike_ids,
+               split=None,
+               mmap_scanner=False,
+               binary_records=False
+              ):
+    # 1. We start with no bytes saved by the combiner
+    start_time = time.perf_counter()
+    bytes_saved = 0
+
+    # 2. We open the file to be read (or only its split, or only the lines of the bikes, or load its cached columns, or
+    # scan only the columns the mapper needs) and the file we want to write to.
+    # Compressed files (see my_compression) are decompressed while they are read, as they cannot be indexed or mapped
+    compressed_input = my_compression.is_compressed(input_file)
+    use_bike_index = (bike_index_directory is not None) and (bike_ids is not None) and (not compressed_input)
+    use_mmap_scanner = mmap_scanner and (not compressed_input)
+    if (split is not None):
+        my_input_stream = my_input_splits.read_lines(input_file, split[0], split[1])
+        my_map = my_mapper.my_map
+    elif (use_bike_index):
+        my_input_stream = my_bike_index.read_lines(input_file, bike_index_directory, bike_ids)
+        my_map = my_mapper.my_map
+    elif (cache_directory is not None):
+        my_input_stream = my_dataset_cache.load_table(input_file, cache_directory)
+        my_map = my_mapper.my_map_table
+    elif (use_mmap_scanner):
+        my_input_stream = my_mmap_scanner.scan_fields(input_file,
+                                                      my_mapper.SCANNED_COLUMNS,
+                                                      needle=my_mapper.get_scan_needle(my_mapper_input_parameters)
+                                                     )
+        my_map = my_mapper.my_map_fields
+    else:
+        my_input_stream = my_compression.open_file(input_file, "r", newline="")
+        my_map = my_mapper.my_map
+
+    if (binary_records):
+        my_output_stream = my_records.RecordWriter(my_compression.open_file(output_file, "wb"), output_file)
+    else:
+        my_output_stream = my_compression.open_file(output_file, "w", newline="")
+
+    # 3. If the metrics are switched on (see my_metrics), we count the bytes read and the records read and written
+    metrics = None
+    if (my_metrics.is_enabled()):
+        metrics = my_metrics.new_file_metrics(input_file, output_file)
+        if (split is not None):
+            metrics["bytes_read"] = split[1] - split[0]
+        elif (use_bike_index):
+            metrics["bytes_read"] = sum(len(line.encode('utf-8')) for line in my_input_stream)
+        elif (cache_directory is not None):
+            cache_file = my_dataset_cache.get_cache_file(input_file, cache_directory)
+            metrics["bytes_read"] = my_metrics.get_file_size(cache_file)
+        else:
+            metrics["bytes_read"] = my_metrics.get_file_size(input_file)
+
+        if (my_map == my_mapper.my_map_table):
+            metrics["records_in"] = my_input_stream["num_rows"]
+        else:
+            my_input_stream = my_metrics.CountingStream(my_input_stream, metrics)
+        my_output_stream = my_metrics.CountingStream(my_output_stream, metrics)
+
+    # 4. We process it, collecting whatever my_map logs (see my_task_log) so that the log of concurrent mappers does
+    # not interleave
+    with my_task_log.collect() as my_log_collector:
+        # 4.1. If there is no combiner, the mapper writes straight to the output file
+        if (my_combiner is None):
+            my_map(my_input_stream, my_output_stream, my_mapper_input_parameters)
+
+        # 4.2. Otherwise the mapper writes to a buffer, which is combined into the output file
+        elif (binary_records):
+            my_map_buffer = io.BytesIO()
+            my_map_stream = my_records.RecordWriter(my_map_buffer, output_file)
+            my_map(my_input_stream, my_map_stream, my_mapper_input_parameters)
+            my_map_stream.flush()
+            bytes_saved = run_combiner_records(my_map_buffer.getvalue(),
+                                               my_output_stream,
+                                               my_combiner,
+                                               my_combiner_input_parameters
+                                              )
+        else:
+            my_map_stream = io.StringIO()
+            my_map_stream.name = output_file
+            my_map(my_input_stream, my_map_stream, my_mapper_input_parameters)
+            bytes_saved = run_combiner(my_map_stream, my_output_stream, my_combiner, my_combiner_input_parameters)
+
+    # 5. We close the files
+    if ((split is None) and (not use_bike_index) and (cache_directory is None) and (not use_mmap_scanner)):
+        my_input_stream.close()
+    my_output_stream.close()
+
+    # 6. We return the log of the file as a single line, along with the bytes saved by the combiner and the metrics
+    log = " ".join(my_log_collector.getvalue().split("\n")).strip()
+    if (my_combiner is not None):
+        log = (log + " (combiner saved " + str(bytes_saved) + " bytes)").strip()
+    if (metrics is not None):
+        metrics["counters"] = dict(my_log_collector.counters)
+        metrics["seconds"] = round(time.perf_counter() - start_time, 6)
+        metrics["bytes_written"] = my_metrics.get_file_size(output_file)
+    return log, bytes_saved, metrics
+
+
+# ------------------------------------------
+# FUNCTION run_mapper_task
+# ------------------------------------------
+def run_mapper_task(task):
+    # 1. We unpack the task
+    (input_file, output_file, my_mapper_input_parameters, my_combiner, my_combiner_input_parameters, cache_directory,
+     bike_index_directory, bike_ids, partials_directory, job_key, split, mmap_scanner, binary_records) = task
+    run = lambda: run_mapper(input_file,
+                             output_file,
+                             my_mapper_input_parameters,
+                             my_combiner,
+                             my_combiner_input_parameters,
+                             cache_directory,
+                             bike_index_directory,
+                             bike_ids,
+                             split,
+                             mmap_scanner,
+                             binary_records
+                            )
+
+    # 2. If there is no partials_directory, we just run the mapper
+    if (partials_directory is None):
+        return run()
+
+    # 3. Otherwise we only run it if the file is new or has changed since the last run, keeping its output as the
+    # partial of the file (binary records are kept in base64)
+    start_time = time.perf_counter()
+    metrics = None
+
+    def compute_partial():
+        nonlocal metrics
+        log, bytes_saved, metrics = run()
+        if (binary_records):
+            with my_compression.open_file(output_file, "rb") as my_input_stream:
+                output = base64.b64encode(my_input_stream.read()).decode('ascii')
+        else:
+            with my_compression.open_file(output_file, "r", newline="") as my_input_stream:
+                output = my_input_stream.read()
+        return { "log": log, "bytes_saved": bytes_saved, "output": output }
+
+    partial, computed = my_partials.get_partial(input_file, partials_directory, compute_partial, job_key)
+
+    # 4. If we did not run it, we write the output it had back
+    if (computed):
+        return partial["log"], partial["bytes_saved"], metrics
+    if (binary_records):
+        with my_compression.open_file(output_file, "wb") as my_output_stream:
+            my_output_stream.write(base64.b64decode(partial["output"]))
+    else:
+        with my_compression.open_file(output_file, "w", newline="") as my_output_stream:
+            my_output_stream.write(partial["output"])
+    log = partial["log"] + " (reused from '" + my_partials.get_partial_file(input_file, partials_directory) + "')"
+    if (my_metrics.is_enabled()):
+        metrics = my_metrics.new_file_metrics(input_file, output_file)
+        metrics["reused"] = True
+        metrics["seconds"] = round(time.perf_counter() - start_time, 6)
+        metrics["bytes_read"] = my_metrics.get_file_size(my_partials.get_partial_file(input_file, partials_directory))
+        metrics["bytes_written"] = my_metrics.get_file_size(output_file)
+    return log, partial["bytes_saved"], metrics
+
 
 # ------------------------------------------
 # FUNCTION my_mapper_simulation
 # ------------------------------------------
-def my_mapper_simulation(input_directory, output_directory, my_mapper_input_parameters):
+def my_mapper_simulation(input_directory,
+                         output_directory,
+                         my_mapper_input_parameters,
+                         num_map_workers=1,
+                         my_combiner=None,
+                         my_combiner_input_parameters=None,
+                         cache_directory=None,
+                         bike_index_directory=None,
+                         bike_ids=None,
+                         partials_directory=None,
+                         split_size=None,
+                         mmap_scanner=False,
+                         binary_records=False,
+                         compression=None
+                        ):
     # 1. We create the map_simulation folder
 
     # 1.1. If it already existed, then we remove it
@@ -45,137 +297,482 @@ def my_mapper_simulation(input_directory, output_directory, my_mapper_input_para
     if (".DS_Store" in file_names):
         file_names.remove(".DS_Store")
 
-    # 3. We process each file sequentially
+    # 3. We create one task per file. The output file name only depends on the input file name.
+    # The input files can be compressed (e.g. '2019_05_01.csv.gz', see my_compression). These are never split.
+    # If binary_records is True, the mappers write their pairs as binary records (see my_records) rather than text.
+    # If there is a compression codec ("gzip", "bz2" or "lzma"), the mappers compress the files they write.
+    # If there is a split_size, the files bigger than it are split into chunks of about split_size bytes aligned to
+    # line breaks (see my_input_splits), and we create one task per chunk instead, so that the chunks of a single
+    # huge file are mapped concurrently. These chunks are read as lines, without the cache, index or partials below.
+    # The combiner (if any) is a function with the same signature as my_map and my_reduce, writing pairs in the format
+    # of the mapper, e.g. my_reducer.my_reduce for Part 3 or my_reducer.my_combine for Part 4.
+    # If there is a cache_directory, the mappers read the columnar cache of the files (see my_dataset_cache).
+    # Otherwise, if mmap_scanner is True, the mappers only read the columns they need, scanned from a memory map of
+    # the files (see my_mmap_scanner and my_mapper.my_map_fields).
+    # If there is a bike_index_directory and some bike_ids, the mappers only read the lines of the trips of these bikes
+    # (see my_bike_index), seeking straight to them.
+    # If there is a partials_directory, the output of each mapper is kept there, and the files that have not changed
+    # since the last run are not mapped again (see my_partials). The key of the job changes with the code of the
+    # mapper and combiner and with their parameters, so that the outputs of other jobs are not reused
+    if (bike_index_directory is None):
+        bike_ids = None
+
+    job_key = None
+    if (partials_directory is not None):
+        source_files = [ my_mapper.__file__ ]
+        if (my_combiner is not None):
+            source_files.append(inspect.getsourcefile(my_combiner))
+        job_key = my_partials.get_job_key(source_files,
+                                          [ my_mapper_input_parameters,
+                                            None if (my_combiner is None) else my_combiner.__qualname__,
+                                            my_combiner_input_parameters,
+                                            bike_ids,
+                                            binary_records
+                                          ]
+                                         )
+
+    extension = (".bin" if (binary_records) else "") + my_compression.get_extension(compression)
+    tasks = []
     for file in file_names:
-        # 3.1. We open the file to be read
-        my_input_stream = codecs.open(input_directory + file, "r", encoding='utf-8')
+        name = my_compression.strip_extension(file)
+        if ((split_size is None) or (os.path.getsize(input_directory + file) <= split_size) or
+                my_compression.is_compressed(file)):
+            tasks.append( (input_directory + file,
+                           output_directory + "1_my_map_simulation/map_" + name + extension,
+                           my_mapper_input_parameters,
+                           my_combiner,
+                           my_combiner_input_parameters,
+                           cache_directory,
+                           bike_index_directory,
+                           bike_ids,
+                           partials_directory,
+                           job_key,
+                           None,
+                           mmap_scanner,
+                           binary_records
+                          )
+                        )
+        else:
+            for index, split in enumerate(my_input_splits.get_splits(input_directory + file, split_size)):
+                tasks.append( (input_directory + file,
+                               output_directory + "1_my_map_simulation/map_" + name + "_split_" + str(index)
+                               + extension,
+                               my_mapper_input_parameters,
+                               my_combiner,
+                               my_combiner_input_parameters,
+                               None,
+                               None,
+                               None,
+                               None,
+                               None,
+                               split,
+                               False,
+                               binary_records
+                              )
+                            )
 
-        # 3.2. We open the file we want to write to
-        my_output_stream = codecs.open(output_directory + "1_my_map_simulation/map_" + file, "w", encoding='utf-8')
+    # 4. We process the files
+    total_bytes_saved = 0
+    file_metrics = []
 
-        # 3.4. We process it
-        my_mapper.my_map(my_input_stream, my_output_stream, my_mapper_input_parameters)
+    # 4.1. If None, we use as many workers as cores
+    if (num_map_workers is None):
+        num_map_workers = os.cpu_count() or 1
 
-        # 3.4. We close the files
-        my_input_stream.close()
-        my_output_stream.close()
+    # 4.2. Either sequentially or concurrently in a pool of processes.
+    # In both cases the logs are printed in the order of the files
+    if ((num_map_workers > 1) and (len(tasks) > 1)):
+        with multiprocessing.Pool(min(num_map_workers, len(tasks))) as pool:
+            for log, bytes_saved, metrics in pool.imap(run_mapper_task, tasks):
+                if (log != ""):
+                    print(log)
+                total_bytes_saved = total_bytes_saved + bytes_saved
+                file_metrics.append(metrics)
+    else:
+        for task in tasks:
+            log, bytes_saved, metrics = run_mapper_task(task)
+            if (log != ""):
+                print(log)
+            total_bytes_saved = total_bytes_saved + bytes_saved
+            file_metrics.append(metrics)
+
+    # 5. We report the bytes saved by the combiner
+    if (my_combiner is not None):
+        print("Combiner saved " + str(total_bytes_saved) + " bytes of mapper output")
+
+    # 6. We return the metrics of each file (None if the metrics are switched off, see my_metrics)
+    return file_metrics
 
 
 # ------------------------------------------
-# FUNCTION get_first_half_ub
+# FUNCTION read_key_value_pairs
 # ------------------------------------------
-# Precondition: my_list has at least two keys
-def get_first_half_ub(my_list):
-    # 1. We create the output variable
-    res = -1
+def read_key_value_pairs(file_name, binary_records=False):
+    # 1. If the file holds binary records, we yield their (key, value) pairs one by one
+    if (binary_records):
+        yield from my_records.read_record_file(file_name)
+        return
 
-    # 2. We look for the middle index and middle key
-    size = len(my_list)
-    index = size // 2
-    middle_key = my_list[index][0]
+    # 2. Otherwise we open the file for reading (decompressing it, if it is compressed)
+    with my_compression.open_file(file_name, "r", newline="") as my_input_stream:
+        # 3. We yield its (key, value) pairs one by one
+        yield from parse_key_value_pairs(my_input_stream)
 
-    # 3. We set up a deviation of 1
-    deviation = 1
 
-    # 4. While we haven't found a different key and there are candidates to try
-    while ((res == -1) and ((index + deviation) < size)):
-        # 4.1. If we found a further position p with a different key, we set the ub to p-1
-        if (my_list[index + deviation][0] != middle_key):
-            res = index + (deviation - 1)
-        else:
-            # 4.2. If we found a previous position p with a different key, we set up ub to p
-            if (my_list[index - deviation][0] != middle_key):
-                res = index - deviation
-            # 4.3. Otherwise we keep trying with the next position
+# ------------------------------------------
+# FUNCTION parse_key_value_pairs
+# ------------------------------------------
+def parse_key_value_pairs(my_input_stream):
+    # 1. We yield the (key, value) pair of each line 'key\tvalue' of the stream
+    for line in my_input_stream:
+        line = line.replace('\n', '')
+        words = line.split('\t')
+        yield (words[0], words[1])
+
+
+# ------------------------------------------
+# FUNCTION populate_runs
+# ------------------------------------------
+def populate_runs(map_directory,
+                  runs_directory,
+                  max_run_size,
+                  max_sample_size=10000,
+                  binary_records=False,
+                  compression=None
+                 ):
+    # 1. We create the output variables
+    extension = (".bin" if (binary_records) else ".txt") + my_compression.get_extension(compression)
+    runs = []
+    size = 0
+    sample = []
+    sample_step = 1
+    key_counts = collections.Counter()
+
+    # 2. We traverse the mapper output files
+    for file in sorted(os.listdir(map_directory)):
+        # 2.1. We split the file into chunks of at most max_run_size pairs
+        pairs = read_key_value_pairs(map_directory + file, binary_records)
+        num_chunks = 0
+        chunk = list(itertools.islice(pairs, max_run_size))
+
+        while (len(chunk) > 0):
+            size = size + len(chunk)
+            num_chunks = num_chunks + 1
+
+            # 2.2. If the whole file is a single chunk that is already sorted, then it is a run as it is
+            if ((num_chunks == 1) and (len(chunk) < max_run_size) and
+                    all(chunk[index] <= chunk[index + 1] for index in range(len(chunk) - 1))):
+                runs.append(map_directory + file)
+
+            # 2.3. Otherwise we sort the chunk and spill it to disk as a new run
             else:
-                deviation = deviation + 1
+                chunk.sort()
+                runs.append(populate_reducer_input_file(chunk,
+                                                        runs_directory,
+                                                        "run_" + str(len(runs)) + extension,
+                                                        binary_records
+                                                       )
+                           )
 
-    assert (res != -1)
+            # 2.4. We sample the keys of the chunk. If the sample gets too big, we halve it and sample less often
+            sample.extend(key for key, value in chunk[::sample_step])
+            while (len(sample) > max_sample_size):
+                sample = sample[::2]
+                sample_step = sample_step * 2
 
-    # 5. We return res
-    return res
+            # 2.5. We count the pairs of each key, so that the keys can be traversed in sorted order without merging
+            # the runs (the keys are far fewer than the pairs, e.g. stations or bikes)
+            key_counts.update(key for key, value in chunk)
+
+            # 2.6. We get the next chunk
+            chunk = list(itertools.islice(pairs, max_run_size))
+
+    # 3. We return the runs, the total number of pairs, the sample of keys and the number of pairs of each key
+    return runs, size, sample, key_counts
+
+
+# ------------------------------------------
+# FUNCTION merge_runs
+# ------------------------------------------
+def merge_runs(runs, runs_directory, max_merge_fan_in, binary_records=False, compression=None):
+    # 1. While there are more runs than files we want to keep open at once, we merge the first ones into a new run
+    extension = (".bin" if (binary_records) else ".txt") + my_compression.get_extension(compression)
+    runs = list(runs)
+    num_merges = 0
+    while (len(runs) > max_merge_fan_in):
+        my_pairs = heapq.merge(*[ read_key_value_pairs(run, binary_records) for run in runs[:max_merge_fan_in] ])
+        name = populate_reducer_input_file(my_pairs,
+                                           runs_directory,
+                                           "merge_" + str(num_merges) + extension,
+                                           binary_records
+                                          )
+        runs = runs[max_merge_fan_in:] + [ name ]
+        num_merges = num_merges + 1
+
+    # 2. We return a k-way merge of the remaining runs, streamed in sorted order
+    return heapq.merge(*[ read_key_value_pairs(run, binary_records) for run in runs ])
+
+
+# ------------------------------------------
+# FUNCTION get_range_split_keys
+# ------------------------------------------
+# Precondition: my_keys is sorted and has size elements
+def get_range_split_keys(my_keys, size, num_reducers):
+    # 1. We create the output variable
+    res = []
+
+    # 2. We look for the indexes splitting the keys into num_reducers parts of the same size
+    indexes = [ (reducer * size) // num_reducers for reducer in range(1, num_reducers) ]
+
+    # 3. We traverse the runs of equal keys. Each run spans the positions lb..ub
+    lb = 0
+    previous_key = None
+    key = None
+    my_keys = itertools.chain(my_keys, [ None ])
+
+    for position, next_key in enumerate(my_keys):
+        # 3.1. If the run of key goes on, we keep traversing it
+        if ((position == 0) or ((position < size) and (next_key == key))):
+            key = next_key
+            continue
+
+        # 3.2. Otherwise the run of key is over
+        ub = position - 1
+
+        # 3.3. For each index in the run, we look outward from it for a different key.
+        # For the same deviation, a further position is tried before a previous one
+        while ((len(indexes) > 0) and (indexes[0] <= ub)):
+            index = indexes.pop(0)
+
+            # 3.3.1. If we found a further position p with a different key, the first part ends at p-1 with key
+            if ((ub + 1 < size) and ((lb == 0) or (ub + 1 - index <= index - lb + 1))):
+                res.append(key)
+            # 3.3.2. If we found a previous position p with a different key, the first part ends at p with previous_key
+            elif (lb > 0):
+                res.append(previous_key)
+
+        # 3.4. If there are no indexes left, we are done
+        if (len(indexes) == 0):
+            break
+
+        # 3.5. We start the next run
+        lb = position
+        previous_key = key
+        key = next_key
+
+    # 4. We return res, without repeated keys
+    return sorted(set(res))
+
+
+# ------------------------------------------
+# FUNCTION range_partitioner
+# ------------------------------------------
+def range_partitioner(get_keys, size, sample, num_reducers):
+    # 1. We traverse the sorted keys to split them into parts of (almost) the same number of pairs
+    split_keys = get_range_split_keys(get_keys(), size, num_reducers)
+
+    # 2. We return the number of partitions and the partition of each key
+    return len(split_keys) + 1, lambda key: bisect.bisect_left(split_keys, key)
+
+
+# ------------------------------------------
+# FUNCTION sampled_range_partitioner
+# ------------------------------------------
+def sampled_range_partitioner(get_keys, size, sample, num_reducers):
+    # 1. We pick the split keys from the sorted sample, so that we do not traverse the keys again
+    sample = sorted(sample)
+    split_keys = []
+    if (len(sample) > 0):
+        split_keys = [ sample[(reducer * len(sample)) // num_reducers] for reducer in range(1, num_reducers) ]
+        split_keys = sorted(set(key for key in split_keys if (key != sample[-1])))
+
+    # 2. We return the number of partitions and the partition of each key
+    return len(split_keys) + 1, lambda key: bisect.bisect_left(split_keys, key)
+
+
+# ------------------------------------------
+# FUNCTION hash_partitioner
+# ------------------------------------------
+def hash_partitioner(get_keys, size, sample, num_reducers):
+    # 1. We return the number of partitions and the partition of each key.
+    # We use crc32 rather than hash, as the later is salted differently on each Python process
+    return num_reducers, lambda key: zlib.crc32(key.encode('utf-8')) % num_reducers
+
+
+# ------------------------------------------
+# PARTITIONERS
+# ------------------------------------------
+partitioners = { "range": range_partitioner,
+                 "sampled_range": sampled_range_partitioner,
+                 "hash": hash_partitioner
+               }
 
 
 # ------------------------------------------
 # FUNCTION populate_reducer_input_file
 # ------------------------------------------
-def populate_reducer_input_file(my_list, lb_index, ub_index, name):
-    # 1. We open the file for writing
-    my_output_stream = codecs.open(output_directory + "2_my_sort_simulation/" + name, "w", encoding='utf-8')
+def populate_reducer_input_file(my_pairs, sort_directory, name, binary_records=False):
+    # 1. We open the file for writing (compressing it, if its name has the extension of a codec)
+    if (binary_records):
+        my_output_stream = my_records.RecordWriter(my_compression.open_file(sort_directory + name, "wb"))
+    else:
+        my_output_stream = my_compression.open_file(sort_directory + name, "w", newline="")
 
     # 2. We populate it
-    for index in range(lb_index, ub_index+1):
-        # 2.1. We get the item
-        item = my_list[index]
+    for item in my_pairs:
+        # 2.1. If the file holds binary records, we write the pair as a record
+        if (binary_records):
+            my_output_stream.write_record(item[0], item[1])
 
-        # 2.2. We generate the String and print it
-        my_str = str(item[0]) + '\t' + str(item[1]) + '\n'
-        my_output_stream.write(my_str)
+        # 2.2. Otherwise we generate the String and print it
+        else:
+            my_str = str(item[0]) + '\t' + str(item[1]) + '\n'
+            my_output_stream.write(my_str)
 
     # 3. We close the file
     my_output_stream.close()
 
+    # 4. We return the name of the file
+    return sort_directory + name
+
 
 # ------------------------------------------
 # FUNCTION my_sort_simulation
 # ------------------------------------------
-def my_sort_simulation(output_directory):
-    # 1. We create the sort_simulation folder
+def my_sort_simulation(output_directory,
+                       num_reducers=2,
+                       partitioner="range",
+                       max_run_size=100000,
+                       max_merge_fan_in=64,
+                       binary_records=False,
+                       compression=None
+                      ):
+    # 1. We create the sort_simulation folder and the folder for the runs spilled to disk
+    sort_directory = output_directory + "2_my_sort_simulation/"
+    runs_directory = output_directory + "2_my_sort_simulation_runs/"
 
-    # 1.1. If it already existed, then we remove it
-    if os.path.exists(output_directory + "2_my_sort_simulation/"):
-        shutil.rmtree(output_directory + "2_my_sort_simulation/")
+    for directory in [ sort_directory, runs_directory ]:
+        # 1.1. If it already existed, then we remove it
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
 
-    # 1.2. We create it again
-    os.makedirs(output_directory + "2_my_sort_simulation/")
+        # 1.2. We create it again
+        os.makedirs(directory)
 
-    # 2. We collect the list of files we have to process
-    file_names = sorted(os.listdir(output_directory + "1_my_map_simulation"))
+    # 2. We sort the output of each mapper into runs of bounded size
+    runs, size, sample, key_counts = populate_runs(output_directory + "1_my_map_simulation/",
+                                                   runs_directory,
+                                                   max_run_size,
+                                                   binary_records=binary_records,
+                                                   compression=compression
+                                                  )
 
-    # 3. We traverse the files to populate content
-    content = []
-    num_reducers = 1
+    # 3. We partition the keys among (at most) num_reducers reducers. A partitioner is either the name of
+    # one of the partitioners above or a function with the same signature.
+    # The sorted keys are rebuilt from the number of pairs of each key, so that the runs are only merged once, below
+    if (partitioner in partitioners):
+        partitioner = partitioners[partitioner]
 
-    for file in file_names:
-        # 3.1. We open the file for reading
-        my_input_stream = codecs.open(output_directory + "1_my_map_simulation/" + file, encoding='utf-8')
+    get_keys = lambda: itertools.chain.from_iterable(itertools.repeat(key, count)
+                                                     for key, count in sorted(key_counts.items())
+                                                    )
+    num_partitions, get_partition = partitioner(get_keys, size, sample, num_reducers)
+
+    # 4. We populate the reducers, streaming the merged runs straight into them.
+    # All the pairs of a key go to the same reducer. With binary_records, the reducer input files hold binary records.
+    # With a compression codec, the runs and the reducer input files are compressed
+    extension = (".bin" if (binary_records) else ".txt") + my_compression.get_extension(compression)
+    file_names = [ sort_directory + "sort_" + str(partition + 1) + extension for partition in range(num_partitions) ]
+    if (binary_records):
+        my_output_streams = [ my_records.RecordWriter(my_compression.open_file(file_name, "wb"))
+                              for file_name in file_names
+                            ]
+    else:
+        my_output_streams = [ my_compression.open_file(file_name, "w", newline="") for file_name in file_names ]
 
-        # 3.2. We read the file content
-        for line in my_input_stream:
-            line = line.replace('\n', '')
-            words = line.split('\t')
-            content.append( (words[0], words[1]) )
+    my_pairs = merge_runs(runs, runs_directory, max_merge_fan_in, binary_records, compression)
+    for key, my_pairs_of_key in itertools.groupby(my_pairs, lambda item: item[0]):
+        my_output_stream = my_output_streams[get_partition(key)]
+        for item in my_pairs_of_key:
+            if (binary_records):
+                my_output_stream.write_record(item[0], item[1])
+            else:
+                my_output_stream.write(str(item[0]) + '\t' + str(item[1]) + '\n')
 
-        # 3.3. We close the file
-        my_input_stream.close()
+    for my_output_stream in my_output_streams:
+        my_output_stream.close()
 
-    # 4. We sort the content
-    content.sort()
+    # 5. We remove the runs spilled to disk
+    shutil.rmtree(runs_directory)
 
-    # 5. We check if we can make two reducers
-    size = len(content)
-    ub_index = -1
+    # 6. We return the metrics of the sort (if switched on, see my_metrics, also those of each reducer input file)
+    res = { "records_in": size, "runs": len(runs), "files": [] }
+    if (my_metrics.is_enabled()):
+        map_directory = output_directory + "1_my_map_simulation/"
+        res["bytes_read"] = sum(my_metrics.get_file_size(map_directory + file) for file in os.listdir(map_directory))
+        for file_name in file_names:
+            metrics = my_metrics.new_file_metrics(None, file_name)
+            metrics["records_out"] = sum(1 for item in read_key_value_pairs(file_name, binary_records))
+            metrics["bytes_written"] = my_metrics.get_file_size(file_name)
+            res["files"].append(metrics)
+    return res
 
-    # 5.1. If there is at least two (key, value) pairs with different keys...
-    if ((size > 1) and (content[0][0] != content[size-1][0])):
-        # 5.1.1. We set up the number of reducers to 2
-        num_reducers = 2
 
-        # 5.1.2. We get the ub of the first reducer
-        ub_index = get_first_half_ub(content)
+# ------------------------------------------
+# FUNCTION run_reducer_task
+# ------------------------------------------
+def run_reducer_task(task):
+    # 1. We unpack the task
+    input_file, output_file, my_reducer_input_parameters, binary_records, top_n_mode = task
+    start_time = time.perf_counter()
+    metrics = None
 
-    # 6. We populate the reducers
-    if (num_reducers == 2):
-        populate_reducer_input_file(content, 0, ub_index, "sort_1.txt")
-        populate_reducer_input_file(content, ub_index+1, size-1, "sort_2.txt")
+    # 2. We open the file to be read (as lines or as binary records, compressed or not) and the file we want to write
+    # to, which is always uncompressed text, written in large chunks (see my_buffered_writer)
+    if (binary_records):
+        my_input_stream = my_records.RecordReader(my_records.read_record_file(input_file), input_file)
     else:
-        populate_reducer_input_file(content, 0, size-1, "sort_1.txt")
+        my_input_stream = my_compression.open_file(input_file, "r", newline="")
+    my_output_stream = my_buffered_writer.open_file(output_file, newline="")
+
+    # 3. If the metrics are switched on (see my_metrics), we count the records read and written
+    if (my_metrics.is_enabled()):
+        metrics = my_metrics.new_file_metrics(input_file, output_file)
+        metrics["bytes_read"] = my_metrics.get_file_size(input_file)
+        my_input_stream = my_metrics.CountingStream(my_input_stream, metrics)
+        my_output_stream = my_metrics.CountingStream(my_output_stream, metrics)
+
+    # 4. We process it, collecting whatever my_reduce logs (see my_task_log) so that the log of concurrent reducers
+    # does not interleave
+    with my_task_log.collect() as my_log_collector:
+        my_reduce = my_reducer.my_reduce_top_n if (top_n_mode) else my_reducer.my_reduce
+        my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters)
+
+    # 5. We close the files
+    my_input_stream.close()
+    my_output_stream.close()
+
+    # 6. We return the log of the file as a single line, along with the time the reducer took, and the metrics
+    seconds = time.perf_counter() - start_time
+    log = " ".join(my_log_collector.getvalue().split("\n")).strip()
+    if (log != ""):
+        log = log + " in " + "{:.3f}".format(seconds) + " seconds"
+    if (metrics is not None):
+        metrics["counters"] = dict(my_log_collector.counters)
+        metrics["seconds"] = round(seconds, 6)
+        metrics["bytes_written"] = my_metrics.get_file_size(output_file)
+    return log, metrics
 
 
 # ------------------------------------------
 # FUNCTION my_reducer_simulation
 # ------------------------------------------
-def my_reducer_simulation(output_directory, my_reducer_input_parameters):
+def my_reducer_simulation(output_directory,
+                          my_reducer_input_parameters,
+                          num_reduce_workers=1,
+                          binary_records=False,
+                          top_n_mode=False
+                         ):
     # 1. We create the map_simulation folder
 
     # 1.1. If it already existed, then we remove it
@@ -188,20 +785,252 @@ def my_reducer_simulation(output_directory, my_reducer_input_parameters):
     # 2. We collect the list of files we have to process
     file_names = sorted(os.listdir(output_directory + "2_my_sort_simulation/"))
 
-    # 3. We process each file sequentially
-    for file in file_names:
-        # 3.1. We open the file to be read
-        my_input_stream = codecs.open(output_directory + "2_my_sort_simulation/" + file, "r", encoding='utf-8')
+    # 3. We create one task per file. Each reducer writes to its own reduce_ text file
+    tasks = [ (output_directory + "2_my_sort_simulation/" + file,
+               output_directory + "3_my_reduce_simulation/reduce_"
+               + os.path.splitext(my_compression.strip_extension(file))[0] + ".txt",
+               my_reducer_input_parameters,
+               binary_records,
+               top_n_mode
+              )
+              for file in file_names
+            ]
 
-        # 3.2. We open the file we want to write to
-        my_output_stream = codecs.open(output_directory + "3_my_reduce_simulation/reduce_" + file, "w", encoding='utf-8')
+    # 4. We process the files
 
-        # 3.3. We process it
-        my_reducer.my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters)
+    # 4.1. If None, we use as many workers as cores
+    if (num_reduce_workers is None):
+        num_reduce_workers = os.cpu_count() or 1
 
-        # 3.4. We close the files
+    # 4.2. Either sequentially or concurrently in a pool of processes.
+    # In both cases the logs are printed in the order of the files
+    file_metrics = []
+    if ((num_reduce_workers > 1) and (len(tasks) > 1)):
+        with multiprocessing.Pool(min(num_reduce_workers, len(tasks))) as pool:
+            for log, metrics in pool.imap(run_reducer_task, tasks):
+                if (log != ""):
+                    print(log)
+                file_metrics.append(metrics)
+    else:
+        for task in tasks:
+            log, metrics = run_reducer_task(task)
+            if (log != ""):
+                print(log)
+            file_metrics.append(metrics)
+
+    # 5. We return the metrics of each file (None if the metrics are switched off, see my_metrics)
+    return file_metrics
+
+
+# ------------------------------------------
+# FUNCTION my_top_n_simulation
+# ------------------------------------------
+def my_top_n_simulation(output_directory, my_reducer_input_parameters):
+    # 1. We create the top_n_simulation folder
+
+    # 1.1. If it already existed, then we remove it
+    if os.path.exists(output_directory + "4_my_top_n_simulation/"):
+        shutil.rmtree(output_directory + "4_my_top_n_simulation/")
+
+    # 1.2. We create it again
+    os.makedirs(output_directory + "4_my_top_n_simulation/")
+
+    # 2. We open the top-N list of each reducer and the file we want to write to
+    reduce_directory = output_directory + "3_my_reduce_simulation/"
+    my_input_streams = [ codecs.open(reduce_directory + file, "r", encoding='utf-8')
+                         for file in sorted(os.listdir(reduce_directory))
+                       ]
+    my_output_stream = my_buffered_writer.open_file(output_directory + "4_my_top_n_simulation/top_n.txt", newline="")
+
+    # 3. We merge the lists into the top-N overall
+    my_reducer.merge_top_n(my_input_streams, my_output_stream, my_reducer_input_parameters)
+
+    # 4. We close the files
+    for my_input_stream in my_input_streams:
         my_input_stream.close()
-        my_output_stream.close()
+    my_output_stream.close()
+
+    print("Top-N of " + str(len(my_input_streams)) + " reducers merged into '" + my_output_stream.name + "'")
+
+
+# ------------------------------------------
+# FUNCTION start_script
+# ------------------------------------------
+def start_script(script_file, input_parameters, my_input_stream, my_output_stream):
+    # 1. We run the script as Hadoop Streaming would: its input parameters are given as JSON on the command line, its
+    # data is read from stdin and written to stdout, and what it prints goes to stderr. Text is always UTF-8
+    environment = dict(os.environ, PYTHONIOENCODING="utf-8")
+    command = [ sys.executable, script_file, json.dumps(input_parameters, default=sorted) ]
+    process = subprocess.Popen(command,
+                               stdin=my_input_stream,
+                               stdout=my_output_stream,
+                               stderr=subprocess.PIPE,
+                               env=environment,
+                               bufsize=STREAMING_BUFFER_SIZE
+                              )
+
+    # 2. We read what it prints in a thread of its own, so that it never blocks on a full stderr pipe
+    log = []
+    log_thread = threading.Thread(target=lambda: log.append(process.stderr.read().decode("utf-8", "replace")))
+    log_thread.start()
+
+    # 3. We return the process, along with a function waiting for it to end and returning its log as a single line
+    def wait():
+        process.wait()
+        log_thread.join()
+        process.stderr.close()
+        if (process.returncode != 0):
+            raise subprocess.CalledProcessError(process.returncode, command, stderr=log[0])
+        return " ".join(log[0].split("\n")).strip()
+
+    return process, wait
+
+
+# ------------------------------------------
+# FUNCTION feed_script
+# ------------------------------------------
+def feed_script(input_file, process):
+    # 1. We decompress the file into the stdin of the script, and then close it
+    try:
+        with my_compression.open_file(input_file, "rb") as my_input_stream:
+            shutil.copyfileobj(my_input_stream, process.stdin, STREAMING_BUFFER_SIZE)
+        process.stdin.close()
+
+    # 2. If the script ended before reading it all, its exit code reports the failure
+    except BrokenPipeError:
+        pass
+
+
+# ------------------------------------------
+# FUNCTION run_streaming_mapper
+# ------------------------------------------
+def run_streaming_mapper(task):
+    # 1. We unpack the task
+    input_file, mapper_file, my_mapper_input_parameters = task
+
+    # 2. We start the mapper with the file as its stdin. Compressed files (see my_compression) are decompressed into
+    # a pipe instead, in a thread of their own
+    if (my_compression.is_compressed(input_file)):
+        process, wait = start_script(mapper_file, my_mapper_input_parameters, subprocess.PIPE, subprocess.PIPE)
+        feed_thread = threading.Thread(target=feed_script, args=(input_file, process))
+        feed_thread.start()
+    else:
+        with open(input_file, "rb") as my_input_stream:
+            process, wait = start_script(mapper_file, my_mapper_input_parameters, my_input_stream, subprocess.PIPE)
+        feed_thread = None
+
+    # 3. We read the pairs it writes to its stdout as they come, and sort them into a run. If the metrics are switched
+    # on (see my_metrics), we count the lines and bytes read from the pipe
+    metrics = None
+    with io.TextIOWrapper(process.stdout, encoding="utf-8", newline="") as my_map_stream:
+        if (my_metrics.is_enabled()):
+            metrics = my_metrics.new_file_metrics(input_file, None)
+            my_map_stream = my_metrics.CountingStream(my_map_stream, metrics, count_bytes=True)
+        run = sorted(parse_key_value_pairs(my_map_stream))
+
+    # 4. We wait for it to end, and return its log along with the run and the metrics
+    if (feed_thread is not None):
+        feed_thread.join()
+    log = wait()
+    if (log != ""):
+        log = log + " (mapper of '" + input_file + "')"
+    return log, run, metrics
+
+
+# ------------------------------------------
+# FUNCTION my_streaming_simulation
+# ------------------------------------------
+def my_streaming_simulation(input_directory,
+                            output_directory,
+                            my_mapper_input_parameters,
+                            my_reducer_input_parameters,
+                            num_map_workers=1,
+                            num_reducers=2,
+                            partitioner="range",
+                            max_sample_size=10000
+                           ):
+    # 1. We create the reduce_simulation folder, and remove the folders of the other stages left by previous runs, as
+    # no files are passed between the stages
+
+    # 1.1. If it already existed, then we remove it
+    for directory in [ "1_my_map_simulation/", "2_my_sort_simulation/", "3_my_reduce_simulation/" ]:
+        if os.path.exists(output_directory + directory):
+            shutil.rmtree(output_directory + directory)
+
+    # 1.2. We create it again
+    os.makedirs(output_directory + "3_my_reduce_simulation/")
+
+    # 2. We collect the list of files we have to process
+    file_names = sorted(os.listdir(input_directory))
+    if (".DS_Store" in file_names):
+        file_names.remove(".DS_Store")
+
+    # 3. We run one my_mapper.py process per file, up to num_map_workers at once. The processes do the work, so we
+    # only need a thread to drive each of them. Their output is sorted into a run in memory as it is read
+    if (num_map_workers is None):
+        num_map_workers = os.cpu_count() or 1
+    tasks = [ (input_directory + file, my_mapper.__file__, my_mapper_input_parameters) for file in file_names ]
+    runs = []
+    files = []
+    with multiprocessing.pool.ThreadPool(max(1, min(num_map_workers, len(tasks)))) as pool:
+        for log, run, metrics in pool.imap(run_streaming_mapper, tasks):
+            if (log != ""):
+                print(log)
+            runs.append(run)
+            files.append(metrics)
+
+    # 4. We sample the keys of the runs, and partition the keys among (at most) num_reducers reducers
+    size = sum(len(run) for run in runs)
+    sample_step = max(1, size // max_sample_size)
+    sample = sorted(key for run in runs for key, value in run[::sample_step])
+    if (partitioner in partitioners):
+        partitioner = partitioners[partitioner]
+    get_keys = lambda: (key for key, value in heapq.merge(*runs))
+    num_partitions, get_partition = partitioner(get_keys, size, sample, num_reducers)
+
+    # 5. We start one my_reducer.py process per partition, writing straight to its output file, and stream the k-way
+    # merge of the runs into their stdin. All the pairs of a key go to the same reducer, in sorted order
+    start_time = time.perf_counter()
+    output_files = [ output_directory + "3_my_reduce_simulation/reduce_sort_" + str(partition + 1) + ".txt"
+                     for partition in range(num_partitions)
+                   ]
+    reducers = []
+    for output_file in output_files:
+        with open(output_file, "wb") as my_output_stream:
+            reducers.append(start_script(my_reducer.__file__,
+                                         my_reducer_input_parameters,
+                                         subprocess.PIPE,
+                                         my_output_stream
+                                        )
+                           )
+    my_reduce_streams = [ io.TextIOWrapper(process.stdin, encoding="utf-8", newline="") for process, wait in reducers ]
+
+    # 5.1. If the metrics are switched on (see my_metrics), we count the lines and bytes written to each pipe
+    if (my_metrics.is_enabled()):
+        reduce_metrics = [ my_metrics.new_file_metrics(None, output_file) for output_file in output_files ]
+        my_reduce_streams = [ my_metrics.CountingStream(my_reduce_stream, metrics, count_bytes=True)
+                              for my_reduce_stream, metrics in zip(my_reduce_streams, reduce_metrics)
+                            ]
+        files.extend(reduce_metrics)
+
+    for key, my_pairs_of_key in itertools.groupby(heapq.merge(*runs), lambda item: item[0]):
+        my_reduce_stream = my_reduce_streams[get_partition(key)]
+        for item in my_pairs_of_key:
+            my_reduce_stream.write(item[0] + '\t' + item[1] + '\n')
+
+    for my_reduce_stream in my_reduce_streams:
+        my_reduce_stream.close()
+
+    # 6. We wait for the reducers to end, and print their logs in order
+    for output_file, (process, wait) in zip(output_files, reducers):
+        log = wait()
+        seconds = time.perf_counter() - start_time
+        if (log != ""):
+            print(log + " (reducer of '" + output_file + "') in " + "{:.3f}".format(seconds) + " seconds")
+
+    # 7. We return the number of pairs passed from the mappers to the reducers, and the metrics of each pipe (the
+    # lines and bytes read from the stdout of each mapper, and written to the stdin of each reducer)
+    return { "pairs": size, "files": files }
 
 
 # ------------------------------------------
@@ -210,25 +1039,127 @@ def my_reducer_simulation(output_directory, my_reducer_input_parameters):
 def my_main(input_directory,
             output_directory,
             my_mapper_input_parameters,
-            my_reducer_input_parameters
+            my_reducer_input_parameters,
+            num_map_workers=1,
+            num_reducers=2,
+            partitioner="range",
+            num_reduce_workers=1,
+            my_combiner=None,
+            my_combiner_input_parameters=None,
+            cache_directory=None,
+            bike_index_directory=None,
+            bike_ids=None,
+            partials_directory=None,
+            split_size=None,
+            mmap_scanner=False,
+            binary_records=False,
+            compression=None,
+            top_n_mode=False,
+            streaming=False
            ):
+    # The top-N mode needs a reducer supporting it
+    if ((top_n_mode) and (not hasattr(my_reducer, "my_reduce_top_n"))):
+        raise ValueError("my_reducer.py has no my_reduce_top_n, so it cannot be run in top-N mode")
+
+    # The streaming mode runs my_mapper.py and my_reducer.py as they are, passing lines of text, so it cannot run a
+    # combiner function, binary records or the top-N reducers
+    if ((streaming) and ((my_combiner is not None) or (binary_records) or (top_n_mode))):
+        raise ValueError("The streaming mode cannot be used with my_combiner, binary_records or top_n_mode")
+
+    # If the metrics are switched on (A01_METRICS, see my_metrics), each stage is measured and the metrics of the run
+    # are written as JSON at the end
+    report = my_metrics.new_report(input_directory=input_directory,
+                                   output_directory=output_directory,
+                                   num_map_workers=num_map_workers,
+                                   num_reducers=num_reducers,
+                                   partitioner=partitioner if isinstance(partitioner, str) else partitioner.__name__,
+                                   num_reduce_workers=num_reduce_workers,
+                                   binary_records=binary_records,
+                                   compression=compression,
+                                   streaming=streaming
+                                  )
+
+    # Streaming Stage: If streaming is True, the stages below are run as Hadoop Streaming would instead, by assuming
+    # that:
+    # One my_mapper.py subprocess is run on each file, reading it from its stdin and writing its pairs to its stdout
+    # Up to num_map_workers my_mapper.py subprocesses are run concurrently
+    # The output of each my_mapper.py subprocess is sorted in memory, and the sorted outputs are merged and split
+    # among (at most) num_reducers my_reducer.py subprocesses by the partitioner, through their stdin
+    # All the my_reducer.py subprocesses are run concurrently, each writing to its own reduce_ text file
+    # No files are written between the stages, and cache_directory, bike_index_directory, partials_directory,
+    # split_size, mmap_scanner, compression and num_reduce_workers do not apply
+    if (streaming):
+        with my_metrics.measure_phase(report, "streaming") as phase:
+            phase.update(my_streaming_simulation(input_directory,
+                                                 output_directory,
+                                                 my_mapper_input_parameters,
+                                                 my_reducer_input_parameters,
+                                                 num_map_workers,
+                                                 num_reducers,
+                                                 partitioner
+                                                )
+                        )
+        my_metrics.write_report(report)
+        return
 
     # 1. Map Stage: We simulate it by assuming that:
-    # One my_mapper.py process is assigned to each file
-    # All my_mapper.py processes are run sequentially
+    # One my_mapper.py process is assigned to each file (or to each chunk of split_size bytes of it)
+    # Up to num_map_workers my_mapper.py processes are run concurrently
+    # The output of each my_mapper.py process is combined by my_combiner (if any)
     # The results are written to the file my_mapper_results.txt
-    my_mapper_simulation(input_directory, output_directory, my_mapper_input_parameters)
+    with my_metrics.measure_phase(report, "map") as phase:
+        phase["files"] = my_mapper_simulation(input_directory,
+                                              output_directory,
+                                              my_mapper_input_parameters,
+                                              num_map_workers,
+                                              my_combiner,
+                                              my_combiner_input_parameters,
+                                              cache_directory,
+                                              bike_index_directory,
+                                              bike_ids,
+                                              partials_directory,
+                                              split_size,
+                                              mmap_scanner,
+                                              binary_records,
+                                              compression
+                                             )
 
     # 2. Sort Stage: We simulate it by assuming that:
     # All results from my_map_simulation are written to the file my_mapper_results.txt
-    # The results are written to the file my_sort_results.txt
-    my_sort_simulation(output_directory)
+    # The results are split among (at most) num_reducers files by the partitioner
+    # If binary_records is True, the pairs are passed from one stage to the next as binary records, and only the
+    # output of the reducers is text
+    # If there is a compression codec, the files passed between the stages are compressed as well
+    with my_metrics.measure_phase(report, "sort") as phase:
+        phase.update(my_sort_simulation(output_directory,
+                                        num_reducers,
+                                        partitioner,
+                                        binary_records=binary_records,
+                                        compression=compression
+                                       )
+                    )
 
     # 3. Reduce Stage: We simulate it by assuming that:
-    # All results from my_sort_simulation are written to the file my_sort_results.txt
-    # There is a single my_reducer.py process
+    # One my_reducer.py process is assigned to each file from my_sort_simulation
+    # Up to num_reduce_workers my_reducer.py processes are run concurrently
     # The results are written to the file my_reducer_results.txt
-    my_reducer_simulation(output_directory, my_reducer_input_parameters)
+    # If top_n_mode is True, each my_reducer.py process only writes its top-N keys (see my_reducer.my_reduce_top_n)
+    with my_metrics.measure_phase(report, "reduce") as phase:
+        phase["files"] = my_reducer_simulation(output_directory,
+                                               my_reducer_input_parameters,
+                                               num_reduce_workers,
+                                               binary_records,
+                                               top_n_mode
+                                              )
+
+    # 4. Top-N Stage: If top_n_mode is True, the top-N lists of the reducers are merged into the top-N overall,
+    # written to the file top_n.txt
+    if (top_n_mode):
+        with my_metrics.measure_phase(report, "top_n"):
+            my_top_n_simulation(output_directory, my_reducer_input_parameters)
+
+    # 5. We write the metrics of the run (if switched on)
+    my_metrics.write_report(report)
 
 
 # ---------------------------------------------------------------
@@ -257,9 +1188,79 @@ if __name__ == '__main__':
     my_reducer_input_parameters = []
     my_reducer_input_parameters.append( top_n_bikes )
 
-    # 4. We call to my_main
+    # 4. Execution parameters
+    # Number of my_mapper.py processes run concurrently (None => one per core)
+    num_map_workers = None
+
+    # Number of my_reducer.py processes and how the keys are split among them ("range", "sampled_range" or "hash")
+    num_reducers = 2
+    partitioner = "range"
+
+    # Number of my_reducer.py processes run concurrently (None => one per core)
+    num_reduce_workers = None
+
+    # Function combining the output of each my_mapper.py process before the sort stage (None => no combiner)
+    my_combiner = None
+    my_combiner_input_parameters = []
+
+    # Folder with the columnar cache of the dataset files read by the mappers, built there on the first run, e.g.
+    # "../../my_dataset_cache/" (None => parse the CSV files)
+    cache_directory = None
+
+    # Folder with the per-bike index of the dataset files, and the bikes whose trips are the only ones the mappers
+    # read through it, built there on the first run, e.g. "../../my_dataset_index/" (None => all the trips are read)
+    bike_index_directory = None
+    bike_ids = None
+
+    # Folder keeping the output of the mappers for each dataset file, so that only the files that are new or have
+    # changed since the last run are mapped again, e.g. "../../my_dataset_partials/A01_Part3/" (None => all the files
+    # are mapped)
+    partials_directory = None
+
+    # Files bigger than this number of bytes are mapped in chunks of about this size, concurrently (None => by file)
+    split_size = None
+
+    # Whether the mappers scan only the columns they need from a memory map of the files (if cache_directory is None).
+    # This only pays off when the mappers need a few lines they can search for, e.g. those of a single bike
+    mmap_scanner = False
+
+    # Whether the pairs are passed between the map, sort and reduce stages as binary records (False => text)
+    binary_records = False
+
+    # The codec compressing the files passed between the map, sort and reduce stages, e.g. "gzip" (None => no
+    # compression). Compressed input files (e.g. '2019_05_01.csv.gz') are read as they are whatever this is
+    compression = None
+
+    # Whether each my_reducer.py process only keeps the top_n_bikes busiest stations, which are then merged into the
+    # top_n_bikes busiest overall in 4_my_top_n_simulation/top_n.txt (False => all the stations)
+    top_n_mode = False
+
+    # Whether my_mapper.py and my_reducer.py are run as they are, as subprocesses passing their data through pipes as
+    # Hadoop Streaming would, with no files written between the stages (False => the map, sort and reduce stages)
+    streaming = False
+
+    # The metrics of each stage are switched on through environment variables rather than here (see my_metrics.py),
+    # e.g. A01_METRICS=metrics.json A01_PROFILE=cprofile python3 my_meta-algorithm.py
+
+    # 5. We call to my_main
     my_main(input_directory,
             output_directory,
             my_mapper_input_parameters,
-            my_reducer_input_parameters
+            my_reducer_input_parameters,
+            num_map_workers,
+            num_reducers,
+            partitioner,
+            num_reduce_workers,
+            my_combiner,
+            my_combiner_input_parameters,
+            cache_directory,
+            bike_index_directory,
+            bike_ids,
+            partials_directory,
+            split_size,
+            mmap_scanner,
+            binary_records,
+            compression,
+            top_n_mode,
+            streaming
            )
@@ -21,10 +21,17 @@
 # ------------------------------------------
 # IMPORTS
 # ------------------------------------------
+import os
 import sys
+import json
+import heapq
 import codecs
+import itertools
 from collections import defaultdict
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_task_log
+
 
 # ------------------------------------------
 # FUNCTION my_reduce
@@ -44,6 +51,45 @@ def process_line(line):
     start_count, stop_count = map(int, fields[1][1:-1].split(", "))
     return station_name, (start_count, stop_count)
 
+# ------------------------------------------
+# FUNCTION read_pairs
+# ------------------------------------------
+def read_pairs(my_input_stream):
+    """
+    Reads the station names and their start and stop counts from the input stream, either as binary records if the
+    stream holds them (see my_records.RecordReader) or as lines processed by process_line().
+
+    Args:
+        my_input_stream (file): The input stream to read data from.
+
+    Returns:
+        iterable: The tuples of station name and tuple of start count and stop count.
+    """
+    if hasattr(my_input_stream, "read_records"):
+        return my_input_stream.read_records()
+    return (process_line(line) for line in my_input_stream)
+
+
+# ------------------------------------------
+# FUNCTION write_pair
+# ------------------------------------------
+def write_pair(my_output_stream, station, counts):
+    """
+    Writes the start and stop counts of a station to the output stream, either as a binary record if the stream takes
+    them (see my_records.RecordWriter, e.g. when my_reduce is used as a combiner) or as a line with the format
+    'station_name\t(start_count, stop_count)'.
+
+    Args:
+        my_output_stream (file): The output stream to write results to.
+        station (str): The station name.
+        counts (tuple): The start count and stop count.
+    """
+    if hasattr(my_output_stream, "write_record"):
+        my_output_stream.write_record(station, counts)
+    else:
+        my_output_stream.write(f"{station}\t({counts[0]}, {counts[1]})\n")
+
+
 # ------------------------------------------
 # FUNCTION my_reduce
 # ------------------------------------------
@@ -62,19 +108,122 @@ def my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters):
         None
     """
     results = defaultdict(lambda: (0, 0))
-    for line in my_input_stream:
-        station, (start_count, stop_count) = process_line(line)
+    for station, (start_count, stop_count) in read_pairs(my_input_stream):
         results[station] = (results[station][0] + start_count, results[station][1] + stop_count)
         
     count = 0
     for station, (start_count, stop_count) in sorted(results.items()):
-        my_output_stream.write(f"{station}\t({start_count}, {stop_count})\n")
+        write_pair(my_output_stream, station, (start_count, stop_count))
         count += 1
     
-    if count == 1:
-        print(f"'{count}' entry written to '{my_output_stream.name}'")
-    else:
-        print(f"'{count}' entries written to '{my_output_stream.name}'")
+    my_task_log.log_entries(my_output_stream, count)
+
+
+# ------------------------------------------
+# FUNCTION get_top_n
+# ------------------------------------------
+def get_top_n(my_reducer_input_parameters):
+    """
+    Returns the number of busiest stations kept by my_reduce_top_n and merge_top_n.
+
+    Args:
+        my_reducer_input_parameters (list): The reducer parameters, whose first item is top_n_bikes.
+
+    Returns:
+        int: The number of stations to keep.
+    """
+    return int(my_reducer_input_parameters[0])
+
+
+# ------------------------------------------
+# FUNCTION add_up_sorted_pairs
+# ------------------------------------------
+def add_up_sorted_pairs(pairs):
+    """
+    Adds up the start and stop counts of each station out of a stream of station counts sorted by station name, one
+    station at a time.
+
+    Args:
+        pairs (iterable): The tuples of station name and tuple of start count and stop count, sorted by station name.
+
+    Yields:
+        tuple: The station name and the tuple of its total start count and stop count, in station name order.
+    """
+    for station, group in itertools.groupby(pairs, key=lambda pair: pair[0]):
+        start_count = 0
+        stop_count = 0
+        for name, counts in group:
+            start_count += counts[0]
+            stop_count += counts[1]
+        yield station, (start_count, stop_count)
+
+
+# ------------------------------------------
+# FUNCTION get_busiest
+# ------------------------------------------
+def get_busiest(pairs, top_n):
+    """
+    Returns the busiest stations (by start count plus stop count) out of a stream of station counts, keeping no more
+    than top_n of them in a bounded heap. Stations with the same total keep the order they came in.
+
+    Args:
+        pairs (iterable): The tuples of station name and tuple of start count and stop count.
+        top_n (int): The number of stations to keep.
+
+    Returns:
+        list: The top_n busiest tuples, busiest first.
+    """
+    return heapq.nlargest(top_n, pairs, key=lambda pair: pair[1][0] + pair[1][1])
+
+
+# ------------------------------------------
+# FUNCTION my_reduce_top_n
+# ------------------------------------------
+def my_reduce_top_n(my_input_stream, my_output_stream, my_reducer_input_parameters):
+    """
+    Does the same as my_reduce, but only writes the top_n_bikes busiest stations (see get_busiest), busiest first.
+    As the input stream is sorted by station name, the counts of each station are added up as they come, and only the
+    busiest stations so far are kept, rather than all of them.
+
+    Args:
+        my_input_stream (file): The input stream to read data from, sorted by station name.
+        my_output_stream (file): The output stream to write results to.
+        my_reducer_input_parameters (list): The reducer parameters, whose first item is top_n_bikes.
+
+    Returns:
+        None
+    """
+    totals = add_up_sorted_pairs(read_pairs(my_input_stream))
+
+    count = 0
+    for station, counts in get_busiest(totals, get_top_n(my_reducer_input_parameters)):
+        write_pair(my_output_stream, station, counts)
+        count += 1
+
+    my_task_log.log_entries(my_output_stream, count)
+
+
+# ------------------------------------------
+# FUNCTION merge_top_n
+# ------------------------------------------
+def merge_top_n(my_input_streams, my_output_stream, my_reducer_input_parameters):
+    """
+    Merges the busiest stations written by several my_reduce_top_n reducers into the top_n_bikes busiest stations
+    overall. All the counts of a station go to the same reducer, so the busiest stations overall are among the ones
+    of each reducer, and only these (at most top_n_bikes per reducer) are read. Stations with the same total are
+    written in station name order.
+
+    Args:
+        my_input_streams (list): The input streams with the output of each reducer.
+        my_output_stream (file): The output stream to write results to.
+        my_reducer_input_parameters (list): The reducer parameters, whose first item is top_n_bikes.
+
+    Returns:
+        None
+    """
+    pairs = sorted(itertools.chain.from_iterable(read_pairs(my_input_stream) for my_input_stream in my_input_streams))
+    for station, counts in get_busiest(pairs, get_top_n(my_reducer_input_parameters)):
+        write_pair(my_output_stream, station, counts)
 
 
 # ---------------------------------------------------------------
@@ -86,13 +235,17 @@ def my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters):
 # ---------------------------------------------------------------
 if __name__ == '__main__':
     # 1. We collect the input values
-    my_input_stream = sys.stdin
-    my_output_stream = sys.stdout
+    my_input_stream, my_output_stream = my_task_log.open_data_streams()
     my_reducer_input_parameters = []
 
-    # 5. We call to my_reduce
+    # 1.1. If the program is called with its input parameters (e.g. by the streaming mode of my_meta-algorithm.py or
+    # by Hadoop Streaming), we take them from the terminal, as JSON
+    if (len(sys.argv) > 1):
+        my_reducer_input_parameters = json.loads(sys.argv[1])
+
+    # 5. We call to my_reduce. What it logs goes to stderr (see my_task_log), as stdout is the data stream
     my_reduce(my_input_stream,
               my_output_stream,
               my_reducer_input_parameters
              )
-
+    my_output_stream.flush()
@@ -20,9 +20,21 @@
 # ------------------------------------------
 # IMPORTS
 # ------------------------------------------
+import os
 import sys
+import json
 import codecs
-import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_timestamp
+import my_task_log
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+# The columns my_map_fields needs (start and stop times, start and stop station names and bike ID), for
+# my_mmap_scanner.scan_fields
+SCANNED_COLUMNS = (0, 1, 4, 8, 11)
 
 
 # ------------------------------------------
@@ -32,8 +44,8 @@ def process_line(line):
     res = {}
     fields = line.strip().split(",")
     if len(fields) == 16:
-        res["start_time"] = datetime.datetime.strptime(fields[0], "%Y/%m/%d %H:%M:%S")
-        res["stop_time"] = datetime.datetime.strptime(fields[1], "%Y/%m/%d %H:%M:%S")
+        res["start_time"] = my_timestamp.normalize_timestamp(fields[0])
+        res["stop_time"] = my_timestamp.normalize_timestamp(fields[1])
         res["start_station_id"] = int(fields[3])
         res["start_station_name"] = fields[4]
         res["stop_station_id"] = int(fields[7])
@@ -41,26 +53,180 @@ def process_line(line):
         res["bike_id"] = int(fields[11])
     return res
 
+
+# ------------------------------------------
+# FUNCTION get_bike_id
+# ------------------------------------------
+def get_bike_id(line):
+    """
+    Returns the bike ID of a line of the CSV file, without parsing any of its other fields. As the bike ID is the
+    12th of the 16 fields, it is split off the end of the line.
+
+    Args:
+        - line: The unprocessed line of text in the CSV file.
+
+    Returns:
+        - The bike ID, or None if the line does not have 16 fields.
+    """
+    if line.count(",") != 15:
+        return None
+    return int(line.rsplit(",", 5)[1])
+
+
+# ------------------------------------------
+# FUNCTION get_key
+# ------------------------------------------
+def get_key(bike_id, bike_ids):
+    """
+    Returns the key the mapper emits a trip of a bike with, if the bike is one we are interested in.
+
+    Args:
+        - bike_id: The ID of the bike of the trip.
+        - bike_ids: Either the ID of a single bike (all its trips are emitted with the key 'universal'), a collection
+          of bike IDs or None for all bikes (the trips of each bike are emitted with its ID as the key, so that all
+          bikes are processed in a single pass and the reducers get them partitioned per bike).
+
+    Returns:
+        - The key, or None if the trip is not to be emitted.
+    """
+    if isinstance(bike_ids, int):
+        return "universal" if bike_id == bike_ids else None
+    if bike_ids is None or bike_id in bike_ids:
+        return str(bike_id)
+    return None
+
+
+# ------------------------------------------
+# FUNCTION write_pair
+# ------------------------------------------
+def write_pair(my_output_stream, key, trip):
+    """
+    Writes a trip to the output stream, either as a binary record if the stream takes them (see
+    my_records.RecordWriter) or as a line with the format 'key\t(start_time @ stop_time @ start_station_name @
+    stop_station_name)'.
+
+    Args:
+        - my_output_stream: A file-like object for writing output data.
+        - key: The key of the trip (see get_key).
+        - trip: A tuple with the start time, stop time, start station name and stop station name of the trip.
+
+    Returns:
+        - None
+    """
+    if hasattr(my_output_stream, "write_record"):
+        my_output_stream.write_record(key, trip)
+    else:
+        my_output_stream.write("{}\t({} @ {} @ {} @ {})\n".format(key, *trip))
+
+
+# ------------------------------------------
+# FUNCTION my_map
+# ------------------------------------------
 def my_map(my_input_stream, my_output_stream, my_mapper_input_parameters):
     count = 0
     for line in my_input_stream:
-        trip = process_line(line)
-        # print('my_mapper <var: trip> == ', trip)
-        if trip["bike_id"] == my_mapper_input_parameters[0]:
-            my_output_stream.write(
-                "universal\t({} @ {} @ {} @ {})\n".format(
-                    trip['start_time'].strftime('%Y/%m/%d %H:%M:%S'),
-                    trip['stop_time'].strftime('%Y/%m/%d %H:%M:%S'),
-                    trip['start_station_name'],
-                    trip['stop_station_name']
-                )
-            )
+        # We check the bike of the trip first, and only parse the rest of the line if we are interested in it
+        bike_id = get_bike_id(line)
+        key = None if bike_id is None else get_key(bike_id, my_mapper_input_parameters[0])
+        if key is not None:
+            trip = process_line(line)
+            # print('my_mapper <var: trip> == ', trip)
+            write_pair(my_output_stream,
+                       key,
+                       (trip['start_time'],
+                        trip['stop_time'],
+                        trip['start_station_name'],
+                        trip['stop_station_name'])
+                      )
             count += 1
         
-    if count == 1:
-        print(f"'{count}' entry written to '{my_output_stream.name}'")
-    else:
-        print(f"'{count}' entries written to '{my_output_stream.name}'")
+    my_task_log.log_entries(my_output_stream, count)
+
+
+# ------------------------------------------
+# FUNCTION get_scan_needle
+# ------------------------------------------
+def get_scan_needle(my_mapper_input_parameters):
+    """
+    Returns the bytes that all the lines my_map_fields needs contain, for my_mmap_scanner.scan_fields.
+
+    Args:
+        - my_mapper_input_parameters: The same as for my_map.
+
+    Returns:
+        - The bike ID between commas if there is a single bike, or None if all the lines are needed.
+    """
+    if isinstance(my_mapper_input_parameters[0], int):
+        return ("," + str(my_mapper_input_parameters[0]) + ",").encode("utf-8")
+    return None
+
+
+# ------------------------------------------
+# FUNCTION my_map_fields
+# ------------------------------------------
+def my_map_fields(my_fields, my_output_stream, my_mapper_input_parameters):
+    """
+    Does the same as my_map, but reads the bytes of the needed columns of each line, as scanned by
+    my_mmap_scanner.scan_fields(..., SCANNED_COLUMNS), instead of parsing the lines. The bike ID is checked first, and
+    the other columns are only decoded for the trips we are interested in.
+
+    Args:
+        - my_fields: An iterable of (start time, stop time, start station name, stop station name, bike ID) bytes
+          tuples.
+        - my_output_stream: A file-like object for writing output data.
+        - my_mapper_input_parameters: The same as for my_map.
+
+    Returns:
+        - None
+    """
+    count = 0
+    for start_time, stop_time, start_station_name, stop_station_name, bike_id in my_fields:
+        key = get_key(int(bike_id), my_mapper_input_parameters[0])
+        if key is not None:
+            write_pair(my_output_stream,
+                       key,
+                       (my_timestamp.normalize_timestamp(start_time.decode("utf-8")),
+                        my_timestamp.normalize_timestamp(stop_time.decode("utf-8")),
+                        start_station_name.decode("utf-8"),
+                        stop_station_name.decode("utf-8"))
+                      )
+            count += 1
+
+    my_task_log.log_entries(my_output_stream, count)
+
+
+# ------------------------------------------
+# FUNCTION my_map_table
+# ------------------------------------------
+def my_map_table(my_table, my_output_stream, my_mapper_input_parameters):
+    """
+    Does the same as my_map, but reads the columns of a cached CSV file (see my_dataset_cache.load_table) instead of
+    parsing its lines.
+
+    Args:
+        - my_table: A dictionary with the columns of the CSV file, as returned by my_dataset_cache.load_table.
+        - my_output_stream: A file-like object for writing output data.
+        - my_mapper_input_parameters: The same as for my_map.
+
+    Returns:
+        - None
+    """
+    columns = my_table["columns"]
+    names = my_table["dictionaries"]["start_station_name"]  # Shared by start and stop station names
+    count = 0
+    for index, bike_id in enumerate(columns["bike_id"]):
+        key = get_key(bike_id, my_mapper_input_parameters[0])
+        if key is not None:
+            write_pair(my_output_stream,
+                       key,
+                       (my_timestamp.format_timestamp(columns["start_time"][index]),
+                        my_timestamp.format_timestamp(columns["stop_time"][index]),
+                        names[columns["start_station_name"][index]],
+                        names[columns["stop_station_name"][index]])
+                      )
+            count += 1
+
+    my_task_log.log_entries(my_output_stream, count)
 
 
 # ---------------------------------------------------------------
@@ -72,14 +238,18 @@ def my_map(my_input_stream, my_output_stream, my_mapper_input_parameters):
 # ---------------------------------------------------------------
 if __name__ == '__main__':
     # 1. We collect the input values
-    my_input_stream = sys.stdin
-    my_output_stream = sys.stdout
-    BIKE_ID = 35143
+    my_input_stream, my_output_stream = my_task_log.open_data_streams()
+    BIKE_ID = 35143  # Or a set of bike IDs, or None for all bikes
     my_mapper_input_parameters = [ BIKE_ID ]  # TODO - take as paramter from my_meta-alogorithm.py
 
-    # 2. We call to my_map
+    # 1.1. If the program is called with its input parameters (e.g. by the streaming mode of my_meta-algorithm.py or
+    # by Hadoop Streaming), we take them from the terminal, as JSON
+    if (len(sys.argv) > 1):
+        my_mapper_input_parameters = json.loads(sys.argv[1])
+
+    # 2. We call to my_map. What it logs goes to stderr (see my_task_log), as stdout is the data stream
     my_map(my_input_stream,
            my_output_stream,
            my_mapper_input_parameters
           )
-
+    my_output_stream.flush()
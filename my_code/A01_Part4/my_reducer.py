@@ -20,11 +20,121 @@
 # ------------------------------------------
 # IMPORTS
 # ------------------------------------------
+import os
 import sys
 import codecs
-import datetime
 import json
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import my_timestamp
+import my_task_log
+
+
+# ------------------------------------------
+# FUNCTION process_line
+# ------------------------------------------
+def process_line(line):
+    """
+        This function parses a line written by my_mapper into its key and trip.
+
+    Args:
+        - line: A line with the format 'key\t(start_time @ stop_time @ start_station_name @ stop_station_name)'.
+
+    Returns:
+        - A tuple with the key and a tuple with the start time, stop time, start station name and stop station name.
+    """
+    key_value = line.strip().split("\t")
+    if key_value[0] != "universal":
+        return key_value[0], tuple(key_value[1][1:-1].split(" @ "))
+    return key_value[0], tuple(key_value[1].strip('()').split(" @ "))
+
+
+# ------------------------------------------
+# FUNCTION read_pairs
+# ------------------------------------------
+def read_pairs(my_input_stream):
+    """
+        This function reads the keys and trips from my_input_stream, either as binary records if the stream holds them
+        (see my_records.RecordReader) or as lines parsed by process_line.
+
+    Args:
+        - my_input_stream: A file-like object for reading input data.
+
+    Returns:
+        - An iterable of tuples with the key and the trip.
+    """
+    if hasattr(my_input_stream, "read_records"):
+        return my_input_stream.read_records()
+    return (process_line(line) for line in my_input_stream)
+
+
+# ------------------------------------------
+# FUNCTION write_pair
+# ------------------------------------------
+def write_pair(my_output_stream, key, trip):
+    """
+        This function writes a trip as my_mapper does, either as a binary record if the stream takes them (see
+        my_records.RecordWriter) or as a line with the format
+        'key\t(start_time @ stop_time @ start_station_name @ stop_station_name)'.
+
+    Args:
+        - my_output_stream: A file-like object for writing output data.
+        - key: The key of the trip.
+        - trip: A tuple with the start time, stop time, start station name and stop station name of the trip.
+
+    Returns:
+        - None
+    """
+    if hasattr(my_output_stream, "write_record"):
+        my_output_stream.write_record(key, trip)
+    else:
+        my_output_stream.write("{}\t({} @ {} @ {} @ {})\n".format(key, *trip))
+
+
+# ------------------------------------------
+# FUNCTION my_combine
+# ------------------------------------------
+def my_combine(my_input_stream, my_output_stream, my_reducer_input_parameters):
+    """
+        This function combines the trips written by a single my_mapper, sorted by key and then by start time, into
+        fewer trips in the same format, so that my_reduce writes the same truck moves out of them.
+
+        my_reduce only compares the stop station of each trip of a bike with the start station of its next trip, so
+        each run of consecutive trips of a bike with no truck move between them is written as a single trip, from the
+        start of its first trip to the stop of its last one. The trips of a mapper are all the trips of the bike in a
+        period of time (a file, or a chunk of it), so no trip of another mapper falls between them. The trips keyed
+        'universal' are each written by my_reduce, so they are passed through as they are.
+
+    Args:
+        - my_input_stream: A file-like object for reading input data, sorted by key and then by start time.
+        - my_output_stream: A file-like object for writing output data.
+        - my_reducer_input_parameters: Additional parameters to be used in the reducer.
+
+    Returns:
+        - None
+    """
+    count = 0
+    run_key = None
+    run_trip = None
+    for key, trip in read_pairs(my_input_stream):
+        # 1. A trip going on from the run of the same bike extends it
+        if key != "universal" and key == run_key and run_trip[3] == trip[2]:
+            run_trip = (run_trip[0], trip[1], run_trip[2], trip[3])
+            continue
+
+        # 2. Otherwise the run so far is written, and the trip starts the next one
+        if run_key is not None:
+            write_pair(my_output_stream, run_key, run_trip)
+            count += 1
+        run_key = key
+        run_trip = tuple(trip)
+
+    if run_key is not None:
+        write_pair(my_output_stream, run_key, run_trip)
+        count += 1
+
+    my_task_log.log_entries(my_output_stream, count)
+
 
 # ------------------------------------------
 # FUNCTION my_reduce
@@ -33,6 +143,12 @@ def my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters):
     """
         This function reads lines from my_input_stream, formats them as required, and writes them to my_output_stream.
 
+        Lines keyed by a bike ID (see my_mapper.get_key) come sorted by key and then by start time, so for each bike
+        the truck moves between its consecutive trips are written, keyed by its ID.
+
+        The times written by my_mapper are already well formed, so they are passed through as they are, and only
+        the rest are parsed and formatted back (see my_timestamp.normalize_timestamp).
+
     Args:
         - my_input_stream: A file-like object for reading input data.
         - my_output_stream: A file-like object for writing output data.
@@ -42,24 +158,36 @@ def my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters):
         - None
     """
     count = 0
-    for line in my_input_stream:
-        key_value = line.strip().split("\t")
-        if key_value[0] == "universal":
-            trip = dict(zip(('start_time', 'stop_time', 'start_station_name', 'stop_station_name'), key_value[1].strip('()').split(" @ ")))
+    previous_key = None
+    previous_trip = None
+    for key, value in read_pairs(my_input_stream):
+        trip = dict(zip(('start_time', 'stop_time', 'start_station_name', 'stop_station_name'), value))
+        if key != "universal":
+            if key == previous_key and previous_trip['stop_station_name'] != trip['start_station_name']:
+                my_output_stream.write(
+                    "{}\t({}, {}, {}, {})\n".format(
+                        key,
+                        previous_trip['stop_time'],
+                        previous_trip['stop_station_name'],
+                        trip['start_time'],
+                        trip['start_station_name']
+                    )
+                )
+                count += 1
+            previous_key = key
+            previous_trip = trip
+        else:
             my_output_stream.write(
                 "By_Truck\t({}, {}, {}, {})\n".format(
-                    datetime.datetime.strptime(trip['start_time'], '%Y/%m/%d %H:%M:%S').strftime('%Y/%m/%d %H:%M:%S'),
+                    my_timestamp.normalize_timestamp(trip['start_time']),
                     trip['start_station_name'],
-                    datetime.datetime.strptime(trip['stop_time'], '%Y/%m/%d %H:%M:%S').strftime('%Y/%m/%d %H:%M:%S'),
+                    my_timestamp.normalize_timestamp(trip['stop_time']),
                     trip['stop_station_name']
                 )
             )
             count += 1
             
-    if count == 1:
-        print(f"'{count}' entry written to '{my_output_stream.name}'")
-    else:
-        print(f"'{count}' entries written to '{my_output_stream.name}'")
+    my_task_log.log_entries(my_output_stream, count)
 
 
 
@@ -74,13 +202,17 @@ def my_reduce(my_input_stream, my_output_stream, my_reducer_input_parameters):
 # ---------------------------------------------------------------
 if __name__ == '__main__':
     # 1. We collect the input values
-    my_input_stream = sys.stdin
-    my_output_stream = sys.stdout
+    my_input_stream, my_output_stream = my_task_log.open_data_streams()
     my_reducer_input_parameters = []
 
-    # 5. We call to my_reduce
+    # 1.1. If the program is called with its input parameters (e.g. by the streaming mode of my_meta-algorithm.py or
+    # by Hadoop Streaming), we take them from the terminal, as JSON
+    if (len(sys.argv) > 1):
+        my_reducer_input_parameters = json.loads(sys.argv[1])
+
+    # 5. We call to my_reduce. What it logs goes to stderr (see my_task_log), as stdout is the data stream
     my_reduce(my_input_stream,
               my_output_stream,
               my_reducer_input_parameters
              )
-
+    my_output_stream.flush()
@@ -0,0 +1,496 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program measures the throughput of the four parts of the assignment, so that a change making any of them
+# slower is noticed, rather than only checking that their results are still correct (see my_A01_check_results.py).
+#
+# It generates synthetic datasets with the same 16 columns as the CSV files of my_dataset/, at several scales: at
+# scale 1 there are as many daily files and trips as in my_dataset/, and at scale N each daily file has N times as
+# many trips. The datasets are generated once (with a fixed seed) and then reused by the next runs.
+#
+# Each part is run on each dataset in a fresh process, so that its peak memory (RSS) is its own, and it is timed as:
+#   - Parts 1 and 2: a single 'total' phase, running my_main.
+#   - Parts 3 and 4: one phase per stage of the meta-algorithm ('map', 'sort' and 'reduce').
+#
+# The results of each run (seconds and rows per second of each phase, and peak RSS) are appended to a JSON history
+# file, and each result is printed next to the one of the previous run with the same part and scale.
+#
+# The program provides the following functions:
+#
+#   generate_dataset(data_folder, scale, num_days, rows_per_day, seed):
+#       Generates a synthetic dataset, unless it already exists.
+#
+#   run_part(part, input_folder, output_folder):
+#       Runs and times a part of the assignment over a dataset.
+#
+#   run_benchmarks(parts, scales, data_folder, history_file, num_days, rows_per_day, seed):
+#       Runs all the benchmarks and appends their results to the history file.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import platform
+import contextlib
+import subprocess
+import importlib.util
+import multiprocessing
+import concurrent.futures
+
+try:
+    import resource  # Not available on Windows, where the peak RSS is not measured
+except ImportError:
+    resource = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import my_timestamp
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+CODE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# At scale 1, the synthetic datasets have as many daily files and trips per file as my_dataset/
+NUM_DAYS = 73
+ROWS_PER_DAY = 6084
+FIRST_DAY = "2019/05/01"
+
+# The bike whose truck moves Parts 2 and 4 look for. The synthetic datasets always have trips of it
+BIKE_ID = 35143
+REDUCER_TOP_N = 10
+
+NUM_STATIONS = 800
+NUM_BIKES = 15000
+FIRST_BIKE_ID = 14529
+FIRST_STATION_ID = 72
+
+
+# ------------------------------------------
+# FUNCTION get_stations
+# ------------------------------------------
+def get_stations(my_random):
+    """
+    Returns the stations of a synthetic dataset.
+
+    Args:
+        my_random (random.Random): The random number generator.
+
+    Returns:
+        list: The (id, name, latitude, longitude) of each station. The names are unique and have no commas.
+    """
+    streets = [ "W " + str(number) + " St" for number in range(1, 101) ] + \
+              [ "E " + str(number) + " St" for number in range(1, 101) ]
+    avenues = [ str(number) + " Ave" for number in range(1, 13) ] + \
+              [ "Broadway", "Park Ave", "Lexington Ave", "Madison Ave", "Bedford Ave", "Hudson St", "Centre St" ]
+    names = sorted(set(street + " & " + avenue for street in streets for avenue in avenues))
+    names = my_random.sample(names, NUM_STATIONS)
+    return [ (FIRST_STATION_ID + index,
+              name,
+              round(my_random.uniform(40.65, 40.82), 8),
+              round(my_random.uniform(-74.03, -73.90), 8)
+             )
+             for index, name in enumerate(names)
+           ]
+
+
+# ------------------------------------------
+# FUNCTION write_day
+# ------------------------------------------
+def write_day(file_name, day_seconds, num_rows, first_trip_id, stations, my_random):
+    """
+    Writes the synthetic trips of a day to a CSV file, in start time order.
+
+    Args:
+        file_name (str): The path to the CSV file.
+        day_seconds (int): The seconds since the epoch at the start of the day.
+        num_rows (int): The number of trips.
+        first_trip_id (int): The ID of the first trip.
+        stations (list): The stations, as returned by get_stations.
+        my_random (random.Random): The random number generator.
+    """
+    # 1. We pick the start time of each trip
+    start_times = sorted(day_seconds + my_random.randrange(86400) for index in range(num_rows))
+
+    # 2. We write one line per trip
+    with open(file_name, "w", encoding="utf-8", newline="") as my_output_stream:
+        for index, start_time in enumerate(start_times):
+            duration = int(my_random.expovariate(1 / 900)) + 60
+            start_station = stations[int(my_random.triangular(0, len(stations) - 1, 0))]
+            stop_station = stations[int(my_random.triangular(0, len(stations) - 1, 0))]
+            bike_id = BIKE_ID if (my_random.random() < 0.0005) else FIRST_BIKE_ID + my_random.randrange(NUM_BIKES)
+            subscriber = my_random.random() < 0.85
+            fields = [ my_timestamp.format_timestamp(start_time),
+                       my_timestamp.format_timestamp(start_time + duration),
+                       str(duration),
+                       str(start_station[0]),
+                       start_station[1],
+                       str(start_station[2]),
+                       str(start_station[3]),
+                       str(stop_station[0]),
+                       stop_station[1],
+                       str(stop_station[2]),
+                       str(stop_station[3]),
+                       str(bike_id),
+                       "Subscriber" if (subscriber) else "Customer",
+                       str(my_random.randint(1940, 2003)),
+                       str(my_random.choice((0, 1, 2))),
+                       str(first_trip_id + index)
+                     ]
+            my_output_stream.write(",".join(fields) + "\n")
+
+
+# ------------------------------------------
+# FUNCTION generate_dataset
+# ------------------------------------------
+def generate_dataset(data_folder, scale, num_days=NUM_DAYS, rows_per_day=ROWS_PER_DAY, seed=0):
+    """
+    Generates a synthetic dataset, with one CSV file per day named as the ones of my_dataset/ (e.g. 2019_05_01.csv).
+    If a dataset with the same parameters was already generated, it is reused as it is.
+
+    Args:
+        data_folder (str): The path to the folder containing the datasets.
+        scale (int): The scale of the dataset. Each daily file has scale * rows_per_day trips.
+        num_days (int): The number of daily files.
+        rows_per_day (int): The number of trips of each daily file at scale 1.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        tuple: The path to the folder with the CSV files, and their total number of rows.
+    """
+    # 1. If the dataset already exists, we reuse it
+    input_folder = os.path.join(data_folder, "dataset_" + str(scale) + "x", "")
+    parameters_file = os.path.join(data_folder, "dataset_" + str(scale) + "x.json")
+    parameters = { "scale": scale, "num_days": num_days, "rows_per_day": rows_per_day, "seed": seed }
+    if os.path.isfile(parameters_file) and os.path.isdir(input_folder):
+        with open(parameters_file, "r", encoding="utf-8") as my_input_stream:
+            if json.load(my_input_stream) == parameters:
+                return input_folder, num_days * rows_per_day * scale
+
+    # 2. Otherwise we generate it from scratch
+    if os.path.exists(parameters_file):
+        os.remove(parameters_file)
+    if os.path.exists(input_folder):
+        shutil.rmtree(input_folder)
+    os.makedirs(input_folder)
+
+    my_random = random.Random(seed)
+    stations = get_stations(my_random)
+    first_day = my_timestamp.parse_timestamp(FIRST_DAY + " 00:00:00")
+    for day in range(num_days):
+        day_seconds = first_day + day * my_timestamp.SECONDS_PER_DAY
+        file_name = os.path.join(input_folder, my_timestamp.format_timestamp(day_seconds)[0:10].replace("/", "_") +
+                                 ".csv")
+        write_day(file_name, day_seconds, rows_per_day * scale, day * rows_per_day * scale, stations, my_random)
+
+    # 3. We record its parameters last, so that a dataset left half generated is never reused
+    with open(parameters_file, "w", encoding="utf-8") as my_output_stream:
+        json.dump(parameters, my_output_stream)
+
+    return input_folder, num_days * rows_per_day * scale
+
+
+# ------------------------------------------
+# FUNCTION load_module
+# ------------------------------------------
+def load_module(part_folder, file_name):
+    """
+    Loads a Python file of a part of the assignment as a module, with its folder first in sys.path so that it imports
+    its own my_mapper.py and my_reducer.py.
+
+    Args:
+        part_folder (str): The path to the folder of the part, e.g. 'A01_Part3'.
+        file_name (str): The name of the file, e.g. 'my_meta-algorithm.py'.
+
+    Returns:
+        module: The module.
+    """
+    sys.path.insert(0, os.path.join(CODE_FOLDER, part_folder))
+    spec = importlib.util.spec_from_file_location(os.path.splitext(file_name)[0].replace("-", "_"),
+                                                  os.path.join(CODE_FOLDER, part_folder, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ------------------------------------------
+# FUNCTION get_peak_rss
+# ------------------------------------------
+def get_peak_rss():
+    """
+    Returns the peak memory (RSS) of this process and of the processes it has waited for.
+
+    Returns:
+        float: The peak RSS in MB, or None if it cannot be measured.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, and in KB everywhere else
+    return round(peak / (1024 * 1024 if (sys.platform == "darwin") else 1024), 1)
+
+
+# ------------------------------------------
+# FUNCTION run_part
+# ------------------------------------------
+def run_part(part, input_folder, output_folder):
+    """
+    Runs a part of the assignment over a dataset with its default options, timing each of its phases. What the part
+    prints is discarded. This is meant to be run in a fresh process (see run_benchmarks).
+
+    Args:
+        part (int): The part, from 1 to 4.
+        input_folder (str): The path to the folder with the CSV files.
+        output_folder (str): The path to the folder to write the results to.
+
+    Returns:
+        dict: The seconds of each phase (in the order they are run) and the peak RSS in MB.
+    """
+    # 1. We load the part and clear the folder of its results
+    if os.path.exists(output_folder):
+        shutil.rmtree(output_folder)
+    os.makedirs(output_folder)
+
+    if (part == 1) or (part == 2):
+        module = load_module("A01_Part" + str(part), "A01_Part" + str(part) + ".py")
+    else:
+        module = load_module("A01_Part" + str(part), "my_meta-algorithm.py")
+
+    # 2. We time each phase
+    phases = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        if part == 1:
+            start_time = time.perf_counter()
+            module.my_main(input_folder, os.path.join(output_folder, "result.txt"))
+            phases["total"] = time.perf_counter() - start_time
+
+        elif part == 2:
+            start_time = time.perf_counter()
+            with open(os.path.join(output_folder, "result.txt"), "w") as my_output_stream:
+                module.my_main(input_folder, my_output_stream, BIKE_ID)
+            phases["total"] = time.perf_counter() - start_time
+
+        else:
+            output_directory = os.path.join(output_folder, "")
+            my_mapper_input_parameters = [] if (part == 3) else [ BIKE_ID ]
+            my_reducer_input_parameters = [ REDUCER_TOP_N ] if (part == 3) else []
+
+            start_time = time.perf_counter()
+            module.my_mapper_simulation(input_folder, output_directory, my_mapper_input_parameters)
+            phases["map"] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            module.my_sort_simulation(output_directory)
+            phases["sort"] = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            module.my_reducer_simulation(output_directory, my_reducer_input_parameters)
+            phases["reduce"] = time.perf_counter() - start_time
+
+    return { "phases": phases, "peak_rss_mb": get_peak_rss() }
+
+
+# ------------------------------------------
+# FUNCTION get_git_commit
+# ------------------------------------------
+def get_git_commit():
+    """
+    Returns the commit the code is at, so that each result of the history can be traced back to it.
+
+    Returns:
+        str: The hash of the commit (with a '+' if there are uncommitted changes), or None if it is unknown.
+    """
+    try:
+        commit = subprocess.run([ "git", "rev-parse", "HEAD" ], cwd=CODE_FOLDER, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        changes = subprocess.run([ "git", "status", "--porcelain", "--untracked-files=no" ], cwd=CODE_FOLDER,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if (changes != "") else "")
+
+
+# ------------------------------------------
+# FUNCTION read_history
+# ------------------------------------------
+def read_history(history_file):
+    """
+    Reads the results of the previous runs.
+
+    Args:
+        history_file (str): The path to the JSON history file.
+
+    Returns:
+        list: The runs, oldest first, or an empty list if there is no history yet.
+    """
+    if not os.path.isfile(history_file):
+        return []
+    with open(history_file, "r", encoding="utf-8") as my_input_stream:
+        return json.load(my_input_stream)
+
+
+# ------------------------------------------
+# FUNCTION write_history
+# ------------------------------------------
+def write_history(history_file, history):
+    """
+    Writes the history file under a temporary name and then moves it, so that it is never left half written.
+
+    Args:
+        history_file (str): The path to the JSON history file.
+        history (list): The runs, oldest first.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(history_file)), exist_ok=True)
+    temporary_file = history_file + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_file, "w", encoding="utf-8") as my_output_stream:
+        json.dump(history, my_output_stream, indent=1)
+    os.replace(temporary_file, history_file)
+
+
+# ------------------------------------------
+# FUNCTION get_previous_result
+# ------------------------------------------
+def get_previous_result(history, part, scale):
+    """
+    Returns the result of the last run of a part over a dataset of a scale.
+
+    Args:
+        history (list): The runs, oldest first.
+        part (int): The part.
+        scale (int): The scale of the dataset.
+
+    Returns:
+        dict: The result, or None if the part was never run at that scale.
+    """
+    for run in reversed(history):
+        for result in run["results"]:
+            if (result["part"] == part) and (result["scale"] == scale):
+                return result
+    return None
+
+
+# ------------------------------------------
+# FUNCTION format_result
+# ------------------------------------------
+def format_result(result, previous_result):
+    """
+    Formats a result as a line, with the change of the rows per second of each phase since the previous result.
+
+    Args:
+        result (dict): The result.
+        previous_result (dict): The previous result with the same part and scale, or None.
+
+    Returns:
+        str: The line.
+    """
+    res = "Part " + str(result["part"]) + " at " + str(result["scale"]) + "x (" + str(result["rows"]) + " rows):"
+    for phase, entry in result["phases"].items():
+        res = res + " " + phase + " {:.3f}s ({:,.0f} rows/s".format(entry["seconds"], entry["rows_per_second"] or 0)
+        previous_entry = None if (previous_result is None) else previous_result["phases"].get(phase)
+        if (previous_entry is not None) and (previous_entry["rows_per_second"]) and (entry["rows_per_second"]):
+            previous_rows_per_second = previous_entry["rows_per_second"]
+            res = res + ", {:+.1f}%".format(100 * (entry["rows_per_second"] / previous_rows_per_second - 1))
+        res = res + ")"
+    if result["peak_rss_mb"] is not None:
+        res = res + " peak RSS {:.1f} MB".format(result["peak_rss_mb"])
+    return res
+
+
+# ------------------------------------------
+# FUNCTION run_benchmarks
+# ------------------------------------------
+def run_benchmarks(parts, scales, data_folder, history_file, num_days=NUM_DAYS, rows_per_day=ROWS_PER_DAY, seed=0):
+    """
+    Runs each part over the synthetic dataset of each scale, each in a fresh process, prints their results and
+    appends them to the history file as a new run.
+
+    Args:
+        parts (list): The parts to run, from 1 to 4.
+        scales (list): The scales of the datasets to run them over.
+        data_folder (str): The path to the folder with the datasets and the results of the parts.
+        history_file (str): The path to the JSON history file.
+        num_days (int): The number of daily files of each dataset.
+        rows_per_day (int): The number of trips of each daily file at scale 1.
+        seed (int): The seed of the random number generator of the datasets.
+
+    Returns:
+        dict: The new run of the history.
+    """
+    history = read_history(history_file)
+    run = { "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "results": []
+          }
+
+    context = multiprocessing.get_context("spawn")
+    for scale in scales:
+        # 1. We generate the dataset of the scale (or reuse it)
+        input_folder, num_rows = generate_dataset(data_folder, scale, num_days, rows_per_day, seed)
+
+        # 2. We run each part in a fresh process
+        for part in parts:
+            output_folder = os.path.join(data_folder, "results_" + str(scale) + "x", "A01_Part" + str(part))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                measures = executor.submit(run_part, part, input_folder, output_folder).result()
+
+            result = { "part": part,
+                       "scale": scale,
+                       "rows": num_rows,
+                       "phases": { phase: { "seconds": round(seconds, 4),
+                                            "rows_per_second": round(num_rows / seconds, 1) if (seconds > 0) else None
+                                          }
+                                   for phase, seconds in measures["phases"].items()
+                                 },
+                       "peak_rss_mb": measures["peak_rss_mb"]
+                     }
+            print(format_result(result, get_previous_result(history, part, scale)))
+            run["results"].append(result)
+
+    # 3. We append the run to the history
+    history.append(run)
+    write_history(history_file, history)
+    return run
+
+
+# ---------------------------------------------------------------
+#           PYTHON EXECUTION
+# This is the main entry point to the execution of our program.
+# It provides a call to the 'main function' defined in our
+# Python program, making the Python interpreter to trigger
+# its execution.
+# ---------------------------------------------------------------
+if __name__ == '__main__':
+    data_folder = "../my_benchmarks/"
+    history_file = "../my_benchmarks/history.json"
+
+    parser = argparse.ArgumentParser(description="Measure the throughput of the four parts over synthetic datasets.")
+    parser.add_argument("--parts", type=int, nargs="+", default=[ 1, 2, 3, 4 ], choices=[ 1, 2, 3, 4 ],
+                        help="the parts to run (default: %(default)s)")
+    parser.add_argument("--scales", type=int, nargs="+", default=[ 1 ],
+                        help="the scales of the datasets, e.g. 1 10 100 (default: %(default)s)")
+    parser.add_argument("--days", type=int, default=NUM_DAYS, help="the number of daily files (default: %(default)s)")
+    parser.add_argument("--rows-per-day", type=int, default=ROWS_PER_DAY,
+                        help="the number of trips of each daily file at scale 1 (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the datasets (default: %(default)s)")
+    parser.add_argument("--data-folder", default=data_folder, help="(default: %(default)s)")
+    parser.add_argument("--history", default=history_file, help="(default: %(default)s)")
+    args = parser.parse_args()
+
+    run_benchmarks(args.parts, args.scales, args.data_folder, args.history, args.days, args.rows_per_day, args.seed)
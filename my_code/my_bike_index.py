@@ -0,0 +1,253 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program keeps an on-disk index of the trips of each bike in the daily CSV files of the dataset, so that the
+# trips of a bike can be read by seeking straight to their lines instead of scanning every line of every file.
+#
+# There is one index file per CSV file, holding (as int64 arrays ready to be memory-mapped):
+#   - The sorted IDs of the bikes with trips in the CSV file.
+#   - For each bike, the position of its first offset in the array of offsets (plus a final end position).
+#   - The byte offsets of the lines of the trips, grouped by bike.
+#
+# An index file records the size and modification time of its CSV file, and it is rebuilt whenever they change, so
+# new daily CSV files are indexed incrementally, the first time they are needed.
+#
+# The program provides the following functions:
+#
+#   build_index_file(csv_file, index_file):
+#       Indexes the lines of a CSV file by bike ID.
+#
+#   update_index(input_folder, index_folder):
+#       (Re)builds the index files of the CSV files in the input folder that are missing or out of date.
+#
+#   get_offsets(csv_file, index_folder, bike_ids):
+#       Returns the byte offsets of the lines of the trips of some bikes in a CSV file.
+#
+#   read_lines(csv_file, index_folder, bike_ids):
+#       Returns the lines of the trips of some bikes in a CSV file.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import mmap
+import array
+import bisect
+import struct
+from collections import defaultdict
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+MAGIC = b"A01BIDX1"
+HEADER = struct.Struct("<QqQQ")  # source size, source mtime_ns, number of bikes, number of offsets
+
+
+# ------------------------------------------
+# FUNCTION get_index_file
+# ------------------------------------------
+def get_index_file(csv_file, index_folder):
+    """
+    Returns the path of the index file of a CSV file.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        index_folder (str): The path to the folder containing the index files.
+
+    Returns:
+        str: The path to the index file.
+    """
+    return os.path.join(index_folder, os.path.basename(csv_file) + ".idx")
+
+
+# ------------------------------------------
+# FUNCTION build_index_file
+# ------------------------------------------
+def build_index_file(csv_file, index_file):
+    """
+    Indexes the lines of a CSV file by bike ID. Lines not having 16 fields are not indexed.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        index_file (str): The path to the index file to write.
+
+    Returns:
+        int: The number of lines indexed.
+    """
+    # 1. We collect the byte offset of the line of each trip, grouped by bike
+    source = os.stat(csv_file)
+    offsets_by_bike = defaultdict(list)
+    with open(csv_file, "rb") as my_input_stream:
+        offset = 0
+        for line in my_input_stream:
+            fields = line.split(b",")
+            if len(fields) == 16:
+                offsets_by_bike[int(fields[11])].append(offset)
+            offset += len(line)
+
+    # 2. We lay them out as arrays: bikes sorted by ID, where each bike's offsets start and its offsets
+    bike_ids = array.array("q", sorted(offsets_by_bike))
+    positions = array.array("q", [0])
+    offsets = array.array("q")
+    for bike_id in bike_ids:
+        offsets.extend(offsets_by_bike[bike_id])
+        positions.append(len(offsets))
+
+    # 3. We write the file under a temporary name and then move it, so that readers never see half a file
+    os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+    temporary_file = index_file + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_file, "wb") as my_output_stream:
+        my_output_stream.write(MAGIC)
+        my_output_stream.write(HEADER.pack(source.st_size, source.st_mtime_ns, len(bike_ids), len(offsets)))
+        bike_ids.tofile(my_output_stream)
+        positions.tofile(my_output_stream)
+        offsets.tofile(my_output_stream)
+    os.replace(temporary_file, index_file)
+
+    return len(offsets)
+
+
+# ------------------------------------------
+# FUNCTION is_index_file_valid
+# ------------------------------------------
+def is_index_file_valid(csv_file, index_file):
+    """
+    Checks whether an index file exists and is up to date with the size and modification time of its CSV file.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        index_file (str): The path to the index file.
+
+    Returns:
+        bool: True if the index file can be used.
+    """
+    if not os.path.isfile(index_file):
+        return False
+    source = os.stat(csv_file)
+    with open(index_file, "rb") as my_input_stream:
+        if my_input_stream.read(len(MAGIC)) != MAGIC:
+            return False
+        source_size, source_mtime_ns, num_bikes, num_offsets = HEADER.unpack(my_input_stream.read(HEADER.size))
+    return (source_size == source.st_size) and (source_mtime_ns == source.st_mtime_ns)
+
+
+# ------------------------------------------
+# FUNCTION update_index
+# ------------------------------------------
+def update_index(input_folder, index_folder):
+    """
+    (Re)builds the index files of the CSV files in the input folder that are missing or out of date, so that only the
+    daily CSV files that are new (or changed) since the last update are read.
+
+    Args:
+        input_folder (str): The path to the input folder containing the CSV files.
+        index_folder (str): The path to the folder containing the index files.
+
+    Returns:
+        int: The number of index files (re)built.
+    """
+    count = 0
+    for filename in sorted(os.listdir(input_folder)):
+        csv_file = os.path.join(input_folder, filename)
+        if os.path.isfile(csv_file) and filename.endswith(".csv"):
+            index_file = get_index_file(csv_file, index_folder)
+            if not is_index_file_valid(csv_file, index_file):
+                build_index_file(csv_file, index_file)
+                count += 1
+    return count
+
+
+# ------------------------------------------
+# FUNCTION get_offsets
+# ------------------------------------------
+def get_offsets(csv_file, index_folder, bike_ids):
+    """
+    Returns the byte offsets of the lines of the trips of some bikes in a CSV file, (re)building its index file first
+    if it is missing or out of date. Finding a bike is a binary search over the memory-mapped index file.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        index_folder (str): The path to the folder containing the index files.
+        bike_ids: The ID of a bike, or a collection of bike IDs.
+
+    Returns:
+        list: The sorted byte offsets of the lines.
+    """
+    # 1. We (re)build the index file if needed
+    index_file = get_index_file(csv_file, index_folder)
+    if not is_index_file_valid(csv_file, index_file):
+        build_index_file(csv_file, index_file)
+
+    if isinstance(bike_ids, int):
+        bike_ids = [bike_ids]
+
+    # 2. We map it into memory and look each bike up
+    res = []
+    with open(index_file, "rb") as my_input_stream:
+        size = os.fstat(my_input_stream.fileno()).st_size
+        if size == len(MAGIC) + HEADER.size:
+            return res
+
+        with mmap.mmap(my_input_stream.fileno(), 0, access=mmap.ACCESS_READ) as my_buffer:
+            source_size, source_mtime_ns, num_bikes, num_offsets = HEADER.unpack_from(my_buffer, len(MAGIC))
+            data = memoryview(my_buffer)[len(MAGIC) + HEADER.size:].cast("q")
+            indexed_bike_ids = data[:num_bikes]
+            positions = data[num_bikes:2 * num_bikes + 1]
+            offsets = data[2 * num_bikes + 1:]
+
+            for bike_id in bike_ids:
+                index = bisect.bisect_left(indexed_bike_ids, bike_id)
+                if index < num_bikes and indexed_bike_ids[index] == bike_id:
+                    res.extend(offsets[positions[index]:positions[index + 1]].tolist())
+
+            # The views must be released before the memory map is closed
+            del indexed_bike_ids, positions, offsets
+            data.release()
+
+    res.sort()
+    return res
+
+
+# ------------------------------------------
+# FUNCTION read_lines
+# ------------------------------------------
+def read_lines(csv_file, index_folder, bike_ids):
+    """
+    Returns the lines of the trips of some bikes in a CSV file, in file order, seeking straight to each of them.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        index_folder (str): The path to the folder containing the index files.
+        bike_ids: The ID of a bike, or a collection of bike IDs.
+
+    Returns:
+        list: The lines (str) of the trips, including their line breaks.
+    """
+    res = []
+    with open(csv_file, "rb") as my_input_stream:
+        for offset in get_offsets(csv_file, index_folder, bike_ids):
+            my_input_stream.seek(offset)
+            res.append(my_input_stream.readline().decode("utf-8"))
+    return res
+
+
+# ---------------------------------------------------------------
+#           PYTHON EXECUTION
+# This is the main entry point to the execution of our program.
+# It provides a call to the 'main function' defined in our
+# Python program, making the Python interpreter to trigger
+# its execution.
+# ---------------------------------------------------------------
+if __name__ == '__main__':
+    input_folder = "../my_dataset/"
+    index_folder = "../my_dataset_index/"
+
+    # We index the CSV files that are new or changed since the last run
+    count = update_index(input_folder, index_folder)
+    print(f"'{count}' files indexed in '{index_folder}'")
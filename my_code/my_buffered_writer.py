@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program opens the output files of the jobs (their results and the files of the reducers) and writes lines of
+# text to them in large chunks, rather than in many small writes.
+#
+# The files are opened as built-in text files over a binary buffer of buffer_size bytes:
+#   - Each line written to them is kept pending by the text layer, which joins the pending lines and encodes them at
+#     once, and the binary buffer only reaches the disk every buffer_size bytes. So writing the records one by one is
+#     already the fastest way to write records that are formatted one by one.
+#   - Unlike codecs.open, whose writes encode and write each record on their own, in Python.
+#
+# The lines already held in memory (e.g. in a list) are written in chunks of batch_size lines instead, each joined
+# and written with a single call.
+#
+# The program provides the following functions:
+#
+#   open_file(file_name, buffer_size, encoding, newline):
+#       Opens a text file for writing, with a large buffer.
+#
+#   write_lines(my_output_stream, lines, batch_size):
+#       Writes a list of lines to an output stream, in chunks of batch_size lines.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+# The number of bytes buffered before they are written to a file (larger buffers were not faster)
+BUFFER_SIZE = 1 << 16
+
+# The number of lines joined into a chunk before it is written (much larger chunks no longer fit in the CPU caches,
+# and are slower to write than the lines one by one)
+BATCH_SIZE = 1 << 12
+
+
+# ------------------------------------------
+# FUNCTION open_file
+# ------------------------------------------
+def open_file(file_name, buffer_size=BUFFER_SIZE, encoding="utf-8", newline=None):
+    """
+    Opens a text file for writing as the built-in open would, with a binary buffer of buffer_size bytes.
+
+    Args:
+        file_name (str): The path to the file.
+        buffer_size (int): The number of bytes buffered before they are written to the file.
+        encoding (str): The encoding of the text.
+        newline (str): How line breaks are translated, as for the built-in open.
+
+    Returns:
+        file: The stream of the file.
+    """
+    return open(file_name, "w", buffering=buffer_size, encoding=encoding, newline=newline)
+
+
+# ------------------------------------------
+# FUNCTION write_lines
+# ------------------------------------------
+def write_lines(my_output_stream, lines, batch_size=BATCH_SIZE):
+    """
+    Writes a list of lines to an output stream, in chunks of batch_size lines, each joined and written with a single
+    call.
+
+    Args:
+        my_output_stream (file): The text stream to write to.
+        lines (list): The lines, each ending with its line break.
+        batch_size (int): The number of lines joined into a chunk.
+
+    Returns:
+        int: The number of lines written.
+    """
+    for start in range(0, len(lines), batch_size):
+        my_output_stream.write("".join(lines[start:start + batch_size]))
+    return len(lines)
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program opens the files of the dataset and the intermediate files of the jobs whether they are compressed or
+# not, so that the daily CSV files can be kept compressed on disk (e.g. '2019_05_01.csv.gz') and read as they are,
+# rather than being decompressed to disk first.
+#
+# The codec of a file is given by its extension, and only the codecs of the standard library are supported:
+#   - '.gz': gzip.
+#   - '.bz2': bzip2.
+#   - '.xz': LZMA.
+#
+# Files with any other extension are read and written as they are.
+#
+# Compressed files cannot be read from a byte offset without decompressing everything before it, so they are never
+# split, indexed or memory-mapped: the jobs read them line by line instead (or from their columnar cache).
+#
+# The program provides the following functions:
+#
+#   get_extension(codec):
+#       Returns the extension of the files compressed with a codec.
+#
+#   is_compressed(file_name):
+#       Checks whether a file is compressed, by its extension.
+#
+#   strip_extension(file_name):
+#       Returns the name of a file without its compression extension.
+#
+#   open_file(file_name, mode, encoding, newline):
+#       Opens a file, compressed or not, as the built-in open would.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import io
+import os
+import bz2
+import gzip
+import lzma
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+# The module implementing each codec, by extension
+CODECS = { ".gz": gzip, ".bz2": bz2, ".xz": lzma }
+
+# The extension of the files compressed with each codec, by name
+EXTENSIONS = { "gzip": ".gz", "bz2": ".bz2", "lzma": ".xz" }
+
+# The options used to write compressed files. Intermediate files are only read once, so we favour speed over size
+WRITE_OPTIONS = { ".gz": { "compresslevel": 1 }, ".bz2": { "compresslevel": 1 }, ".xz": { "preset": 1 } }
+
+
+# ------------------------------------------
+# FUNCTION get_extension
+# ------------------------------------------
+def get_extension(codec):
+    """
+    Returns the extension of the files compressed with a codec.
+
+    Args:
+        codec (str): The name of the codec, either "gzip", "bz2" or "lzma", or None for no compression.
+
+    Returns:
+        str: The extension, e.g. '.gz', or '' for no compression.
+
+    Raises:
+        ValueError: If the codec is not supported.
+    """
+    if codec is None:
+        return ""
+    if codec not in EXTENSIONS:
+        raise ValueError("Unsupported compression codec '" + str(codec) + "', use one of " + str(sorted(EXTENSIONS)))
+    return EXTENSIONS[codec]
+
+
+# ------------------------------------------
+# FUNCTION is_compressed
+# ------------------------------------------
+def is_compressed(file_name):
+    """
+    Checks whether a file is compressed, by its extension.
+
+    Args:
+        file_name (str): The path to the file.
+
+    Returns:
+        bool: True if the file has the extension of a supported codec.
+    """
+    return os.path.splitext(file_name)[1] in CODECS
+
+
+# ------------------------------------------
+# FUNCTION strip_extension
+# ------------------------------------------
+def strip_extension(file_name):
+    """
+    Returns the name of a file without its compression extension, e.g. '2019_05_01.csv' for '2019_05_01.csv.gz'.
+
+    Args:
+        file_name (str): The path to the file.
+
+    Returns:
+        str: The path without the compression extension, or the same path if the file is not compressed.
+    """
+    base_name, extension = os.path.splitext(file_name)
+    return base_name if (extension in CODECS) else file_name
+
+
+# ------------------------------------------
+# FUNCTION open_file
+# ------------------------------------------
+def open_file(file_name, mode="r", encoding="utf-8", newline=None):
+    """
+    Opens a file as the built-in open would, decompressing it while it is read (or compressing it while it is written)
+    if its extension is the one of a supported codec.
+
+    Args:
+        file_name (str): The path to the file.
+        mode (str): The mode, e.g. "r", "w", "rb" or "wb".
+        encoding (str): The encoding of the text, not used in binary mode.
+        newline (str): How line breaks are translated, as for the built-in open. Not used in binary mode.
+
+    Returns:
+        file: The stream of the file.
+    """
+    # 1. We look for the codec of the file
+    codec = CODECS.get(os.path.splitext(file_name)[1])
+
+    # 2. If there is none, we open the file as it is
+    if codec is None:
+        if "b" in mode:
+            return open(file_name, mode)
+        return open(file_name, mode, encoding=encoding, newline=newline)
+
+    # 3. Otherwise we open it through the codec. Text is decoded from (or encoded to) the compressed binary stream
+    options = WRITE_OPTIONS[os.path.splitext(file_name)[1]] if ("r" not in mode) else {}
+    my_stream = codec.open(file_name, mode.replace("t", "").replace("b", "") + "b", **options)
+    if not hasattr(my_stream, "name"):
+        my_stream.name = file_name  # Used by the logs of the mappers and reducers
+    if "b" in mode:
+        return my_stream
+    return io.TextIOWrapper(my_stream, encoding=encoding, newline=newline)
@@ -0,0 +1,294 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program keeps a columnar binary copy (cache) of each daily CSV file of the dataset, so that the four parts of
+# the assignment do not have to parse the same text again on every run.
+#
+# Each cache file holds the 16 columns of the trips as typed arrays, ready to be memory-mapped:
+#   - Timestamps are int64 seconds since the epoch.
+#   - Station ids, bike id, trip duration, birth year and gender are int32. The trip id is int64.
+#   - Latitudes and longitudes are float64.
+#   - Station names and user types are int32 codes into a dictionary of strings.
+#
+# A cache file records the size and modification time of its CSV file, and it is rebuilt whenever they change.
+# Compressed CSV files (see my_compression) are decompressed once, when their cache file is built.
+#
+# The program provides the following functions:
+#
+#   build_cache_file(csv_file, cache_file):
+#       Converts a CSV file into a cache file.
+#
+#   is_cache_file_valid(csv_file, cache_file):
+#       Checks whether a cache file is up to date with its CSV file.
+#
+#   load_table(csv_file, cache_directory):
+#       Returns the columns of a CSV file from its cache file, (re)building it first if needed.
+#
+# The values of the timestamp columns are decoded with my_timestamp.format_timestamp.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import my_timestamp
+import my_compression
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+MAGIC = b"A01COLS1"
+
+# (name, type) of the 16 columns of the CSV files.
+# The type is either an array typecode or "timestamp"/"dictionary" for the encoded columns
+COLUMNS = [ ("start_time", "timestamp"),
+            ("stop_time", "timestamp"),
+            ("trip_duration", "i"),
+            ("start_station_id", "i"),
+            ("start_station_name", "dictionary"),
+            ("start_station_latitude", "d"),
+            ("start_station_longitude", "d"),
+            ("stop_station_id", "i"),
+            ("stop_station_name", "dictionary"),
+            ("stop_station_latitude", "d"),
+            ("stop_station_longitude", "d"),
+            ("bike_id", "i"),
+            ("user_type", "dictionary"),
+            ("birth_year", "i"),
+            ("gender", "i"),
+            ("trip_id", "q")
+          ]
+
+# Dictionary shared by each dictionary-encoded column, so that start and stop station codes can be compared
+DICTIONARIES = { "start_station_name": "station_name",
+                 "stop_station_name": "station_name",
+                 "user_type": "user_type"
+               }
+
+
+# ------------------------------------------
+# FUNCTION get_typecode
+# ------------------------------------------
+def get_typecode(column_type):
+    """
+    Returns the array typecode used to store a column of the given type.
+
+    Args:
+        column_type (str): The type of the column, as in COLUMNS.
+
+    Returns:
+        str: The array typecode of the column.
+    """
+    if column_type == "timestamp":
+        return "q"
+    if column_type == "dictionary":
+        return "i"
+    return column_type
+
+
+# ------------------------------------------
+# FUNCTION get_cache_file
+# ------------------------------------------
+def get_cache_file(csv_file, cache_directory):
+    """
+    Returns the path of the cache file of a CSV file.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        cache_directory (str): The path to the directory containing the cache files.
+
+    Returns:
+        str: The path to the cache file.
+    """
+    return os.path.join(cache_directory, os.path.basename(csv_file) + ".col")
+
+
+# ------------------------------------------
+# FUNCTION read_header
+# ------------------------------------------
+def read_header(my_input_stream):
+    """
+    Reads the header of a cache file.
+
+    Args:
+        my_input_stream (file): The cache file, opened in binary mode and positioned at its start.
+
+    Returns:
+        dict: The header, or None if the file is not a cache file.
+    """
+    if my_input_stream.read(len(MAGIC)) != MAGIC:
+        return None
+    (header_size,) = struct.unpack("<Q", my_input_stream.read(8))
+    return json.loads(my_input_stream.read(header_size).decode("utf-8"))
+
+
+# ------------------------------------------
+# FUNCTION build_cache_file
+# ------------------------------------------
+def build_cache_file(csv_file, cache_file):
+    """
+    Converts a CSV file into a cache file. Lines not having 16 fields are skipped.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        cache_file (str): The path to the cache file to write.
+
+    Returns:
+        int: The number of rows written to the cache file.
+    """
+    # 1. We parse the CSV file into one array per column
+    source = os.stat(csv_file)
+    columns = [ array.array(get_typecode(column_type)) for name, column_type in COLUMNS ]
+    dictionaries = { name: {} for name in set(DICTIONARIES.values()) }
+    encoders = [ dictionaries[DICTIONARIES[name]] if column_type == "dictionary" else None
+                 for name, column_type in COLUMNS ]
+    converters = [ my_timestamp.parse_timestamp if column_type == "timestamp" else float if column_type == "d" else int
+                   for name, column_type in COLUMNS ]
+
+    with my_compression.open_file(csv_file, "r") as my_input_stream:
+        for line in my_input_stream:
+            fields = line.strip().split(",")
+            if len(fields) != 16:
+                continue
+            for index, field in enumerate(fields):
+                encoder = encoders[index]
+                if encoder is None:
+                    columns[index].append(converters[index](field))
+                else:
+                    columns[index].append(encoder.setdefault(field, len(encoder)))
+
+    # 2. We describe the layout in the header. Each column starts at an offset aligned to 8 bytes
+    num_rows = len(columns[0])
+    offset = 0
+    layout = []
+    for (name, column_type), column in zip(COLUMNS, columns):
+        layout.append({ "name": name, "type": column_type, "typecode": column.typecode, "offset": offset })
+        offset += -(-len(column) * column.itemsize // 8) * 8
+
+    header = { "source_size": source.st_size,
+               "source_mtime_ns": source.st_mtime_ns,
+               "byteorder": sys.byteorder,
+               "num_rows": num_rows,
+               "columns": layout,
+               "dictionaries": { name: sorted(encoder, key=encoder.get) for name, encoder in dictionaries.items() }
+             }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // 8) * 8
+
+    # 3. We write the file under a temporary name and then move it, so that readers never see half a file
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    temporary_file = cache_file + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_file, "wb") as my_output_stream:
+        my_output_stream.write(MAGIC)
+        my_output_stream.write(struct.pack("<Q", len(header_bytes)))
+        my_output_stream.write(header_bytes)
+        for entry, column in zip(layout, columns):
+            my_output_stream.seek(data_start + entry["offset"])
+            column.tofile(my_output_stream)
+        my_output_stream.truncate(data_start + offset)
+    os.replace(temporary_file, cache_file)
+
+    return num_rows
+
+
+# ------------------------------------------
+# FUNCTION is_cache_file_valid
+# ------------------------------------------
+def is_cache_file_valid(csv_file, cache_file):
+    """
+    Checks whether a cache file exists and is up to date with the size and modification time of its CSV file.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        cache_file (str): The path to the cache file.
+
+    Returns:
+        bool: True if the cache file can be used.
+    """
+    if not os.path.isfile(cache_file):
+        return False
+    source = os.stat(csv_file)
+    with open(cache_file, "rb") as my_input_stream:
+        header = read_header(my_input_stream)
+    return ((header is not None) and
+            (header["source_size"] == source.st_size) and
+            (header["source_mtime_ns"] == source.st_mtime_ns) and
+            (header["byteorder"] == sys.byteorder))
+
+
+# ------------------------------------------
+# FUNCTION load_table
+# ------------------------------------------
+def load_table(csv_file, cache_directory):
+    """
+    Returns the columns of a CSV file from its cache file, which is (re)built first if it is missing or out of date.
+    The columns are memory-mapped, so no data is copied until it is used.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        cache_directory (str): The path to the directory containing the cache files.
+
+    Returns:
+        dict: A dictionary with the following keys:
+            'num_rows': The number of rows.
+            'columns': A dictionary mapping each column name to a memoryview of its values. Dictionary-encoded
+                columns hold the codes of their values.
+            'dictionaries': A dictionary mapping each dictionary-encoded column name to the list of its values,
+                indexed by code. Start and stop station names share the same list.
+    """
+    # 1. We (re)build the cache file if needed
+    cache_file = get_cache_file(csv_file, cache_directory)
+    if not is_cache_file_valid(csv_file, cache_file):
+        build_cache_file(csv_file, cache_file)
+
+    # 2. We map it into memory
+    with open(cache_file, "rb") as my_input_stream:
+        header = read_header(my_input_stream)
+        data_start = -(-my_input_stream.tell() // 8) * 8
+        my_buffer = memoryview(b"")
+        if os.fstat(my_input_stream.fileno()).st_size > data_start:
+            my_buffer = memoryview(mmap.mmap(my_input_stream.fileno(), 0, access=mmap.ACCESS_READ))
+
+    # 3. We slice one memoryview per column
+    num_rows = header["num_rows"]
+    columns = {}
+    for entry in header["columns"]:
+        start = data_start + entry["offset"]
+        size = num_rows * array.array(entry["typecode"]).itemsize
+        columns[entry["name"]] = my_buffer[start:start + size].cast(entry["typecode"])
+
+    dictionaries = { name: header["dictionaries"][dictionary] for name, dictionary in DICTIONARIES.items() }
+
+    return { "num_rows": num_rows, "columns": columns, "dictionaries": dictionaries }
+
+
+# ---------------------------------------------------------------
+#           PYTHON EXECUTION
+# This is the main entry point to the execution of our program.
+# It provides a call to the 'main function' defined in our
+# Python program, making the Python interpreter to trigger
+# its execution.
+# ---------------------------------------------------------------
+if __name__ == '__main__':
+    input_folder = "../my_dataset/"
+    cache_folder = "../my_dataset_cache/"
+
+    # We (re)build the cache file of each CSV file that is missing or out of date
+    count = 0
+    for filename in sorted(os.listdir(input_folder)):
+        if my_compression.strip_extension(filename).endswith(".csv"):
+            load_table(input_folder + filename, cache_folder)
+            count += 1
+    print(f"'{count}' files cached in '{cache_folder}'")
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program splits a CSV file of the dataset into byte ranges (input splits), so that several workers can each
+# process a chunk of the same file, as Hadoop does with the blocks of a big file.
+#
+# The splits are aligned to line breaks: each split starts at the beginning of a line and ends right after a line
+# break (or at the end of the file), so that every line is read by exactly one worker.
+#
+# Compressed files (see my_compression) cannot be read from an offset, so they are never split: they have a single
+# split, which is read by decompressing the whole file.
+#
+# The program provides the following functions:
+#
+#   get_splits(file_name, split_size):
+#       Returns the byte ranges of the splits of a file.
+#
+#   read_lines(file_name, start, end):
+#       Lazily reads the lines of a split of a file.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import my_compression
+
+
+# ------------------------------------------
+# FUNCTION get_splits
+# ------------------------------------------
+def get_splits(file_name, split_size):
+    """
+    Returns the byte ranges of the splits of a file. Each split has about split_size bytes, as it is extended up to the
+    end of the line it would otherwise cut.
+
+    Args:
+        file_name (str): The path to the file.
+        split_size (int): The number of bytes of each split.
+
+    Returns:
+        list: The (start, end) byte offsets of the splits, in file order. An empty file has a single empty split, and
+            a compressed file has a single split spanning all of it.
+    """
+    size = os.path.getsize(file_name)
+    if my_compression.is_compressed(file_name):
+        return [(0, size)]
+
+    res = []
+    start = 0
+    with open(file_name, "rb") as my_input_stream:
+        while (start < size) or (len(res) == 0):
+            # 1. We look for the first line starting at or after start + split_size
+            end = start + split_size
+            if end < size:
+                my_input_stream.seek(end - 1)
+                my_input_stream.readline()
+                end = my_input_stream.tell()
+            else:
+                end = size
+
+            # 2. The split spans up to it
+            res.append((start, end))
+            start = end
+    return res
+
+
+# ------------------------------------------
+# FUNCTION read_lines
+# ------------------------------------------
+def read_lines(file_name, start, end):
+    """
+    Lazily reads the lines of a split of a file.
+
+    Args:
+        file_name (str): The path to the file.
+        start (int): The byte offset where the split starts, at the beginning of a line.
+        end (int): The byte offset where the split ends, right after a line break or at the end of the file.
+
+    Yields:
+        str: The lines of the split, including their line breaks.
+    """
+    if my_compression.is_compressed(file_name):
+        with my_compression.open_file(file_name, "r", newline="") as my_input_stream:
+            yield from my_input_stream
+        return
+
+    with open(file_name, "rb") as my_input_stream:
+        my_input_stream.seek(start)
+        position = start
+        while position < end:
+            line = my_input_stream.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode("utf-8")
@@ -0,0 +1,300 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program collects metrics of the runs of the meta-algorithm: the wall time of each phase (map, sort, reduce)
+# and of each file processed in it, the records read and written, and the bytes read and written. The metrics of a
+# run are emitted as a single JSON document.
+#
+# The metrics are switched on (and off) through environment variables, with no need to edit the code:
+#   - A01_METRICS: The path of the JSON file to write the metrics to, or '-' to write them to stderr. If it is not
+#     set, no metrics are collected, and the jobs run as fast as they do without them.
+#   - A01_PROFILE: A comma-separated list of profilers run on each phase (only if A01_METRICS is set):
+#       - 'cprofile': The functions taking the most cumulative time. The full profile of each phase is also written
+#         next to the JSON file, as '<file>.<phase>.prof' (e.g. for snakeviz).
+#       - 'tracemalloc': The peak memory allocated by Python and the lines allocating the most.
+#     The profilers only see the work done in the process running my_main, so the mappers and reducers are only
+#     profiled when they are run sequentially (num_map_workers=1 and num_reduce_workers=1).
+#
+# e.g. A01_METRICS=metrics.json A01_PROFILE=cprofile python3 my_meta-algorithm.py
+#
+# The program provides the following functions and classes:
+#
+#   is_enabled():
+#       Checks whether the metrics are switched on.
+#
+#   new_report(**info):
+#       Creates the report of a run, or returns None if the metrics are switched off.
+#
+#   measure_phase(report, name):
+#       Context manager measuring (and profiling) a phase of a run.
+#
+#   CountingStream(my_stream, metrics, count_bytes):
+#       A stream wrapper counting the records (and bytes) read from and written to the stream.
+#
+#   write_report(report):
+#       Writes the report of a run as JSON.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import datetime
+import contextlib
+import tracemalloc
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+METRICS_VARIABLE = "A01_METRICS"
+PROFILE_VARIABLE = "A01_PROFILE"
+
+# The counters of the files that are added up into the counters of their phase
+COUNTERS = [ "records_in", "records_out", "bytes_read", "bytes_written" ]
+
+# The number of functions (cProfile) and lines (tracemalloc) reported per phase
+NUM_TOP_ENTRIES = 20
+
+
+# ------------------------------------------
+# FUNCTION is_enabled
+# ------------------------------------------
+def is_enabled():
+    """
+    Checks whether the metrics are switched on, i.e. whether A01_METRICS is set.
+
+    Returns:
+        bool: True if the metrics are collected.
+    """
+    return bool(os.environ.get(METRICS_VARIABLE))
+
+
+# ------------------------------------------
+# FUNCTION get_profilers
+# ------------------------------------------
+def get_profilers():
+    """
+    Returns the profilers switched on through A01_PROFILE.
+
+    Returns:
+        set: The names of the profilers, among 'cprofile' and 'tracemalloc'.
+    """
+    return set(name.strip().lower() for name in os.environ.get(PROFILE_VARIABLE, "").split(",") if name.strip())
+
+
+# ------------------------------------------
+# FUNCTION new_report
+# ------------------------------------------
+def new_report(**info):
+    """
+    Creates the report of a run.
+
+    Args:
+        **info: Any JSON-serializable information about the run, e.g. its input and output directories.
+
+    Returns:
+        dict: The report, with no phases yet, or None if the metrics are switched off.
+    """
+    if not is_enabled():
+        return None
+    return { "date": datetime.datetime.now().isoformat(timespec="seconds"), "info": info, "phases": [] }
+
+
+# ------------------------------------------
+# FUNCTION new_file_metrics
+# ------------------------------------------
+def new_file_metrics(input_file, output_file):
+    """
+    Creates the metrics of a file processed in a phase, with all its counters at 0.
+
+    Args:
+        input_file (str): The path to the file read.
+        output_file (str): The path to the file written.
+
+    Returns:
+        dict: The metrics of the file.
+    """
+    res = { "input_file": input_file, "output_file": output_file, "seconds": 0.0 }
+    res.update((counter, 0) for counter in COUNTERS)
+    return res
+
+
+# ------------------------------------------
+# FUNCTION get_file_size
+# ------------------------------------------
+def get_file_size(file_name):
+    """
+    Returns the size of a file, or 0 if it does not exist.
+
+    Args:
+        file_name (str): The path to the file.
+
+    Returns:
+        int: The number of bytes of the file.
+    """
+    return os.path.getsize(file_name) if os.path.isfile(file_name) else 0
+
+
+# ------------------------------------------
+# FUNCTION get_top_functions
+# ------------------------------------------
+def get_top_functions(profiler):
+    """
+    Returns the functions that took the most cumulative time in a profile.
+
+    Args:
+        profiler (cProfile.Profile): The profiler, once disabled.
+
+    Returns:
+        list: The function, number of calls, own seconds and cumulative seconds of the top functions.
+    """
+    stats = pstats.Stats(profiler).stats
+    entries = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:NUM_TOP_ENTRIES]
+    return [ { "function": "{}:{}({})".format(*function),
+               "calls": calls,
+               "seconds": round(own_seconds, 6),
+               "cumulative_seconds": round(cumulative_seconds, 6)
+             }
+             for function, (primitive_calls, calls, own_seconds, cumulative_seconds, callers) in entries
+           ]
+
+
+# ------------------------------------------
+# FUNCTION measure_phase
+# ------------------------------------------
+@contextlib.contextmanager
+def measure_phase(report, name):
+    """
+    Measures a phase of a run: its wall time and, if switched on, its profiles. The phase is added to the report, and
+    the counters of its files are added up into its own (unless it sets them itself).
+
+    Args:
+        report (dict): The report of the run, or None if the metrics are switched off (then nothing is measured).
+        name (str): The name of the phase, e.g. 'map'.
+
+    Yields:
+        dict: The phase, to which the caller adds the metrics of its files (in 'files') and any other metrics.
+    """
+    # 1. If the metrics are switched off, the phase is just a placeholder
+    phase = { "name": name, "files": [] }
+    if report is None:
+        yield phase
+        return
+
+    # 2. We start the profilers and the clock
+    profilers = get_profilers()
+    profiler = None
+    if "cprofile" in profilers:
+        profiler = cProfile.Profile()
+    tracing = ("tracemalloc" in profilers) and (not tracemalloc.is_tracing())
+    if tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    start_time = time.perf_counter()
+
+    # 3. We run the phase
+    try:
+        yield phase
+
+    # 4. We stop the clock and the profilers, and add the phase to the report
+    finally:
+        phase["seconds"] = round(time.perf_counter() - start_time, 6)
+        if profiler is not None:
+            profiler.disable()
+            phase["cprofile"] = get_top_functions(profiler)
+            metrics_file = os.environ.get(METRICS_VARIABLE)
+            if metrics_file != "-":
+                profiler.dump_stats(metrics_file + "." + name + ".prof")
+        if tracing:
+            current_size, peak_size = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            phase["tracemalloc"] = { "peak_bytes": peak_size,
+                                     "top_lines": [ { "line": str(statistic.traceback), "bytes": statistic.size }
+                                                    for statistic in snapshot.statistics("lineno")[:NUM_TOP_ENTRIES]
+                                                  ]
+                                   }
+
+        phase["files"] = [ metrics for metrics in phase["files"] if metrics is not None ]
+        for counter in COUNTERS:
+            if counter not in phase:
+                phase[counter] = sum(metrics.get(counter, 0) for metrics in phase["files"])
+        report["phases"].append(phase)
+
+
+# ------------------------------------------
+# CLASS CountingStream
+# ------------------------------------------
+class CountingStream:
+    """
+    A wrapper of a stream (or any iterable of records) that counts the records read from it and written to it into
+    the metrics of a file. Records are lines of text, binary records (see my_records) or items of an iterable.
+    Everything else is passed through to the stream, so the wrapper can be given to my_map and my_reduce instead.
+
+    Args:
+        my_stream: The stream (or iterable) to wrap.
+        metrics (dict): The metrics of the file, whose 'records_in' and 'records_out' are updated.
+        count_bytes (bool): Whether the UTF-8 bytes of the lines read and written are counted as well, into
+            'bytes_read' and 'bytes_written', e.g. for pipes, whose size cannot be taken from a file.
+    """
+
+    def __init__(self, my_stream, metrics, count_bytes=False):
+        self.my_stream = my_stream
+        self.metrics = metrics
+        self.count_bytes = count_bytes
+
+    def __iter__(self):
+        for record in self.my_stream:
+            self.metrics["records_in"] += 1
+            if self.count_bytes:
+                self.metrics["bytes_read"] += len(record.encode("utf-8"))
+            yield record
+
+    def write(self, text):
+        self.metrics["records_out"] += text.count("\n")
+        if self.count_bytes:
+            self.metrics["bytes_written"] += len(text.encode("utf-8"))
+        return self.my_stream.write(text)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.my_stream, name)
+        if name == "write_record":
+            def write_record(key, value):
+                self.metrics["records_out"] += 1
+                attribute(key, value)
+            return write_record
+        if name == "read_records":
+            return lambda: iter(CountingStream(attribute(), self.metrics))
+        return attribute
+
+
+# ------------------------------------------
+# FUNCTION write_report
+# ------------------------------------------
+def write_report(report):
+    """
+    Writes the report of a run as JSON, to the file given by A01_METRICS (or to stderr if it is '-').
+
+    Args:
+        report (dict): The report, or None if the metrics are switched off (then nothing is written).
+    """
+    if report is None:
+        return
+    metrics_file = os.environ.get(METRICS_VARIABLE)
+    if metrics_file == "-":
+        json.dump(report, sys.stderr, indent=1)
+        sys.stderr.write("\n")
+    else:
+        with open(metrics_file, "w", encoding="utf-8") as my_output_stream:
+            json.dump(report, my_output_stream, indent=1)
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program scans the lines of a CSV file of the dataset straight from a memory map of the file, returning only
+# the bytes of the columns a job needs, rather than decoding each whole line to str and splitting it into a list of
+# all its fields.
+#
+# The lines are matched by a regular expression built for the columns needed, which the re module runs over the
+# memory map itself, so the file is never copied into Python objects: only the needed columns of each line are
+# sliced out, and they are left as bytes for the caller to decode (if at all) once it knows they are needed.
+#
+# If the lines needed all contain some bytes (e.g. ',<bike id>,'), these are first searched for in the memory map,
+# and only the lines containing them are matched, so the lines of other bikes are never even scanned by the regular
+# expression. This is where the scanner pays off: matching every line of a file is slower than decoding and
+# splitting the lines (e.g. the 'mmap' engine of Part 1 against its 'python' one), so it is only worth it with a
+# needle.
+#
+# The lines that do not have the expected number of fields are skipped, and counted: their number is logged as a
+# warning (see my_task_log) once the file has been scanned.
+#
+# The program provides the following functions:
+#
+#   get_pattern(columns, num_fields):
+#       Returns the regular expression matching a line and capturing some of its columns.
+#
+#   scan_fields(file_name, columns, num_fields, needle):
+#       Lazily returns the needed columns of each line of a file.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import re
+import sys
+import mmap
+import functools
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import my_task_log
+
+
+# ------------------------------------------
+# FUNCTION get_pattern
+# ------------------------------------------
+@functools.lru_cache(maxsize=None)
+def get_pattern(columns, num_fields=16):
+    """
+    Returns the regular expression matching a line with num_fields fields, and capturing the given columns. Any other
+    (non-empty) line matches as well, but captures nothing, so that it is counted as skipped.
+
+    Args:
+        columns (tuple): The indexes of the columns to capture, in increasing order.
+        num_fields (int): The number of fields of a line. Lines with any other number of fields capture nothing.
+
+    Returns:
+        re.Pattern: The compiled regular expression.
+    """
+    field = rb"[^,\r\n]*"
+    parts = [ (b"(" + field + b")") if (index in columns) else field for index in range(num_fields) ]
+    return re.compile(rb"^(?:" + b",".join(parts) + rb"\r?$|[^\n]+)", re.MULTILINE)
+
+
+# ------------------------------------------
+# FUNCTION scan_buffer
+# ------------------------------------------
+def scan_buffer(my_buffer, pattern, needle):
+    """
+    Lazily matches the lines of a buffer, or only the ones containing the needle.
+
+    Args:
+        my_buffer (mmap): The content of the file.
+        pattern (re.Pattern): The regular expression matching a line (see get_pattern).
+        needle (bytes): The bytes that the lines needed contain, or None to match all lines.
+
+    Yields:
+        re.Match: The match of each line.
+    """
+    # 1. If there is no needle, we match all lines in a single pass
+    if needle is None:
+        yield from pattern.finditer(my_buffer)
+        return
+
+    # 2. Otherwise we jump from one occurrence of the needle to the next, and only match the line containing it
+    position = my_buffer.find(needle)
+    while position != -1:
+        start = my_buffer.rfind(b"\n", 0, position) + 1
+        end = my_buffer.find(b"\n", position)
+        if end == -1:
+            end = len(my_buffer)
+        match = pattern.match(my_buffer, start, end)
+        if match is not None:
+            yield match
+        position = my_buffer.find(needle, end)
+
+
+# ------------------------------------------
+# FUNCTION scan_fields
+# ------------------------------------------
+def scan_fields(file_name, columns, num_fields=16, needle=None):
+    """
+    Lazily returns the given columns of each line of a file with num_fields fields, scanning a memory map of the file.
+    Lines with any other number of fields are skipped, and their number is logged as a warning once the file has been
+    scanned (see my_task_log).
+
+    Args:
+        file_name (str): The path to the file.
+        columns (tuple): The indexes of the columns needed, in increasing order.
+        num_fields (int): The number of fields of a line.
+        needle (bytes): If given, only the lines containing these bytes are scanned, e.g. b',35143,' for the lines of
+            a bike (the lines of other bikes containing them anyway are still returned, so the caller must check
+            them).
+
+    Yields:
+        tuple: The bytes of the columns of a line, in the same order as columns.
+    """
+    pattern = get_pattern(tuple(columns), num_fields)
+    with open(file_name, "rb") as my_input_stream:
+        if os.fstat(my_input_stream.fileno()).st_size == 0:
+            return
+        with mmap.mmap(my_input_stream.fileno(), 0, access=mmap.ACCESS_READ) as my_buffer:
+            skipped = 0
+            for match in scan_buffer(my_buffer, pattern, needle):
+                if match.lastindex is None:
+                    skipped += 1
+                else:
+                    yield match.groups()
+
+    # We report the lines skipped
+    if skipped > 0:
+        task_log = my_task_log.TaskLog(file_name)
+        task_log.count("skipped_lines", skipped)
+        task_log.warning("'{}' {} without {} fields skipped in '{}'".format(skipped,
+                                                                           "line" if (skipped == 1) else "lines",
+                                                                           num_fields,
+                                                                           file_name))
+        task_log.flush()
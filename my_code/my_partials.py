@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program keeps on disk the partial result (e.g. the station counts) of a job over each daily CSV file of the
+# dataset, so that a new run only has to process the files that are new or have changed since the last one, and then
+# merge their partial results with the ones kept from the others.
+#
+# There is one partial file per CSV file and job, holding as JSON:
+#   - The name, size, modification time and content hash (SHA-256) of the CSV file.
+#   - The key of the job (e.g. a hash of its code and parameters), so that a partial is not reused by another job.
+#   - The partial result itself, which can be any value JSON can hold.
+#
+# A partial is valid if the CSV file has the same size and modification time. Otherwise, if its content hash is the
+# same (e.g. the file was just copied again), the partial is still valid and its modification time is updated.
+#
+# The program provides the following functions:
+#
+#   get_file_hash(file_name):
+#       Returns the content hash of a file.
+#
+#   get_job_key(source_files, parameters):
+#       Returns the key of a job, out of the files of its code and its parameters.
+#
+#   get_partial(csv_file, partials_folder, compute_partial, job_key):
+#       Returns the partial result of a job over a CSV file, computing it only if it is missing or out of date.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import json
+import hashlib
+
+
+# ------------------------------------------
+# FUNCTION get_file_hash
+# ------------------------------------------
+def get_file_hash(file_name, block_size=1 << 20):
+    """
+    Returns the content hash of a file, reading it in blocks.
+
+    Args:
+        file_name (str): The path to the file.
+        block_size (int): The number of bytes read at once.
+
+    Returns:
+        str: The SHA-256 of the content of the file, in hexadecimal.
+    """
+    res = hashlib.sha256()
+    with open(file_name, "rb") as my_input_stream:
+        for block in iter(lambda: my_input_stream.read(block_size), b""):
+            res.update(block)
+    return res.hexdigest()
+
+
+# ------------------------------------------
+# FUNCTION get_job_key
+# ------------------------------------------
+def get_job_key(source_files, parameters):
+    """
+    Returns the key of a job, so that the partials of a job are not reused once its code or parameters change.
+
+    Args:
+        source_files (list): The paths to the files with the code of the job.
+        parameters: The parameters of the job. Their repr must not change from one run to the next.
+
+    Returns:
+        str: The key of the job.
+    """
+    res = hashlib.sha256()
+    for source_file in source_files:
+        res.update(get_file_hash(source_file).encode("utf-8"))
+    res.update(repr(parameters).encode("utf-8"))
+    return res.hexdigest()
+
+
+# ------------------------------------------
+# FUNCTION get_partial_file
+# ------------------------------------------
+def get_partial_file(csv_file, partials_folder):
+    """
+    Returns the path of the partial file of a CSV file.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        partials_folder (str): The path to the folder containing the partial files.
+
+    Returns:
+        str: The path to the partial file.
+    """
+    return os.path.join(partials_folder, os.path.basename(csv_file) + ".json")
+
+
+# ------------------------------------------
+# FUNCTION write_partial_file
+# ------------------------------------------
+def write_partial_file(partial_file, record):
+    """
+    Writes a partial file under a temporary name and then moves it, so that readers never see half a file.
+
+    Args:
+        partial_file (str): The path to the partial file.
+        record (dict): The content of the partial file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(partial_file)), exist_ok=True)
+    temporary_file = partial_file + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_file, "w", encoding="utf-8") as my_output_stream:
+        json.dump(record, my_output_stream)
+    os.replace(temporary_file, partial_file)
+
+
+# ------------------------------------------
+# FUNCTION get_partial
+# ------------------------------------------
+def get_partial(csv_file, partials_folder, compute_partial, job_key=""):
+    """
+    Returns the partial result of a job over a CSV file. It is read from its partial file if it is valid, and
+    otherwise it is computed and the partial file is (re)written.
+
+    Args:
+        csv_file (str): The path to the CSV file.
+        partials_folder (str): The path to the folder containing the partial files of the job.
+        compute_partial (function): The function computing the partial result, called with no arguments.
+        job_key (str): The key of the job (see get_job_key).
+
+    Returns:
+        tuple: The partial result, and whether it was computed (rather than read from its partial file).
+    """
+    # 1. We read the partial file, if any
+    partial_file = get_partial_file(csv_file, partials_folder)
+    source = os.stat(csv_file)
+    record = None
+    if os.path.isfile(partial_file):
+        with open(partial_file, "r", encoding="utf-8") as my_input_stream:
+            record = json.load(my_input_stream)
+        if (record["source_name"] != os.path.basename(csv_file)) or (record["job_key"] != job_key):
+            record = None
+
+    # 2. If the CSV file has not changed, we return its partial
+    if ((record is not None) and
+            (record["source_size"] == source.st_size) and (record["source_mtime_ns"] == source.st_mtime_ns)):
+        return record["partial"], False
+
+    # 3. If only its modification time has changed, we update it and return its partial
+    source_hash = get_file_hash(csv_file)
+    if ((record is not None) and
+            (record["source_size"] == source.st_size) and (record["source_hash"] == source_hash)):
+        record["source_mtime_ns"] = source.st_mtime_ns
+        write_partial_file(partial_file, record)
+        return record["partial"], False
+
+    # 4. Otherwise we compute the partial and write it
+    partial = compute_partial()
+    record = { "source_name": os.path.basename(csv_file),
+               "source_size": source.st_size,
+               "source_mtime_ns": source.st_mtime_ns,
+               "source_hash": source_hash,
+               "job_key": job_key,
+               "partial": partial
+             }
+    write_partial_file(partial_file, record)
+    return partial, True
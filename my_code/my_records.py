@@ -0,0 +1,276 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program reads and writes the (key, value) pairs passed between the map, sort and reduce stages as compact
+# binary records, rather than as lines of text that each stage has to split and parse again.
+#
+# Each record is length-prefixed:
+#   - The length of the key (varint) and the key (UTF-8).
+#   - The length of the value (varint) and the value.
+#
+# A value is a tuple of ints and strs (e.g. the start and stop counts of a station). It is encoded as its number of
+# items (1 byte) followed by each item: a tag (1 byte) and either a zigzag varint (int) or the length (varint) and
+# UTF-8 bytes of the str.
+#
+# The program provides the following functions and classes:
+#
+#   encode_record(key, value):
+#       Encodes a (key, value) pair as a record.
+#
+#   decode_records(data):
+#       Lazily decodes the records of a buffer.
+#
+#   read_record_file(file_name):
+#       Lazily decodes the records of a file, from a memory map of it (or from its content, if it is compressed).
+#
+#   RecordWriter(my_output_stream, name):
+#       A file-like object the mappers and reducers write records to, instead of lines.
+#
+#   RecordReader(records, name):
+#       A file-like object the reducers read records from, instead of lines.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import os
+import sys
+import mmap
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import my_compression
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+INT_TAG = 0
+STR_TAG = 1
+
+
+# ------------------------------------------
+# FUNCTION encode_varint
+# ------------------------------------------
+def encode_varint(number, res):
+    """
+    Appends a non-negative int to a buffer, 7 bits per byte (the high bit of a byte is set if more bytes follow).
+
+    Args:
+        number (int): The int to encode.
+        res (bytearray): The buffer.
+    """
+    while number >= 0x80:
+        res.append((number & 0x7F) | 0x80)
+        number >>= 7
+    res.append(number)
+
+
+# ------------------------------------------
+# FUNCTION decode_varint
+# ------------------------------------------
+def decode_varint(data, position):
+    """
+    Decodes a non-negative int written by encode_varint.
+
+    Args:
+        data (bytes): The buffer.
+        position (int): The position of the int in the buffer.
+
+    Returns:
+        tuple: The int and the position right after it.
+    """
+    byte = data[position]
+    position += 1
+    if byte < 0x80:
+        return byte, position
+    res = byte & 0x7F
+    shift = 7
+    while True:
+        byte = data[position]
+        position += 1
+        res |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return res, position
+        shift += 7
+
+
+# ------------------------------------------
+# FUNCTION encode_record
+# ------------------------------------------
+def encode_record(key, value):
+    """
+    Encodes a (key, value) pair as a record.
+
+    Args:
+        key (str): The key.
+        value (tuple): The value, a tuple of at most 255 ints and strs.
+
+    Returns:
+        bytearray: The record.
+    """
+    # 1. We encode the value
+    encoded_value = bytearray((len(value),))
+    for item in value:
+        if isinstance(item, int):
+            encoded_value.append(INT_TAG)
+            encode_varint((item << 1) if item >= 0 else ((-item << 1) - 1), encoded_value)
+        else:
+            item = item.encode("utf-8")
+            encoded_value.append(STR_TAG)
+            encode_varint(len(item), encoded_value)
+            encoded_value += item
+
+    # 2. We prefix the key and the value with their lengths
+    encoded_key = key.encode("utf-8")
+    res = bytearray()
+    encode_varint(len(encoded_key), res)
+    res += encoded_key
+    encode_varint(len(encoded_value), res)
+    res += encoded_value
+    return res
+
+
+# ------------------------------------------
+# FUNCTION decode_value
+# ------------------------------------------
+def decode_value(data, position):
+    """
+    Decodes a value written by encode_record.
+
+    Args:
+        data (bytes): The buffer.
+        position (int): The position of the value in the buffer.
+
+    Returns:
+        tuple: The value.
+    """
+    num_items = data[position]
+    position += 1
+    res = []
+    for index in range(num_items):
+        tag = data[position]
+        number, position = decode_varint(data, position + 1)
+        if tag == INT_TAG:
+            res.append((number >> 1) if (number & 1) == 0 else -((number + 1) >> 1))
+        else:
+            res.append(data[position:position + number].decode("utf-8"))
+            position += number
+    return tuple(res)
+
+
+# ------------------------------------------
+# FUNCTION decode_records
+# ------------------------------------------
+def decode_records(data):
+    """
+    Lazily decodes the records of a buffer.
+
+    Args:
+        data (bytes): The buffer (or a memory map), holding whole records.
+
+    Yields:
+        tuple: The (key, value) pair of each record.
+    """
+    position = 0
+    size = len(data)
+    while position < size:
+        key_size, position = decode_varint(data, position)
+        key = data[position:position + key_size].decode("utf-8")
+        value_size, position = decode_varint(data, position + key_size)
+        value = decode_value(data, position)
+        position += value_size
+        yield key, value
+
+
+# ------------------------------------------
+# FUNCTION read_record_file
+# ------------------------------------------
+def read_record_file(file_name):
+    """
+    Lazily decodes the records of a file, from a memory map of it. Compressed files (see my_compression) are
+    decompressed into memory instead.
+
+    Args:
+        file_name (str): The path to the file.
+
+    Yields:
+        tuple: The (key, value) pair of each record.
+    """
+    if my_compression.is_compressed(file_name):
+        with my_compression.open_file(file_name, "rb") as my_input_stream:
+            data = my_input_stream.read()
+        yield from decode_records(data)
+        return
+
+    with open(file_name, "rb") as my_input_stream:
+        if os.fstat(my_input_stream.fileno()).st_size == 0:
+            return
+        with mmap.mmap(my_input_stream.fileno(), 0, access=mmap.ACCESS_READ) as my_buffer:
+            yield from decode_records(my_buffer)
+
+
+# ------------------------------------------
+# CLASS RecordWriter
+# ------------------------------------------
+class RecordWriter:
+    """
+    A file-like object the mappers and reducers write (key, value) records to, instead of lines of text. The records
+    are encoded (see encode_record) and buffered, and written to a binary stream in large blocks. The number of bytes
+    of the records written so far is kept in size.
+
+    Args:
+        my_output_stream (file): The binary stream to write to.
+        name (str): The name of the stream, e.g. for the logs of the mappers and reducers.
+        buffer_size (int): The number of bytes buffered before they are written.
+    """
+
+    def __init__(self, my_output_stream, name=None, buffer_size=1 << 20):
+        self.my_output_stream = my_output_stream
+        self.name = name if (name is not None) else getattr(my_output_stream, "name", None)
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.size = 0
+
+    def write_record(self, key, value):
+        record = encode_record(key, value)
+        self.buffer += record
+        self.size += len(record)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.my_output_stream.write(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        self.my_output_stream.close()
+
+
+# ------------------------------------------
+# CLASS RecordReader
+# ------------------------------------------
+class RecordReader:
+    """
+    A file-like object the reducers read (key, value) records from, instead of lines of text.
+
+    Args:
+        records (iterable): The (key, value) records, e.g. read_record_file(...).
+        name (str): The name of the stream, e.g. for the logs of the reducers.
+    """
+
+    def __init__(self, records, name=None):
+        self.records = records
+        self.name = name
+
+    def read_records(self):
+        return iter(self.records)
+
+    def close(self):
+        close = getattr(self.records, "close", None)
+        if close is not None:
+            close()
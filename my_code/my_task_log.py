@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program logs what the mapper and reducer tasks do, rather than having them print it. Each task buffers its
+# messages and counters, and flushes them once, when it ends, either:
+#   - To stderr, so that they never mix with the data a task writes to stdout (e.g. when my_mapper.py and
+#     my_reducer.py are run as scripts, by the streaming mode of my_meta-algorithm.py or by Hadoop Streaming).
+#   - To a collector, when the tasks are run in-process (e.g. by my_meta-algorithm.py, which prints the log of each
+#     task as a single line).
+#
+# The messages below a level are dropped, with no need to edit the code, through the environment variable:
+#   - A01_LOG_LEVEL: One of 'debug', 'info' (by default), 'warning', 'error' or 'off'. With 'debug', the counters of
+#     each task are logged as well.
+#
+# e.g. A01_LOG_LEVEL=warning python3 my_meta-algorithm.py
+#
+# As the logs no longer go to stdout, the data streams of the scripts can have large buffers as well.
+#
+# The program provides the following functions and classes:
+#
+#   get_level():
+#       Returns the level below which messages are dropped.
+#
+#   TaskLog(name):
+#       The messages and counters of a task, flushed at once.
+#
+#   log_entries(my_output_stream, count):
+#       Logs (and counts) the entries a task wrote to its output stream.
+#
+#   collect():
+#       Context manager collecting the logs of the tasks run within it, rather than writing them to stderr.
+#
+#   open_data_streams(buffer_size):
+#       Returns stdin and stdout as the data streams of a script, with large buffers.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import io
+import os
+import sys
+import collections
+import contextlib
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+LEVEL_VARIABLE = "A01_LOG_LEVEL"
+
+LEVELS = { "debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100 }
+
+# The number of bytes buffered in the data streams of the scripts (see open_data_streams)
+BUFFER_SIZE = 1 << 20
+
+# The collectors the tasks of this process flush their logs to, innermost last (see collect)
+collectors = []
+
+
+# ------------------------------------------
+# FUNCTION get_level
+# ------------------------------------------
+def get_level():
+    """
+    Returns the level below which messages are dropped, as set by A01_LOG_LEVEL.
+
+    Returns:
+        int: The level, 'info' if A01_LOG_LEVEL is not set.
+
+    Raises:
+        ValueError: If A01_LOG_LEVEL is not one of the levels.
+    """
+    name = os.environ.get(LEVEL_VARIABLE, "info").strip().lower()
+    if name not in LEVELS:
+        raise ValueError("Unknown log level '" + name + "' in " + LEVEL_VARIABLE + ", use one of " + str(list(LEVELS)))
+    return LEVELS[name]
+
+
+# ------------------------------------------
+# CLASS Collector
+# ------------------------------------------
+class Collector:
+    """
+    The logs of the tasks run within collect(): their messages, and their counters added up.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.counters = collections.Counter()
+
+    def getvalue(self):
+        return "\n".join(self.messages)
+
+
+# ------------------------------------------
+# CLASS TaskLog
+# ------------------------------------------
+class TaskLog:
+    """
+    The messages and counters of a task. Messages below the level (see get_level) are dropped straight away, and the
+    rest are buffered along with the counters until the task flushes them, all at once.
+
+    Args:
+        name (str): The name of the task, e.g. the name of its output stream.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.level = get_level()
+        self.messages = []
+        self.counters = collections.Counter()
+
+    def count(self, counter, amount=1):
+        self.counters[counter] += amount
+
+    def log(self, level, message):
+        if LEVELS[level] >= self.level:
+            self.messages.append(message)
+
+    def info(self, message):
+        self.log("info", message)
+
+    def warning(self, message):
+        self.log("warning", message)
+
+    def flush(self):
+        # 1. At the debug level, the counters are logged as well
+        if (len(self.counters) > 0):
+            self.log("debug", "Counters of '" + str(self.name) + "': " + str(dict(self.counters)))
+
+        # 2. We hand the messages and counters to the innermost collector, or write the messages to stderr at once
+        if (len(collectors) > 0):
+            collectors[-1].messages.extend(self.messages)
+            collectors[-1].counters.update(self.counters)
+        elif (len(self.messages) > 0):
+            sys.stderr.write("".join(message + "\n" for message in self.messages))
+            sys.stderr.flush()
+
+        # 3. We start again
+        self.messages = []
+        self.counters = collections.Counter()
+
+
+# ------------------------------------------
+# FUNCTION log_entries
+# ------------------------------------------
+def log_entries(my_output_stream, count):
+    """
+    Logs (and counts) the entries a task wrote to its output stream, e.g. "'3' entries written to 'map_1.csv'".
+
+    Args:
+        my_output_stream (file): The output stream of the task.
+        count (int): The number of entries written to it.
+    """
+    task_log = TaskLog(getattr(my_output_stream, "name", None))
+    task_log.count("entries", count)
+    task_log.info("'{}' {} written to '{}'".format(count, "entry" if (count == 1) else "entries", task_log.name))
+    task_log.flush()
+
+
+# ------------------------------------------
+# FUNCTION collect
+# ------------------------------------------
+@contextlib.contextmanager
+def collect():
+    """
+    Collects the logs of the tasks run within it in this process, rather than writing them to stderr.
+
+    Yields:
+        Collector: The messages and counters of the tasks.
+    """
+    collector = Collector()
+    collectors.append(collector)
+    try:
+        yield collector
+    finally:
+        collectors.remove(collector)
+
+
+# ------------------------------------------
+# FUNCTION open_data_streams
+# ------------------------------------------
+def open_data_streams(buffer_size=BUFFER_SIZE):
+    """
+    Returns stdin and stdout as the UTF-8 data streams of a script, with buffers of buffer_size bytes rather than the
+    small ones of sys.stdin and sys.stdout. The output stream must be flushed (or closed) once the script is done.
+
+    Args:
+        buffer_size (int): The number of bytes buffered in each stream.
+
+    Returns:
+        tuple: The input and output streams, named '<stdin>' and '<stdout>'.
+    """
+    my_streams = []
+    for my_std_stream, mode in ((sys.stdin, "rb"), (sys.stdout, "wb")):
+        my_raw_stream = io.FileIO(my_std_stream.fileno(), mode, closefd=False)
+        my_raw_stream.name = my_std_stream.name
+        if (mode == "rb"):
+            my_buffer = io.BufferedReader(my_raw_stream, buffer_size)
+        else:
+            my_buffer = io.BufferedWriter(my_raw_stream, buffer_size)
+        my_streams.append(io.TextIOWrapper(my_buffer, encoding="utf-8"))
+    return my_streams[0], my_streams[1]
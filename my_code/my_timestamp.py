@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# --------------------------------------------------------
+#
+# PYTHON PROGRAM DEFINITION
+#
+# This program encodes and decodes the timestamps of the CSV files of the dataset, which always have the fixed
+# layout 'YYYY/MM/DD HH:MM:SS' (taken as UTC).
+#
+# Rather than going through datetime.strptime / strftime on every row, a timestamp is parsed by slicing its fields,
+# and the text of each day and of each time of the day is computed once and then cached, as the trips of the dataset
+# only span a few days.
+#
+# The program provides the following functions:
+#
+#   parse_timestamp(text):
+#       Parses a timestamp into seconds since the epoch.
+#
+#   format_timestamp(seconds):
+#       Formats seconds since the epoch as a timestamp.
+#
+#   is_date(date):
+#       Checks whether a date exists.
+#
+#   is_timestamp(text):
+#       Checks whether a text is a well formed (and valid) timestamp, which can be passed through as it is.
+#
+#   normalize_timestamp(text):
+#       Returns a timestamp as datetime.strptime followed by datetime.strftime would, without parsing it if it is
+#       already well formed.
+#
+# --------------------------------------------------------
+
+
+# ------------------------------------------
+# IMPORTS
+# ------------------------------------------
+import time
+import calendar
+import datetime
+import functools
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+SECONDS_PER_DAY = 86400
+
+
+# ------------------------------------------
+# FUNCTION get_day_seconds
+# ------------------------------------------
+@functools.lru_cache(maxsize=4096)
+def get_day_seconds(date):
+    """
+    Returns the seconds since the epoch at the start of a day.
+
+    Args:
+        date (str): A date with the format 'YYYY/MM/DD'.
+
+    Returns:
+        int: The seconds since the epoch.
+    """
+    return calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]), 0, 0, 0, 0, 0, 0))
+
+
+# ------------------------------------------
+# FUNCTION get_day_text
+# ------------------------------------------
+@functools.lru_cache(maxsize=4096)
+def get_day_text(day):
+    """
+    Returns the date of a day.
+
+    Args:
+        day (int): The number of days since the epoch.
+
+    Returns:
+        str: The date with the format 'YYYY/MM/DD'.
+    """
+    return time.strftime("%Y/%m/%d", time.gmtime(day * SECONDS_PER_DAY))
+
+
+# ------------------------------------------
+# FUNCTION get_time_text
+# ------------------------------------------
+@functools.lru_cache(maxsize=SECONDS_PER_DAY)
+def get_time_text(seconds):
+    """
+    Returns the time of the day of a number of seconds since midnight.
+
+    Args:
+        seconds (int): The seconds since midnight.
+
+    Returns:
+        str: The time with the format 'HH:MM:SS'.
+    """
+    return "{:02d}:{:02d}:{:02d}".format(seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+# ------------------------------------------
+# FUNCTION parse_timestamp
+# ------------------------------------------
+def parse_timestamp(text):
+    """
+    Parses a timestamp of the CSV files into seconds since the epoch. Timestamps that are not well formed (e.g.
+    without zero padding, see is_timestamp) are parsed by datetime.strptime instead, which rejects invalid ones.
+
+    Args:
+        text (str): A timestamp with the format 'YYYY/MM/DD HH:MM:SS'.
+
+    Returns:
+        int: The seconds since the epoch.
+
+    Raises:
+        ValueError: If the text is not a timestamp.
+    """
+    if not is_timestamp(text):
+        return calendar.timegm(datetime.datetime.strptime(text, TIMESTAMP_FORMAT).timetuple())
+    return get_day_seconds(text[0:10]) + int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+
+
+# ------------------------------------------
+# FUNCTION format_timestamp
+# ------------------------------------------
+def format_timestamp(seconds):
+    """
+    Formats seconds since the epoch as a timestamp of the CSV files.
+
+    Args:
+        seconds (int): The seconds since the epoch.
+
+    Returns:
+        str: The timestamp with the format 'YYYY/MM/DD HH:MM:SS'.
+    """
+    day, seconds = divmod(seconds, SECONDS_PER_DAY)
+    return get_day_text(day) + " " + get_time_text(seconds)
+
+
+# ------------------------------------------
+# FUNCTION is_date
+# ------------------------------------------
+@functools.lru_cache(maxsize=4096)
+def is_date(date):
+    """
+    Checks whether a date exists, e.g. not '2019/02/30'.
+
+    Args:
+        date (str): A date with the format 'YYYY/MM/DD', all digits.
+
+    Returns:
+        bool: True if the date exists.
+    """
+    try:
+        datetime.date(int(date[0:4]), int(date[5:7]), int(date[8:10]))
+    except ValueError:
+        return False
+    return True
+
+
+# ------------------------------------------
+# FUNCTION is_timestamp
+# ------------------------------------------
+def is_timestamp(text):
+    """
+    Checks whether a text is a well formed timestamp, i.e. exactly as format_timestamp would write it. The fields
+    are compared as text, as they are zero padded, and the date is checked once per day (see is_date).
+
+    Args:
+        text (str): The text to check.
+
+    Returns:
+        bool: True if the text has the format 'YYYY/MM/DD HH:MM:SS' and is a valid date and time of the day.
+    """
+    return ((len(text) == 19) and
+            (text[4] == text[7] == "/") and (text[10] == " ") and (text[13] == text[16] == ":") and
+            (text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19]).isdigit() and
+            (text[11:13] <= "23") and (text[14:16] <= "59") and (text[17:19] <= "59") and
+            is_date(text[0:10]))
+
+
+# ------------------------------------------
+# FUNCTION normalize_timestamp
+# ------------------------------------------
+def normalize_timestamp(text):
+    """
+    Returns a timestamp as datetime.strptime followed by datetime.strftime would. Well formed timestamps are passed
+    through as they are, and only the rest are parsed and formatted back.
+
+    Args:
+        text (str): A timestamp with the format 'YYYY/MM/DD HH:MM:SS'.
+
+    Returns:
+        str: The timestamp with the format 'YYYY/MM/DD HH:MM:SS', zero padded.
+
+    Raises:
+        ValueError: If the text is not a timestamp.
+    """
+    if is_timestamp(text):
+        return text
+    return datetime.datetime.strptime(text, TIMESTAMP_FORMAT).strftime(TIMESTAMP_FORMAT)
@@ -19,55 +19,266 @@
 # ------------------------------------------
 # IMPORTS
 # ------------------------------------------
+import os
 import sys
-import codecs
+import glob
+import zlib
+import tempfile
+import itertools
+import collections
+import multiprocessing
+
+
+# ------------------------------------------
+# GLOBAL VARIABLES
+# ------------------------------------------
+# The number of bytes (when comparing the raw files) and of lines (when comparing their normalised lines) read at a time
+BLOCK_SIZE = 1 << 20
+BLOCK_LINES = 1 << 16
+
+# The number of bytes of the files compared in memory at a time when their order does not matter. Bigger files are
+# first split into buckets of about this size on disk, so that they can be compared whatever the memory available
+BUCKET_SIZE = 1 << 26
+
+# The ways the files can be compared:
+#   - "ordered": Line by line, in order.
+#   - "multiset": As multisets of lines, in any order (and, for the parts with several files of a stage, whatever the
+#     file each line is in).
+#   - "keyed": As maps of each key (the text before the tab of a line) to the multiset of its values, in any order.
+MODES = [ "ordered", "multiset", "keyed" ]
+
+
+# ------------------------------------------
+# FUNCTION are_identical
+# ------------------------------------------
+def are_identical(my_file_1, my_file_2):
+    # 1. Files of different sizes may still pass the test (e.g. if they only differ in spaces), so we cannot tell
+    if (os.path.getsize(my_file_1) != os.path.getsize(my_file_2)):
+        return False
+
+    # 2. Otherwise we compare their bytes block by block, stopping at the first different block
+    with open(my_file_1, "rb") as my_input_stream_1, open(my_file_2, "rb") as my_input_stream_2:
+        while True:
+            block_1 = my_input_stream_1.read(BLOCK_SIZE)
+            if (block_1 != my_input_stream_2.read(BLOCK_SIZE)):
+                return False
+            if (not block_1):
+                return True
+
+
+# ------------------------------------------
+# FUNCTION read_normalised_blocks
+# ------------------------------------------
+def read_normalised_blocks(my_input_stream):
+    # 1. We read the lines in blocks of BLOCK_LINES, removing their spaces
+    while True:
+        block = [ line.strip().replace(" ", "") for line in itertools.islice(my_input_stream, BLOCK_LINES) ]
+        if (not block):
+            return
+        yield block
+
+
+# ------------------------------------------
+# FUNCTION find_differences
+# ------------------------------------------
+def find_differences(my_file_1, my_file_2, num_differences=1):
+    # 1. We create the output variable
+    res = []
+
+    # 2. If both files are byte for byte the same, there is nothing else to check
+    if (are_identical(my_file_1, my_file_2) == True):
+        return res
+
+    # 3. Otherwise we compare their normalised lines block by block, without ever holding the whole files
+    with open(my_file_1, "r", encoding="utf-8") as my_input_stream_1, \
+         open(my_file_2, "r", encoding="utf-8") as my_input_stream_2:
+        line_number = 1
+        blocks = itertools.zip_longest(read_normalised_blocks(my_input_stream_1),
+                                       read_normalised_blocks(my_input_stream_2),
+                                       fillvalue=[]
+                                      )
+        for block_1, block_2 in blocks:
+            # 3.1. If the blocks are equal, we move on to the next ones
+            if (block_1 != block_2):
+                # 3.2. Otherwise we look for the lines that differ (or that one of the files lacks), until we have
+                # num_differences of them
+                for index in range(max(len(block_1), len(block_2))):
+                    if ((index >= len(block_1)) or (index >= len(block_2)) or (block_1[index] != block_2[index])):
+                        res.append(line_number + index)
+                        if (len(res) == num_differences):
+                            return res
+            line_number += max(len(block_1), len(block_2))
+
+    # 4. We return res
+    return res
 
 
 # ------------------------------------------
 # FUNCTION pass_test_single_file
 # ------------------------------------------
 def pass_test(my_file_1, my_file_2):
-    # 1. We create the output variable
-    res = True
+    # 1. Both files are equal if none of their lines differ, so we stop at the first one that does
+    return (len(find_differences(my_file_1, my_file_2, 1)) == 0)
+
+
+# ------------------------------------------
+# FUNCTION get_key
+# ------------------------------------------
+def get_key(line, mode):
+    # 1. In "keyed" mode the key of a line is the text before its tab, in "multiset" mode it is the whole line
+    if (mode == "keyed"):
+        return line.split("\t", 1)[0]
+    return line
 
-    # 2. We open both files
-    my_input_stream_1 = codecs.open(my_file_1, "r", encoding="utf-8")
-    my_input_stream_2 = codecs.open(my_file_2, "r", encoding="utf-8")
 
-    # 3. We read the full content of each file, removing any empty lines and spaces
-    content_1 = [ line.strip().replace(" ", "") for line in my_input_stream_1 if line ]
-    content_2 = [ line.strip().replace(" ", "") for line in my_input_stream_2 if line ]
+# ------------------------------------------
+# FUNCTION read_normalised_lines
+# ------------------------------------------
+def read_normalised_lines(list_of_files):
+    # 1. We read the lines of all the files, removing their spaces. Empty lines carry no information when the order
+    # does not matter, so they are skipped
+    for file_name in list_of_files:
+        with open(file_name, "r", encoding="utf-8") as my_input_stream:
+            for line in my_input_stream:
+                line = line.strip().replace(" ", "")
+                if (line != ""):
+                    yield line
 
-    # 4. We close the files
-    my_input_stream_1.close()
-    my_input_stream_2.close()
 
-    # 5. We check that both files are equal
-    size_1 = len(content_1)
+# ------------------------------------------
+# FUNCTION split_into_buckets
+# ------------------------------------------
+def split_into_buckets(list_of_files, mode, bucket_folder, num_buckets):
+    # 1. We write each line to the bucket of its key, so that all the lines of a key end up in the same bucket
+    bucket_files = [ os.path.join(bucket_folder, "bucket_" + str(index) + ".txt") for index in range(num_buckets) ]
+    my_output_streams = [ open(file_name, "w", encoding="utf-8") for file_name in bucket_files ]
+    for line in read_normalised_lines(list_of_files):
+        index = zlib.crc32(get_key(line, mode).encode("utf-8")) % num_buckets
+        my_output_streams[index].write(line + "\n")
+    for my_output_stream in my_output_streams:
+        my_output_stream.close()
+
+    # 2. We return the buckets
+    return bucket_files
 
-    # 5.1. If both files have the same length
-    if (size_1 == len(content_2)):
-        # 5.1.1. We compare them line by line
-        for index in range(size_1):
-            if (content_1[index] != content_2[index]):
-                res = False
-                break
 
-    # 5.2. If the files have different lengths then they are definitely not equal
+# ------------------------------------------
+# FUNCTION count_lines
+# ------------------------------------------
+def count_lines(lines, mode):
+    # 1. We count how many times each value appears with each key (the values are empty in "multiset" mode)
+    res = collections.defaultdict(collections.Counter)
+    for line in lines:
+        key = get_key(line, mode)
+        res[key][line[len(key):]] += 1
+
+    # 2. We return res
+    return res
+
+
+# ------------------------------------------
+# FUNCTION find_unordered_differences
+# ------------------------------------------
+def find_unordered_differences(list_of_files_1, list_of_files_2, mode="multiset", num_differences=1):
+    # 1. We create the output variable
+    res = []
+
+    # 2. If the files fit in memory, we compare them as a single bucket
+    total_size = sum(os.path.getsize(file_name) for file_name in list_of_files_1 + list_of_files_2)
+    num_buckets = (total_size // BUCKET_SIZE) + 1
+    if (num_buckets == 1):
+        buckets = [ (read_normalised_lines(list_of_files_1), read_normalised_lines(list_of_files_2)) ]
+        bucket_folder = None
+
+    # 3. Otherwise we split the lines of both sides into buckets by the hash of their key, and compare the buckets
+    # one at a time
     else:
-        res = False
+        bucket_folder = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(bucket_folder.name, "1"))
+        os.makedirs(os.path.join(bucket_folder.name, "2"))
+        buckets = zip(split_into_buckets(list_of_files_1, mode, os.path.join(bucket_folder.name, "1"), num_buckets),
+                      split_into_buckets(list_of_files_2, mode, os.path.join(bucket_folder.name, "2"), num_buckets)
+                     )
+        buckets = [ (read_normalised_lines([ bucket_1 ]), read_normalised_lines([ bucket_2 ]))
+                    for bucket_1, bucket_2 in buckets
+                  ]
 
-    # 6. We return res
+    # 4. We look for the keys (or lines, in "multiset" mode) that do not appear the same number of times with the
+    # same values on both sides, until we have num_differences of them
+    try:
+        for lines_1, lines_2 in buckets:
+            counts_1 = count_lines(lines_1, mode)
+            counts_2 = count_lines(lines_2, mode)
+            for key in sorted(set(counts_1) | set(counts_2)):
+                if (counts_1.get(key) != counts_2.get(key)):
+                    res.append(key)
+                    if (len(res) == num_differences):
+                        return res
+    finally:
+        if (bucket_folder is not None):
+            bucket_folder.cleanup()
+
+    # 5. We return res
     return res
 
 
+# ------------------------------------------
+# FUNCTION check_file_pair
+# ------------------------------------------
+def check_file_pair(task):
+    # 1. We unpack the task
+    (file_pair, num_differences, mode) = task
+
+    # 2. We return the first num_differences lines that differ (none if the check is passed)
+    if (mode == "ordered"):
+        return find_differences(file_pair[0], file_pair[1], num_differences)
+
+    # 3. If the order does not matter, the file pair is a pair of patterns matching all the files of a stage
+    list_of_files_1 = sorted(glob.glob(file_pair[0]))
+    list_of_files_2 = sorted(glob.glob(file_pair[1]))
+    for pattern, list_of_files in ((file_pair[0], list_of_files_1), (file_pair[1], list_of_files_2)):
+        if (len(list_of_files) == 0):
+            raise FileNotFoundError("No files match '" + pattern + "'")
+    return find_unordered_differences(list_of_files_1, list_of_files_2, mode, num_differences)
+
+
+# ------------------------------------------
+# FUNCTION print_results
+# ------------------------------------------
+def print_results(list_of_file_pairs, results, mode):
+    # 1. We traverse each of the files, in order
+    all_test_passed = True
+    for file_pair, differences in zip(list_of_file_pairs, results):
+        # 1.1. We print the info
+        print("----------------------------------------------------------\nChecking :\n" + str(file_pair[0]) + "\n" + str(file_pair[1]) + "\n")
+
+        # 1.2. We see if the check is passed
+        if (len(differences) == 0):
+            print("Test passed!")
+        else:
+            if (mode == "ordered"):
+                print("Test did not pass. First differing lines: " + ", ".join(str(line_number) for line_number in differences))
+            else:
+                print("Test did not pass. First differing " + ("keys" if (mode == "keyed") else "lines") + ": " + ", ".join(repr(key) for key in differences))
+            all_test_passed = False
+
+    # 2. We return whether all the tests were passed
+    return all_test_passed
+
+
 # ------------------------------------------
 # FUNCTION my_main
 # ------------------------------------------
 def my_main(part,
             assignment_solution_folder,
-            student_solution_folder
+            student_solution_folder,
+            num_workers=1,
+            num_differences=10,
+            mode="ordered"
            ):
+    # 0. We check the mode
+    if (mode not in MODES):
+        raise ValueError("Unknown mode '" + str(mode) + "', use one of " + str(MODES))
 
     # 1. We collect the list of files to be checked
     list_of_files_to_be_checked = []
@@ -83,19 +294,20 @@ def my_main(part,
         list_of_files_to_be_checked.append((assignment_solution_folder + "2_my_sort_simulation/sort_1.txt", student_solution_folder + "2_my_sort_simulation/sort_1.txt"))
         list_of_files_to_be_checked.append((assignment_solution_folder + "3_my_reduce_simulation/reduce_sort_1.txt", student_solution_folder + "3_my_reduce_simulation/reduce_sort_1.txt"))
 
-    # 2. We traverse each of the files
-    all_test_passed = True
-    for file_pair in list_of_files_to_be_checked:
-        # 2.1. We print the info
-        print("----------------------------------------------------------\nChecking :\n" + str(file_pair[0]) + "\n" + str(file_pair[1]) + "\n")
+    # 1.1. If the order does not matter, the files of each stage are checked together, since the lines may be spread
+    # across them differently (e.g. with another partitioner or number of reducers)
+    if ((mode != "ordered") and ((part == 3) or (part == 4))):
+        list_of_files_to_be_checked = [ (assignment_solution_folder + "2_my_sort_simulation/sort_*.txt", student_solution_folder + "2_my_sort_simulation/sort_*.txt"),
+                                        (assignment_solution_folder + "3_my_reduce_simulation/reduce_sort_*.txt", student_solution_folder + "3_my_reduce_simulation/reduce_sort_*.txt")
+                                      ]
 
-        # 2.2. We see if the check is passed
-        test_passed = pass_test(file_pair[0], file_pair[1])
-        if (test_passed == True):
-            print("Test passed!")
-        else:
-            print("Test did not pass.")
-            all_test_passed = False
+    # 2. We check the files, either sequentially or concurrently in a pool of processes, and print their results
+    tasks = [ (file_pair, num_differences, mode) for file_pair in list_of_files_to_be_checked ]
+    if (num_workers == 1):
+        all_test_passed = print_results(list_of_files_to_be_checked, map(check_file_pair, tasks), mode)
+    else:
+        with multiprocessing.Pool(min(num_workers, len(tasks))) as pool:
+            all_test_passed = print_results(list_of_files_to_be_checked, pool.imap(check_file_pair, tasks), mode)
 
     # 3. Print the final outcome
     print("----------------------------------------------------------")
@@ -119,16 +331,30 @@ if __name__ == '__main__':
     assignment_solution_folder = "./Assignment_Solutions/A01_Part" + str(part_number) + "/"
     student_solution_folder = "./Student_Solutions/A01_Part" + str(part_number) + "/"
 
+    # Number of file pairs checked concurrently, and number of differing lines reported per file pair
+    num_workers = 1
+    num_differences = 10
+
+    # Whether the lines must be in the same order ("ordered"), or not ("multiset" or "keyed", see MODES)
+    mode = "ordered"
+
     # 1.1. If the program is called from console, we modify the parameters
     if (len(sys.argv) > 1):
         # 2.1. We get the values from the terminal
         part_number = int(sys.argv[1])
         assignment_solution_folder = sys.argv[2]
         student_solution_folder = sys.argv[3]
+        if (len(sys.argv) > 4):
+            num_workers = int(sys.argv[4])
+        if (len(sys.argv) > 5):
+            mode = sys.argv[5]
 
     # 3. We call to my_main
     my_main(part_number,
             assignment_solution_folder,
-            student_solution_folder
+            student_solution_folder,
+            num_workers,
+            num_differences,
+            mode
            )
 